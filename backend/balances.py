@@ -0,0 +1,459 @@
+import argparse
+import calendar
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from sqlalchemy import Date, and_, bindparam, case, delete, func, insert, update
+from sqlmodel import Session, select
+
+from .batch import chunked
+from .cache import bump_generation
+from .crud import insert_or_ignore
+from .fx import convert_by_currency
+from .models import (
+    Account,
+    AccountDailyBalance,
+    AccountType,
+    BalanceGranularityEnum,
+    Category,
+    CategoryTypeEnum,
+    Currency,
+    Transaction,
+)
+
+# Namespace of the PostgreSQL advisory locks taken per account while its snapshots
+# are updated, so concurrent writers of an account apply their deltas in turn
+SNAPSHOT_LOCK_ID = 20240903
+
+# Income adds to the balance, every other category type subtracts from it.
+signed_amount = case(
+    (Category.type == CategoryTypeEnum.income, Transaction.amount),
+    else_=-Transaction.amount,
+)
+
+
+# Full recompute from the transactions table
+def compute_balance(
+    session: Session, end_date: datetime, account_id: int | None = None
+) -> Decimal:
+    """
+    Sum the signed amount of every transaction up to `end_date` in a single
+    aggregate query, without loading any Transaction into the session.
+
+    Args:
+        session (Session): Database session
+        end_date (datetime): Last transaction date included in the balance
+        account_id (int | None): Restrict the balance to a single account
+    """
+    statement = (
+        select(func.coalesce(func.sum(signed_amount), 0))
+        .select_from(Transaction)
+        .join(Category, Transaction.category_id == Category.id)
+        .where(Transaction.transaction_date <= end_date)
+    )
+    if account_id is not None:
+        statement = statement.where(Transaction.account_id == account_id)
+    return session.exec(statement).one()
+
+
+def _per_account(session: Session, account_id_column, balance_column) -> list[dict]:
+    statement = (
+        select(
+            Account.id,
+            Account.name,
+            AccountType.type.label("account_type"),
+            func.coalesce(balance_column, 0).label("total_balance"),
+            Currency.name.label("currency"),
+        )
+        .outerjoin(AccountType, Account.account_type_id == AccountType.id)
+        .outerjoin(Currency, Account.currency_id == Currency.id)
+        .outerjoin(account_id_column.table, account_id_column == Account.id)
+        .order_by(Account.id)
+    )
+    return [dict(row._mapping) for row in session.exec(statement)]
+
+
+# Balances served from the AccountDailyBalance snapshots
+def _closing_balances(day: date):
+    """Last closing balance of every account strictly before `day`."""
+    latest_day = (
+        select(
+            AccountDailyBalance.account_id,
+            func.max(AccountDailyBalance.balance_date).label("balance_date"),
+        )
+        .where(AccountDailyBalance.balance_date < day)
+        .group_by(AccountDailyBalance.account_id)
+        .subquery()
+    )
+    return select(
+        AccountDailyBalance.account_id,
+        AccountDailyBalance.balance.label("total_balance"),
+    ).join(
+        latest_day,
+        and_(
+            AccountDailyBalance.account_id == latest_day.c.account_id,
+            AccountDailyBalance.balance_date == latest_day.c.balance_date,
+        ),
+    )
+
+
+def _snapshot_balances(end_date: datetime):
+    """
+    Per-account balance as of `end_date`: the last closing balance before that day
+    plus the transactions of the day itself up to `end_date`.
+    """
+    day = end_date.date()
+    closing = _closing_balances(day)
+    same_day = (
+        select(
+            Transaction.account_id,
+            func.sum(signed_amount).label("total_balance"),
+        )
+        .join(Category, Transaction.category_id == Category.id)
+        .where(Transaction.transaction_date >= datetime.combine(day, time.min))
+        .where(Transaction.transaction_date <= end_date)
+        .group_by(Transaction.account_id)
+    )
+    movements = closing.union_all(same_day).subquery()
+    return (
+        select(
+            movements.c.account_id,
+            func.sum(movements.c.total_balance).label("total_balance"),
+        )
+        .group_by(movements.c.account_id)
+        .subquery()
+    )
+
+
+def snapshot_balance(
+    session: Session, end_date: datetime, account_id: int | None = None
+) -> Decimal:
+    """
+    Same result as `compute_balance`, read from the daily snapshots instead of
+    scanning every transaction up to `end_date`.
+    """
+    balances = _snapshot_balances(end_date)
+    statement = select(func.coalesce(func.sum(balances.c.total_balance), 0))
+    if account_id is not None:
+        statement = statement.where(balances.c.account_id == account_id)
+    return session.exec(statement).one()
+
+
+def snapshot_balance_per_account(session: Session, end_date: datetime) -> list[dict]:
+    """
+    Balance of every account as of `end_date`, read from the daily snapshots and
+    joined with the account type and currency names.
+    """
+    balances = _snapshot_balances(end_date)
+    return _per_account(session, balances.c.account_id, balances.c.total_balance)
+
+
+def snapshot_balance_by_currency(
+    session: Session, end_date: datetime, account_id: int | None = None
+) -> dict[str | None, Decimal]:
+    """
+    Balance as of `end_date` summed per account currency, ready to be converted
+    with one rate per currency.
+    """
+    balances = _snapshot_balances(end_date)
+    statement = (
+        select(Currency.name, func.sum(balances.c.total_balance))
+        .select_from(balances)
+        .join(Account, Account.id == balances.c.account_id)
+        .outerjoin(Currency, Account.currency_id == Currency.id)
+        .group_by(Currency.name)
+    )
+    if account_id is not None:
+        statement = statement.where(balances.c.account_id == account_id)
+    return dict(session.exec(statement).all())
+
+
+def _period_ends(
+    start_date: date, end_date: date, granularity: BalanceGranularityEnum
+) -> list[date]:
+    """Last day of every period between the two dates, clipped to `end_date`."""
+    period_ends = []
+    day = start_date
+    while day <= end_date:
+        if granularity == BalanceGranularityEnum.week:
+            day += timedelta(days=6 - day.weekday())
+        elif granularity == BalanceGranularityEnum.month:
+            day = day.replace(day=calendar.monthrange(day.year, day.month)[1])
+        period_ends.append(min(day, end_date))
+        day += timedelta(days=1)
+    return period_ends
+
+
+def balance_history(
+    session: Session,
+    start_date: date,
+    end_date: date,
+    granularity: BalanceGranularityEnum = BalanceGranularityEnum.day,
+    account_ids: list[int] | None = None,
+    target_currency: str | None = None,
+) -> list[dict]:
+    """
+    Closing balance at the end of every day, week or month between two dates.
+    Opening balances come from the last snapshot before `start_date`; the rest of
+    the series is a running sum over one ordered scan of the snapshots in range.
+    With a `target_currency` the running sums are kept per account currency and
+    converted with the rates of each period end.
+
+    Args:
+        session (Session): Database session
+        start_date (date): First day of the series
+        end_date (date): Last day of the series
+        granularity (BalanceGranularityEnum): Length of each period
+        account_ids (list[int] | None): Only include these accounts
+        target_currency (str | None): Convert the balances into this currency
+    """
+    currency_of = {}
+    if target_currency:
+        currency_of = dict(
+            session.exec(
+                select(Account.id, Currency.name).outerjoin(
+                    Currency, Account.currency_id == Currency.id
+                )
+            ).all()
+        )
+
+    opening = _closing_balances(start_date)
+    snapshots = (
+        select(
+            AccountDailyBalance.account_id,
+            AccountDailyBalance.balance_date,
+            AccountDailyBalance.balance,
+        )
+        .where(AccountDailyBalance.balance_date >= start_date)
+        .where(AccountDailyBalance.balance_date <= end_date)
+        .order_by(AccountDailyBalance.balance_date)
+    )
+    if account_ids:
+        opening = opening.where(AccountDailyBalance.account_id.in_(account_ids))
+        snapshots = snapshots.where(AccountDailyBalance.account_id.in_(account_ids))
+
+    balances = dict(session.exec(opening).all())
+    totals = defaultdict(Decimal)
+    for account_id, balance in balances.items():
+        totals[currency_of.get(account_id)] += balance
+    rows = iter(session.exec(snapshots))
+    row = next(rows, None)
+    history = []
+    for period_end in _period_ends(start_date, end_date, granularity):
+        while row is not None and row.balance_date <= period_end:
+            change = row.balance - balances.get(row.account_id, 0)
+            totals[currency_of.get(row.account_id)] += change
+            balances[row.account_id] = row.balance
+            row = next(rows, None)
+        if target_currency:
+            total_balance = convert_by_currency(
+                session, totals, target_currency, period_end
+            )
+        else:
+            total_balance = sum(totals.values(), Decimal(0))
+        history.append({"date": period_end, "total_balance": total_balance})
+    return history
+
+
+# Snapshot maintenance
+def record_transactions(session: Session, transaction_ids: list[int], sign: int = 1):
+    """
+    Apply the stored state of transactions to the daily snapshots of their accounts,
+    with one aggregate per account and day. Call it with `sign=-1` before the
+    transactions are updated or deleted, so the snapshots change in the same
+    database transaction as the ledger.
+
+    Args:
+        session (Session): Database session
+        transaction_ids (list[int]): Transactions being added or removed
+        sign (int): 1 to add the transactions, -1 to remove them
+    """
+    balance_date = func.date(Transaction.transaction_date, type_=Date)
+    locking = session.get_bind().dialect.name == "postgresql"
+    deltas = {}
+    for chunk in chunked(transaction_ids):
+        if locking:
+            # READ COMMITTED reads the last committed state: lock the rows so a
+            # concurrent update cannot change them between this read and the write
+            session.exec(
+                select(Transaction.id)
+                .where(Transaction.id.in_(chunk))
+                .order_by(Transaction.id)
+                .with_for_update()
+            ).all()
+        rows = session.exec(
+            select(Transaction.account_id, balance_date, func.sum(signed_amount))
+            .join(Category, Transaction.category_id == Category.id)
+            .where(Transaction.id.in_(chunk))
+            .group_by(Transaction.account_id, balance_date)
+        ).all()
+        for account_id, day, delta in rows:
+            deltas[(account_id, day)] = deltas.get((account_id, day), 0) + sign * delta
+    apply_daily_deltas(session, deltas)
+
+
+def apply_daily_deltas(session: Session, deltas: dict[tuple[int, date], Decimal]):
+    """
+    Add a balance change to the closing balance of `(account_id, day)` and of every
+    later day of that account, creating the day's snapshot if it does not exist.
+    Each statement runs once with the parameters of every delta, and the later days
+    are updated by range, so a bulk write costs the same number of statements as a
+    single one.
+
+    Args:
+        session (Session): Database session
+        deltas (dict[tuple[int, date], Decimal]): Balance change per account and day
+    """
+    days_per_account = defaultdict(dict)
+    for (account_id, day), delta in deltas.items():
+        if delta:
+            days_per_account[account_id][day] = delta
+    if session.get_bind().dialect.name == "postgresql":
+        # Taken in account order so writers of several accounts cannot deadlock.
+        # SQLite writers already hold the database write lock.
+        for account_id in sorted(days_per_account):
+            session.exec(
+                select(func.pg_advisory_xact_lock(SNAPSHOT_LOCK_ID, account_id))
+            )
+    missing = []
+    ranges = []
+    for account_id, days in days_per_account.items():
+        existing = set(
+            session.exec(
+                select(AccountDailyBalance.balance_date)
+                .where(AccountDailyBalance.account_id == account_id)
+                .where(AccountDailyBalance.balance_date.in_(days))
+            ).all()
+        )
+        sorted_days = sorted(days)
+        cumulative = 0
+        for day, next_day in zip(sorted_days, sorted_days[1:] + [date.max]):
+            if day not in existing:
+                missing.append({"account": account_id, "day": day})
+            cumulative += days[day]
+            ranges.append(
+                {
+                    "account": account_id,
+                    "start": day,
+                    "end": next_day,
+                    "delta": cumulative,
+                }
+            )
+    if not ranges:
+        return
+
+    connection = session.connection()
+    if missing:
+        # Inserted in date order, so a new day carries over the balance of the
+        # previous one, existing or new
+        previous = (
+            select(AccountDailyBalance.balance)
+            .where(AccountDailyBalance.account_id == bindparam("account"))
+            .where(AccountDailyBalance.balance_date < bindparam("day"))
+            .order_by(AccountDailyBalance.balance_date.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        connection.execute(
+            insert_or_ignore(session, AccountDailyBalance).values(
+                account_id=bindparam("account"),
+                balance_date=bindparam("day"),
+                balance=func.coalesce(previous, 0),
+            ),
+            missing,
+        )
+    connection.execute(
+        update(AccountDailyBalance)
+        .where(AccountDailyBalance.account_id == bindparam("account"))
+        .where(AccountDailyBalance.balance_date >= bindparam("start"))
+        .where(AccountDailyBalance.balance_date < bindparam("end"))
+        .values(balance=AccountDailyBalance.balance + bindparam("delta")),
+        ranges,
+    )
+
+
+def _expected_snapshots():
+    balance_date = func.date(Transaction.transaction_date, type_=Date)
+    daily = (
+        select(
+            Transaction.account_id,
+            balance_date.label("balance_date"),
+            func.sum(signed_amount).label("delta"),
+        )
+        .join(Category, Transaction.category_id == Category.id)
+        .group_by(Transaction.account_id, balance_date)
+        .subquery()
+    )
+    return select(
+        daily.c.account_id,
+        daily.c.balance_date,
+        func.sum(daily.c.delta)
+        .over(partition_by=daily.c.account_id, order_by=daily.c.balance_date)
+        .label("balance"),
+    )
+
+
+def rebuild_snapshots(session: Session):
+    """
+    Regenerate every daily snapshot from the transactions table with a running sum
+    per account. The caller commits.
+    """
+    session.exec(delete(AccountDailyBalance))
+    session.exec(
+        insert(AccountDailyBalance).from_select(
+            ["account_id", "balance_date", "balance"], _expected_snapshots()
+        )
+    )
+
+
+def check_snapshots(session: Session) -> list[dict]:
+    """
+    Compare the stored snapshots with a full recompute and return every account and
+    day where the as-of balances disagree. An empty list means they are consistent.
+    """
+    expected = defaultdict(list)
+    for account_id, balance_date, balance in session.exec(_expected_snapshots()):
+        expected[account_id].append((balance_date, Decimal(balance)))
+    stored = defaultdict(list)
+    for snapshot in session.exec(select(AccountDailyBalance)):
+        stored[snapshot.account_id].append((snapshot.balance_date, snapshot.balance))
+
+    mismatches = []
+    for account_id in sorted(expected.keys() | stored.keys()):
+        expected_by_day = dict(expected[account_id])
+        stored_by_day = dict(stored[account_id])
+        expected_balance = stored_balance = Decimal(0)
+        for day in sorted(expected_by_day.keys() | stored_by_day.keys()):
+            expected_balance = expected_by_day.get(day, expected_balance)
+            stored_balance = stored_by_day.get(day, stored_balance)
+            if round(expected_balance, 2) != round(stored_balance, 2):
+                mismatches.append(
+                    {
+                        "account_id": account_id,
+                        "balance_date": day,
+                        "expected": expected_balance,
+                        "stored": stored_balance,
+                    }
+                )
+    return mismatches
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Maintain the daily balance snapshots")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    args = parser.parse_args()
+    with Session(engine) as session:
+        if args.command == "rebuild":
+            rebuild_snapshots(session)
+            bump_generation(session)
+            session.commit()
+            print("Snapshots rebuilt")
+        else:
+            mismatches = check_snapshots(session)
+            for mismatch in mismatches:
+                print(mismatch)
+            print(f"{len(mismatches)} mismatching snapshots")
+            raise SystemExit(1 if mismatches else 0)
@@ -0,0 +1,103 @@
+from typing import Iterator
+
+from sqlalchemy import delete, update
+from sqlmodel import Session, select
+
+from .models import BudgetFilter, TransactionFilter
+
+# Ids bound per statement, well below the bound parameter limit of SQLite
+BATCH_CHUNK_SIZE = 1000
+
+
+class EmptySelection(ValueError):
+    pass
+
+
+def chunked(ids: list[int], size: int = BATCH_CHUNK_SIZE) -> Iterator[list[int]]:
+    for start in range(0, len(ids), size):
+        yield ids[start : start + size]
+
+
+def transaction_conditions(model, filter: TransactionFilter | None) -> list:
+    """Conditions of a transactions or planned transactions filter."""
+    if filter is None:
+        return []
+    conditions = []
+    if filter.start_date:
+        conditions.append(model.transaction_date >= filter.start_date)
+    if filter.end_date:
+        conditions.append(model.transaction_date <= filter.end_date)
+    if filter.account_ids:
+        conditions.append(model.account_id.in_(filter.account_ids))
+    if filter.category_ids:
+        conditions.append(model.category_id.in_(filter.category_ids))
+    if filter.subcategory_ids:
+        conditions.append(model.subcategory_id.in_(filter.subcategory_ids))
+    return conditions
+
+
+def budget_conditions(model, filter: BudgetFilter | None) -> list:
+    if filter is None:
+        return []
+    conditions = []
+    if filter.year is not None:
+        conditions.append(model.year == filter.year)
+    if filter.month is not None:
+        conditions.append(model.month == filter.month)
+    if filter.subcategory_ids:
+        conditions.append(model.subcategory_id.in_(filter.subcategory_ids))
+    return conditions
+
+
+def select_ids(
+    session: Session, model, ids: list[int] | None, conditions: list
+) -> list[int]:
+    """
+    Ids of the existing rows of a batch operation, given as ids, a filter or both.
+    They are resolved before writing, so an update that changes the filtered
+    columns still applies to the rows that matched.
+
+    Args:
+        session (Session): Database session
+        model (SQLModel): Table model of the rows
+        ids (list[int] | None): Requested ids
+        conditions (list): Filter conditions on the model
+    """
+    if ids is None:
+        if not conditions:
+            raise EmptySelection("Select the rows with ids or a non-empty filter")
+        return list(session.exec(select(model.id).where(*conditions)).all())
+    selected = []
+    for chunk in chunked(sorted(set(ids))):
+        selected.extend(
+            session.exec(select(model.id).where(model.id.in_(chunk), *conditions)).all()
+        )
+    return selected
+
+
+def batch_update(session: Session, model, ids: list[int], changes: dict) -> int:
+    """Apply the same partial update to every row with one UPDATE per chunk of ids."""
+    updated = 0
+    if not changes:
+        return updated
+    for chunk in chunked(ids):
+        result = session.exec(
+            update(model)
+            .where(model.id.in_(chunk))
+            .values(**changes)
+            .execution_options(synchronize_session=False)
+        )
+        updated += result.rowcount
+    return updated
+
+
+def batch_delete(session: Session, model, ids: list[int]) -> int:
+    deleted = 0
+    for chunk in chunked(ids):
+        result = session.exec(
+            delete(model)
+            .where(model.id.in_(chunk))
+            .execution_options(synchronize_session=False)
+        )
+        deleted += result.rowcount
+    return deleted
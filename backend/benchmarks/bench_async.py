@@ -0,0 +1,168 @@
+"""
+Compare the latency of the sync endpoints and of their /async variants under
+concurrent clients, in process through the ASGI interface.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_async --clients 200 --requests 10
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+from sqlalchemy import insert
+from sqlalchemy.exc import TimeoutError
+from sqlmodel import Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..balances import rebuild_snapshots
+from ..database import (
+    create_async_db_engine,
+    create_db_engine,
+    get_async_session,
+    get_read_session,
+    get_session,
+)
+from ..main import app
+from ..models import Account, AccountType, Category, Currency, SubCategory, Transaction
+from ..settings import Settings
+
+ACCOUNTS = 5
+START = datetime(2024, 1, 1)
+URLS = [
+    "/transactions/?start_date=2024-01-01&end_date=2024-12-31&limit=100",
+    "/accounts/",
+    "/total_balance_per_account/?end_date=2024-12-31T23:59:59",
+    "/balance_history/?start_date=2024-01-01&end_date=2024-12-31&granularity=week",
+]
+
+
+def populate(engine, transactions: int):
+    with Session(engine) as session:
+        session.add(Currency(id=1, name="COP"))
+        session.add(AccountType(id=1, type="savings account"))
+        session.add(Category(id=1, name="food", type="expense"))
+        session.add(SubCategory(id=1, name="groceries", category_id=1))
+        for account_id in range(1, ACCOUNTS + 1):
+            session.add(
+                Account(
+                    id=account_id,
+                    name=f"account {account_id}",
+                    currency_id=1,
+                    account_type_id=1,
+                )
+            )
+        session.commit()
+        rows = [
+            {
+                "amount": round(random.uniform(1, 1000), 2),
+                "description": "",
+                "transaction_date": START
+                + timedelta(seconds=random.randrange(365 * 86400)),
+                "is_planned": False,
+                "account_id": random.randint(1, ACCOUNTS),
+                "category_id": 1,
+                "subcategory_id": 1,
+            }
+            for _ in range(transactions)
+        ]
+        session.exec(insert(Transaction), params=rows)
+        rebuild_snapshots(session)
+        session.commit()
+
+
+async def client_requests(
+    client: httpx.AsyncClient, prefix: str, requests: int, latencies: list
+):
+    for _ in range(requests):
+        url = prefix + random.choice(URLS)
+        start = time.perf_counter()
+        response = await client.get(url)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+
+
+async def run(prefix: str, clients: int, requests: int) -> tuple[list, float]:
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        # Open the pooled connections and fill the result cache before timing
+        for url in URLS:
+            await asyncio.gather(*(client.get(prefix + url) for _ in range(clients)))
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                client_requests(client, prefix, requests, latencies)
+                for _ in range(clients)
+            )
+        )
+    return latencies, time.perf_counter() - start
+
+
+def percentile(latencies: list, fraction: float) -> float:
+    return statistics.quantiles(latencies, n=100)[int(fraction * 100) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--transactions", type=int, default=20000)
+    parser.add_argument("--pool-size", type=int, help="defaults to --clients")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # A connection per client by default: with a smaller pool the sync
+        # handlers can wait for a connection while the sessions holding one wait
+        # for a worker thread to close them, until the pool timeout
+        settings = Settings.from_env(
+            {
+                "DATABASE_URL": f"sqlite:///{Path(directory) / 'bench.db'}",
+                "DATABASE_POOL_SIZE": str(args.pool_size or args.clients),
+            }
+        )
+        engine = create_db_engine(settings)
+        async_engine = create_async_db_engine(settings)
+        SQLModel.metadata.create_all(engine)
+        populate(engine, args.transactions)
+
+        def bench_session():
+            with Session(engine) as session:
+                yield session
+
+        async def bench_async_session():
+            async with AsyncSession(async_engine) as session:
+                yield session
+
+        app.dependency_overrides[get_session] = bench_session
+        app.dependency_overrides[get_read_session] = bench_session
+        app.dependency_overrides[get_async_session] = bench_async_session
+        for name, prefix in (("sync", ""), ("async", "/async")):
+            try:
+                latencies, elapsed = asyncio.run(
+                    run(prefix, args.clients, args.requests)
+                )
+            except TimeoutError as exc:
+                print(f"{name:>5}: {exc}")
+                continue
+            print(
+                f"{name:>5}: p50 {percentile(latencies, 0.5) * 1000:,.0f} ms, "
+                f"p99 {percentile(latencies, 0.99) * 1000:,.0f} ms, "
+                f"{len(latencies) / elapsed:,.0f} requests/s"
+            )
+        app.dependency_overrides.clear()
+        asyncio.run(async_engine.dispose())
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Time /balance_history/ over a multi-year ledger.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_balance_history --transactions 1000000
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlmodel import Session, SQLModel, create_engine
+
+from ..balances import balance_history, rebuild_snapshots
+from ..models import (
+    Account,
+    AccountType,
+    BalanceGranularityEnum,
+    Category,
+    Currency,
+    FxRate,
+    SubCategory,
+    Transaction,
+)
+
+ACCOUNTS = 10
+START = datetime(2020, 1, 1)
+DAYS = 5 * 365
+
+
+def populate(engine, transactions: int):
+    with Session(engine) as session:
+        session.add(Currency(id=1, name="COP"))
+        session.add(AccountType(id=1, type="savings account"))
+        session.add(Category(id=1, name="income", type="income"))
+        session.add(Category(id=2, name="food", type="expense"))
+        session.add(SubCategory(id=1, name="other", category_id=2))
+        for account_id in range(1, ACCOUNTS + 1):
+            session.add(
+                Account(
+                    id=account_id,
+                    name=f"account {account_id}",
+                    currency_id=1,
+                    account_type_id=1,
+                )
+            )
+        session.commit()
+        rows = [
+            {
+                "amount": round(random.uniform(1, 1000), 2),
+                "description": "",
+                "transaction_date": START
+                + timedelta(seconds=random.randrange(DAYS * 86400)),
+                "is_planned": False,
+                "account_id": random.randint(1, ACCOUNTS),
+                "category_id": random.choice((1, 2)),
+                "subcategory_id": 1,
+            }
+            for _ in range(transactions)
+        ]
+        session.exec(insert(Transaction), params=rows)
+        fx_rates = [
+            {
+                "currency": currency,
+                "rate_date": (START + timedelta(days=day)).date(),
+                "rate": rate,
+            }
+            for day in range(DAYS)
+            for currency, rate in (("COP", 1 / random.uniform(3800, 4400)), ("USD", 1))
+        ]
+        session.exec(insert(FxRate), params=fx_rates)
+        rebuild_snapshots(session)
+        session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{Path(directory) / 'bench.db'}")
+        SQLModel.metadata.create_all(engine)
+        started = time.perf_counter()
+        populate(engine, args.transactions)
+        print(
+            f"populated {args.transactions} rows in {time.perf_counter() - started:.1f}s"
+        )
+
+        end = (START + timedelta(days=DAYS)).date()
+        with Session(engine) as session:
+            for granularity in BalanceGranularityEnum:
+                started = time.perf_counter()
+                history = balance_history(session, date(2020, 1, 1), end, granularity)
+                elapsed = (time.perf_counter() - started) * 1000
+                print(
+                    f"{granularity.value:>5}: {len(history)} points in {elapsed:.1f}ms"
+                )
+
+            started = time.perf_counter()
+            history = balance_history(
+                session, date(2020, 1, 1), end, target_currency="USD"
+            )
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"  day: {len(history)} points converted to USD in {elapsed:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Time the cold start of the API against a large existing database: a fresh
+process imports the app, runs the startup migrations and serves a first request.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_cold_start --transactions 1000000
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlmodel import create_engine
+
+from ..migrations import migrate
+from .bench_balance_history import populate
+
+# Seconds from process start to the first response
+COLD_START_TARGET = 3.0
+
+STARTUP = """
+import time
+started = time.perf_counter()
+from fastapi.testclient import TestClient
+from backend.main import app
+imported = time.perf_counter()
+with TestClient(app) as client:
+    client.get("/accounts/").raise_for_status()
+    print(imported - started, time.perf_counter() - imported)
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{Path(directory) / 'bench.db'}"
+        engine = create_engine(url)
+        migrate(engine)
+        started = time.perf_counter()
+        populate(engine, args.transactions)
+        print(
+            f"populated {args.transactions} rows in {time.perf_counter() - started:.1f}s"
+        )
+        engine.dispose()
+
+        for run in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, "-c", STARTUP],
+                env={**os.environ, "DATABASE_URL": url},
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            imported, ready = (float(value) for value in output.split())
+            total = imported + ready
+            print(
+                f"run {run + 1}: import {imported:.2f}s, startup and first request "
+                f"{ready:.2f}s, total {total:.2f}s "
+                f"({'within' if total <= COLD_START_TARGET else 'over'} the "
+                f"{COLD_START_TARGET:.0f}s target)"
+            )
+
+
+if __name__ == "__main__":
+    main()
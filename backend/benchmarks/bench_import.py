@@ -0,0 +1,97 @@
+"""
+Time the bulk import of a CSV bank statement.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_import --rows 200000
+"""
+
+import argparse
+import io
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlmodel import Session
+
+from ..database import create_db_engine
+from ..importers import IMPORT_CHUNK_SIZE, import_transactions, read_csv
+from ..migrations import migrate
+from ..models import Account, AccountType, Category, Currency, SubCategory
+from ..settings import Settings
+
+ACCOUNTS = 10
+START = datetime(2024, 1, 1)
+
+
+def populate(engine):
+    with Session(engine) as session:
+        session.add(Currency(id=1, name="COP"))
+        session.add(AccountType(id=1, type="savings account"))
+        session.add(Category(id=1, name="income", type="income"))
+        session.add(Category(id=2, name="food", type="expense"))
+        session.add(SubCategory(id=1, name="wage", category_id=1))
+        session.add(SubCategory(id=2, name="groceries", category_id=2))
+        for account_id in range(1, ACCOUNTS + 1):
+            session.add(
+                Account(
+                    id=account_id,
+                    name=f"account {account_id}",
+                    currency_id=1,
+                    account_type_id=1,
+                )
+            )
+        session.commit()
+
+
+def statement(rows: int) -> bytes:
+    lines = ["transaction_date,amount,description,account,category,subcategory"]
+    for _ in range(rows):
+        category, subcategory = random.choice(
+            (("income", "wage"), ("food", "groceries"))
+        )
+        transaction_date = START + timedelta(seconds=random.randrange(365 * 86400))
+        lines.append(
+            f"{transaction_date.isoformat()},{random.uniform(1, 1000):.2f},"
+            f"statement line,account {random.randint(1, ACCOUNTS)},"
+            f"{category},{subcategory}"
+        )
+    return "\n".join(lines).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    content = statement(args.rows)
+    with tempfile.TemporaryDirectory() as directory:
+        # The engine of the API, with the pragmas of the tuned profile
+        engine = create_db_engine(
+            Settings.from_env(
+                {"DATABASE_URL": f"sqlite:///{Path(directory) / 'bench.db'}"}
+            )
+        )
+        migrate(engine)
+        populate(engine)
+
+        # The second run imports the same statement again, every row is skipped
+        for _ in range(2):
+            with Session(engine) as session:
+                started = time.perf_counter()
+                report = import_transactions(
+                    session, read_csv(io.BytesIO(content)), chunk_size=args.chunk_size
+                )
+                session.commit()
+                elapsed = time.perf_counter() - started
+            print(
+                f"imported {report['imported']} and skipped {report['skipped']} rows "
+                f"in {elapsed:.2f}s ({args.rows / elapsed:,.0f} rows/s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
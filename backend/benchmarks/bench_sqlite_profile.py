@@ -0,0 +1,122 @@
+"""
+Compare read and write throughput of concurrent API sessions with the SQLite
+defaults and with the tuned profile of `backend.settings`.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_sqlite_profile --readers 4 --writers 2
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel
+
+from ..balances import snapshot_balance
+from ..crud import create_row
+from ..database import create_db_engine
+from ..models import (
+    Account,
+    AccountType,
+    Category,
+    Currency,
+    SubCategory,
+    Transaction,
+    TransactionCreate,
+)
+from ..settings import Settings
+
+
+def populate(engine):
+    with Session(engine) as session:
+        session.add(Currency(id=1, name="COP"))
+        session.add(AccountType(id=1, type="savings account"))
+        session.add(Category(id=1, name="food", type="expense"))
+        session.add(SubCategory(id=1, name="groceries", category_id=1))
+        session.add(Account(id=1, name="account", currency_id=1, account_type_id=1))
+        session.commit()
+
+
+def reader(engine, stop: threading.Event, counts: dict):
+    while not stop.is_set():
+        try:
+            with Session(engine) as session:
+                snapshot_balance(session, datetime.now())
+            counts["reads"] += 1
+        except OperationalError:
+            counts["errors"] += 1
+
+
+def writer(engine, stop: threading.Event, counts: dict):
+    while not stop.is_set():
+        try:
+            with Session(engine) as session:
+                create_row(
+                    session,
+                    Transaction,
+                    TransactionCreate(
+                        amount=Decimal(1), category_id=1, subcategory_id=1, account_id=1
+                    ),
+                )
+                session.commit()
+            counts["writes"] += 1
+        except OperationalError:
+            counts["errors"] += 1
+
+
+def run(profile: str, readers: int, writers: int, seconds: float) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(
+            Settings.from_env(
+                {
+                    "DATABASE_URL": f"sqlite:///{Path(directory) / 'bench.db'}",
+                    "SQLITE_PROFILE": profile,
+                    "DATABASE_POOL_SIZE": str(readers + writers),
+                }
+            )
+        )
+        SQLModel.metadata.create_all(engine)
+        populate(engine)
+        stop = threading.Event()
+        counts = {"reads": 0, "writes": 0, "errors": 0}
+        threads = [
+            threading.Thread(target=reader, args=(engine, stop, counts))
+            for _ in range(readers)
+        ] + [
+            threading.Thread(target=writer, args=(engine, stop, counts))
+            for _ in range(writers)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    for profile in ("default", "tuned"):
+        counts = run(profile, args.readers, args.writers, args.seconds)
+        print(
+            f"{profile:>7}: {counts['reads'] / args.seconds:,.0f} reads/s, "
+            f"{counts['writes'] / args.seconds:,.0f} writes/s, "
+            f"{counts['errors']} locked errors"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Measure the small writes of one tenant while a bulk import runs, with both tenants
+sharing a database and with each tenant on its own SQLite file through the engine
+cache of `backend.tenants`.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_tenants --import-rows 200000
+"""
+
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from functools import partial
+from pathlib import Path
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, insert
+
+from ..database import open_tenant
+from ..models import Transaction
+from ..settings import Settings
+from ..tenants import TenantEngines
+from .bench_sqlite_profile import populate
+from .bench_write_queue import create_transaction
+
+
+def bulk_import(engine, rows: int, done: threading.Event):
+    values = [
+        {"amount": Decimal(1), "category_id": 1, "subcategory_id": 1, "account_id": 1}
+        for _ in range(rows)
+    ]
+    with Session(engine) as session:
+        session.exec(insert(Transaction), params=values)
+        session.commit()
+    done.set()
+
+
+def small_writes(engine, done: threading.Event) -> tuple[list[float], int]:
+    latencies, errors = [], 0
+    while not done.is_set():
+        start = time.perf_counter()
+        try:
+            with Session(engine) as session:
+                create_transaction(session)
+                session.commit()
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors += 1
+    return latencies, errors
+
+
+def run(shared: bool, rows: int) -> tuple[list[float], int, float]:
+    with tempfile.TemporaryDirectory() as directory:
+        settings = Settings.from_env(
+            {"DATABASE_TENANT_URL": f"sqlite:///{Path(directory) / '{tenant}.db'}"}
+        )
+        tenant_engines = TenantEngines(partial(open_tenant, settings=settings))
+        importer = tenant_engines.get("importer").engine
+        other = importer if shared else tenant_engines.get("other").engine
+        for engine in {importer, other}:
+            populate(engine)
+        done = threading.Event()
+        thread = threading.Thread(target=bulk_import, args=(importer, rows, done))
+        start = time.perf_counter()
+        thread.start()
+        latencies, errors = small_writes(other, done)
+        thread.join()
+        elapsed = time.perf_counter() - start
+        tenant_engines.dispose_all()
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--import-rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    for shared in (True, False):
+        latencies, errors, elapsed = run(shared, args.import_rows)
+        line = (
+            f"{'same database' if shared else 'own database':>13}: import took "
+            f"{elapsed:.2f} s, {len(latencies)} small writes meanwhile"
+        )
+        if latencies:
+            line += (
+                f", p50 {statistics.median(latencies) * 1000:.1f} ms, "
+                f"max {max(latencies) * 1000:.1f} ms"
+            )
+        print(line + f", {errors} locked errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Start 1, 2, 4 and 8 API processes against one SQLite database, as the workers of
+`fastapi run --workers N` would, and measure the requests per second they serve
+together with a mix of reads and writes.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_workers --seconds 5
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from sqlmodel import Session, create_engine, func, select
+
+from ..balances import check_snapshots
+from ..models import Transaction
+
+# Share of the requests that write a transaction
+WRITE_RATIO = 0.2
+
+
+def run_worker(database_url: str, seconds: float, barrier, results):
+    os.environ["DATABASE_URL"] = database_url
+    from fastapi.testclient import TestClient
+
+    from ..main import app
+
+    with TestClient(app) as client:
+        name = f"worker {os.getpid()}"
+        currency = client.post("/currencies/", json={"name": name}).json()
+        account_type = client.post("/account_types/", json={"type": name}).json()
+        category = client.post(
+            "/categories/", json={"name": name, "type": "expense"}
+        ).json()
+        subcategory = client.post(
+            "/sub_categories/", json={"name": name, "category_id": category["id"]}
+        ).json()
+        account = client.post(
+            "/accounts/",
+            json={
+                "name": name,
+                "currency_id": currency["id"],
+                "account_type_id": account_type["id"],
+            },
+        ).json()
+        transaction = {
+            "amount": 1,
+            "category_id": category["id"],
+            "subcategory_id": subcategory["id"],
+            "account_id": account["id"],
+        }
+        barrier.wait()
+        requests = writes = 0
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            if requests * WRITE_RATIO >= writes:
+                client.post("/transactions/", json=transaction).raise_for_status()
+                writes += 1
+            else:
+                client.get(f"/total_balance/{account['id']}").raise_for_status()
+            requests += 1
+        results.put((requests, writes))
+        barrier.wait()
+
+
+def run(workers: int, seconds: float) -> tuple[int, int, bool]:
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{Path(directory) / 'bench.db'}"
+        context = multiprocessing.get_context("spawn")
+        barrier = context.Barrier(workers)
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=run_worker, args=(database_url, seconds, barrier, results)
+            )
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        engine = create_engine(database_url)
+        with Session(engine) as session:
+            stored = session.exec(select(func.count()).select_from(Transaction)).one()
+            consistent = check_snapshots(session) == []
+        engine.dispose()
+    requests = sum(outcome[0] for outcome in outcomes)
+    writes = sum(outcome[1] for outcome in outcomes)
+    return requests, writes, consistent and stored == writes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        requests, writes, intact = run(workers, args.seconds)
+        print(
+            f"{workers} workers: {requests / args.seconds:,.0f} requests/s, "
+            f"{writes / args.seconds:,.0f} writes/s, "
+            f"data {'intact' if intact else 'INCONSISTENT'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
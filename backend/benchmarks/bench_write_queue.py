@@ -0,0 +1,111 @@
+"""
+Compare concurrent transaction writes committed by each request thread with the
+same writes sent through the single writer thread of `backend.writer`.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_write_queue --threads 16
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+
+from ..balances import record_transactions
+from ..cache import bump_generation
+from ..crud import create_row
+from ..database import create_db_engine
+from ..migrations import migrate
+from ..models import Transaction, TransactionCreate
+from ..settings import Settings
+from ..writer import WriteQueue
+from .bench_sqlite_profile import populate
+
+
+def create_transaction(session: Session):
+    row = create_row(
+        session,
+        Transaction,
+        TransactionCreate(
+            amount=Decimal(1), category_id=1, subcategory_id=1, account_id=1
+        ),
+    )
+    record_transactions(session, [row["id"]])
+    bump_generation(session)
+    return row
+
+
+def writer(engine, write_queue, stop: threading.Event, counts: dict):
+    while not stop.is_set():
+        try:
+            if write_queue is not None:
+                write_queue.submit(create_transaction)
+            else:
+                with Session(engine) as session:
+                    create_transaction(session)
+                    session.commit()
+            counts["writes"] += 1
+        except OperationalError:
+            counts["errors"] += 1
+
+
+def run(profile: str, queued: bool, threads: int, seconds: float) -> tuple:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(
+            Settings.from_env(
+                {
+                    "DATABASE_URL": f"sqlite:///{Path(directory) / 'bench.db'}",
+                    "SQLITE_PROFILE": profile,
+                    "DATABASE_POOL_SIZE": str(threads + 1),
+                }
+            )
+        )
+        migrate(engine)
+        populate(engine)
+        write_queue = WriteQueue(engine) if queued else None
+        stop = threading.Event()
+        counts = {"writes": 0, "errors": 0}
+        workers = [
+            threading.Thread(target=writer, args=(engine, write_queue, stop, counts))
+            for _ in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        time.sleep(seconds)
+        stop.set()
+        for worker in workers:
+            worker.join()
+        stats = write_queue.stats() if write_queue is not None else None
+        if write_queue is not None:
+            write_queue.stop()
+        engine.dispose()
+    return counts, stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    for profile in ("default", "tuned"):
+        for queued in (False, True):
+            counts, stats = run(profile, queued, args.threads, args.seconds)
+            line = (
+                f"{profile:>7} {'queued' if queued else 'direct':>6}: "
+                f"{counts['writes'] / args.seconds:,.0f} writes/s, "
+                f"{counts['errors']} locked errors"
+            )
+            if stats:
+                line += f", {stats['average_batch_size']:.1f} writes per commit"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
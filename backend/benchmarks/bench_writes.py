@@ -0,0 +1,91 @@
+"""
+Compare the create and update round trips of the API handlers: ORM add, commit
+and refresh against the INSERT/UPDATE ... RETURNING helpers of `backend.crud`.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_writes --writes 5000
+"""
+
+import argparse
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine
+
+from ..crud import create_row, update_row
+from ..models import Transaction, TransactionCreate, TransactionUpdate
+
+
+def orm_writes(engine, writes: int):
+    with Session(engine) as session:
+        for number in range(writes):
+            transaction = Transaction.model_validate(
+                TransactionCreate(
+                    amount=Decimal(number),
+                    category_id=1,
+                    subcategory_id=1,
+                    account_id=1,
+                )
+            )
+            session.add(transaction)
+            session.commit()
+            session.refresh(transaction)
+            transaction.description = "updated"
+            session.add(transaction)
+            session.commit()
+            session.refresh(transaction)
+
+
+def returning_writes(engine, writes: int):
+    with Session(engine) as session:
+        for number in range(writes):
+            transaction = create_row(
+                session,
+                Transaction,
+                TransactionCreate(
+                    amount=Decimal(number),
+                    category_id=1,
+                    subcategory_id=1,
+                    account_id=1,
+                ),
+            )
+            session.commit()
+            update_row(
+                session,
+                Transaction,
+                transaction["id"],
+                TransactionUpdate(description="updated"),
+            )
+            session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writes", type=int, default=5000)
+    args = parser.parse_args()
+
+    for name, run in (("orm + refresh", orm_writes), ("returning", returning_writes)):
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_engine(f"sqlite:///{Path(directory) / 'bench.db'}")
+            SQLModel.metadata.create_all(engine)
+            statements = []
+            event.listen(
+                engine,
+                "before_cursor_execute",
+                lambda *args: statements.append(args[2]),
+            )
+            started = time.perf_counter()
+            run(engine, args.writes)
+            elapsed = time.perf_counter() - started
+            print(
+                f"{name:>13}: {2 * args.writes / elapsed:,.0f} writes/s, "
+                f"{len(statements) / (2 * args.writes):.1f} statements per write"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from .models import DataGeneration
+
+DATA_GENERATION_ID = 1
+
+
+def get_generation(session: Session) -> int:
+    generation = session.exec(
+        select(DataGeneration.generation).where(DataGeneration.id == DATA_GENERATION_ID)
+    ).first()
+    return generation or 0
+
+
+def bump_generation(session: Session):
+    """
+    Invalidate every cached result. Call it before committing a write, so the new
+    generation becomes visible to all processes together with the data.
+    """
+    result = session.exec(
+        update(DataGeneration)
+        .where(DataGeneration.id == DATA_GENERATION_ID)
+        .values(generation=DataGeneration.generation + 1)
+    )
+    if result.rowcount == 0:
+        # Start from the clock so a recreated database never reuses a generation
+        # that is still cached by a running process
+        session.add(DataGeneration(id=DATA_GENERATION_ID, generation=time.time_ns()))
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of endpoint results. Entries belong to the data generation
+    they were computed for; seeing a newer generation empties the cache, so a
+    write committed by any process invalidates it.
+    """
+
+    def __init__(self, maxsize: int = 256, on_invalidate: Callable | None = None):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._on_invalidate = on_invalidate
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._generation: int | None = None
+
+    def get_or_compute(self, key: Hashable, generation: int, compute: Callable):
+        """
+        Return the cached result for `key`, or compute and store it.
+
+        Args:
+            key (Hashable): Endpoint name and parameters
+            generation (int): Data generation read before computing the result
+            compute (Callable): Function returning the result on a miss
+        """
+        with self._lock:
+            if generation != self._generation:
+                self._entries.clear()
+                self._generation = generation
+                if self._on_invalidate:
+                    self._on_invalidate()
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = value
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "generation": self._generation,
+            }
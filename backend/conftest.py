@@ -0,0 +1,99 @@
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+
+import pytest
+
+
+def postgres_available() -> bool:
+    return bool(shutil.which("initdb") and shutil.which("pg_ctl"))
+
+
+def start_postgres(directory: str) -> str:
+    """Start a throwaway PostgreSQL server in `directory` and return its URL."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    data = os.path.join(directory, "data")
+    subprocess.run(
+        ["initdb", "-D", data, "-U", "postgres", "-A", "trust", "--no-sync"],
+        check=True,
+        capture_output=True,
+    )
+    subprocess.run(
+        [
+            "pg_ctl",
+            "-D",
+            data,
+            "-l",
+            os.path.join(directory, "postgres.log"),
+            "-o",
+            f"-p {port} -k {directory} -c listen_addresses=127.0.0.1 -c fsync=off",
+            "-w",
+            "start",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return f"postgresql+psycopg2://postgres@127.0.0.1:{port}/postgres"
+
+
+def stop_postgres(directory: str):
+    subprocess.run(
+        ["pg_ctl", "-D", os.path.join(directory, "data"), "-m", "fast", "stop"],
+        capture_output=True,
+    )
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--postgres",
+        action="store_true",
+        help="run the suite against a throwaway PostgreSQL server",
+    )
+
+
+def pytest_configure(config):
+    # The engines are created when the backend is imported: point them to the
+    # server before the test modules are collected
+    if config.getoption("--postgres"):
+        if not postgres_available():
+            raise pytest.UsageError("--postgres needs initdb and pg_ctl on the PATH")
+        config.postgres_directory = tempfile.mkdtemp(prefix="wealth-tracker-pg-")
+        url = start_postgres(config.postgres_directory)
+        os.environ["DATABASE_URL"] = url
+        os.environ["DATABASE_REPLICA_URL"] = url
+
+
+def pytest_unconfigure(config):
+    directory = getattr(config, "postgres_directory", None)
+    if directory:
+        stop_postgres(directory)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def postgres_url():
+    """
+    URL of a PostgreSQL database: the one of the suite with --postgres, the one in
+    TEST_POSTGRES_URL, or a server started for the session. Skips without any.
+    """
+    pytest.importorskip("psycopg2")
+    url = os.environ.get("DATABASE_URL", "")
+    if url.startswith("postgresql"):
+        yield url
+        return
+    if os.environ.get("TEST_POSTGRES_URL"):
+        yield os.environ["TEST_POSTGRES_URL"]
+        return
+    if not postgres_available():
+        pytest.skip("PostgreSQL is not installed")
+    # A short path: the server socket path has a length limit
+    directory = tempfile.mkdtemp(prefix="wt-pg-")
+    try:
+        yield start_postgres(directory)
+    finally:
+        stop_postgres(directory)
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,100 @@
+import threading
+import weakref
+from contextlib import contextmanager
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, SQLModel
+
+# Lock of the writers of the process, per SQLite engine
+_write_locks: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_write_locks_lock = threading.Lock()
+
+
+def begin_write(session: Session):
+    """
+    Open the write transaction of `session` before a write reads what it changes.
+    pysqlite only sends BEGIN before the first DML statement, so the reads of a
+    write would otherwise run in autocommit and race with the other writers: on
+    SQLite the write lock is taken up front with BEGIN IMMEDIATE.
+    """
+    connection = session.connection()
+    if (
+        connection.dialect.name == "sqlite"
+        and not connection.connection.dbapi_connection.in_transaction
+    ):
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+@contextmanager
+def write_transaction(session: Session):
+    """
+    Hold the write transaction of `session` for the block, which commits it. On
+    SQLite the writers of the process wait for each other on a lock of the engine
+    first: the busy handler of SQLite polls instead of queueing them, and gives up
+    after busy_timeout when many threads write at once.
+    """
+    engine = session.get_bind()
+    if engine.dialect.name != "sqlite":
+        begin_write(session)
+        yield
+        return
+    with _write_locks_lock:
+        lock = _write_locks.setdefault(engine, threading.Lock())
+    with lock:
+        begin_write(session)
+        yield
+
+
+def create_row(session: Session, model, data: SQLModel) -> dict:
+    """
+    Insert a row with INSERT ... RETURNING, so the generated id and the defaults
+    come back with the write instead of being read again after the commit.
+
+    Args:
+        session (Session): Database session
+        model (SQLModel): Table model of the row
+        data (SQLModel): Create model with the values of the row
+
+    Returns:
+        The stored row
+    """
+    table = model.__table__
+    values = model.model_validate(data).model_dump(exclude={"id"})
+    result = session.exec(insert(table).values(**values).returning(*table.columns))
+    return dict(result.mappings().one())
+
+
+def update_row(session: Session, model, row_id: int, data: SQLModel) -> dict | None:
+    """
+    Apply the fields set in `data` with UPDATE ... RETURNING.
+
+    Returns:
+        The updated row, or None when it does not exist
+    """
+    table = model.__table__
+    values = data.model_dump(exclude_unset=True)
+    if values:
+        statement = update(table).values(**values).returning(*table.columns)
+    else:
+        statement = select(*table.columns)
+    result = session.exec(statement.where(table.c.id == row_id))
+    row = result.mappings().one_or_none()
+    return dict(row) if row is not None else None
+
+
+def delete_row(session: Session, model, row_id: int) -> bool:
+    table = model.__table__
+    result = session.exec(
+        delete(table).where(table.c.id == row_id).returning(table.c.id)
+    )
+    return result.first() is not None
+
+
+def insert_or_ignore(session: Session, model):
+    """
+    INSERT ... ON CONFLICT DO NOTHING into the table of `model` for the database
+    of the session: rows that hit a unique index are skipped by the database.
+    """
+    dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(model.__table__).on_conflict_do_nothing()
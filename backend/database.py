@@ -1,23 +1,211 @@
+import os
 from datetime import datetime
+from functools import cache
 
+from fastapi import Request
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from .models import Account, AccountType, Category, Currency, SubCategory, Transaction
+from .balances import rebuild_snapshots
+from .cache import ResultCache
+from .fingerprints import refresh_fingerprints
+from .fx import FxRateCache, ensure_fx_rates, load_fx_rates
+from .migrations import migrate
+from .models import (
+    Account,
+    AccountType,
+    Category,
+    Currency,
+    SubCategory,
+    Transaction,
+)
+from .pools import TimedQueuePool
+from .settings import Settings, settings
+from .tenants import TenantDatabase, TenantEngines
+from .writer import WriteQueue
 
-sqlite_file_name = "database.db"
-sqlite_url = f"sqlite:///{sqlite_file_name}"
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, echo=True, connect_args=connect_args)
 
+def _engine_options(url: URL, settings: Settings) -> dict:
+    kwargs = {}
+    if url.get_backend_name() == "sqlite":
+        kwargs["connect_args"] = {"check_same_thread": False}
+    if url.database not in (None, "", ":memory:"):
+        kwargs["pool_size"] = settings.pool_size
+        kwargs["max_overflow"] = settings.max_overflow
+        kwargs["pool_timeout"] = settings.pool_timeout
+    if url.get_backend_name() != "sqlite":
+        # Server connections can be closed under the pool by the server, a proxy
+        # or a failover: test them on checkout and replace the old ones
+        kwargs["pool_pre_ping"] = settings.pool_pre_ping
+        kwargs["pool_recycle"] = settings.pool_recycle
+    return kwargs
 
-def get_session():
-    with Session(engine) as session:
+
+def _set_sqlite_pragmas(engine: Engine, url: URL, settings: Settings):
+    if url.get_backend_name() != "sqlite" or not settings.sqlite_pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in settings.sqlite_pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def create_db_engine(settings: Settings = settings, url: str | None = None) -> Engine:
+    """
+    Engine of the configured database, or of `url` with the same settings. SQLite
+    connections get the pragmas of the settings when they are opened, since most
+    of them only last a connection.
+    """
+    url = make_url(url or settings.database_url)
+    kwargs = _engine_options(url, settings)
+    if "pool_size" in kwargs:
+        kwargs["poolclass"] = TimedQueuePool
+    engine = create_engine(url, echo=settings.database_echo, **kwargs)
+    _set_sqlite_pragmas(engine, url, settings)
+    return engine
+
+
+def create_async_db_engine(settings: Settings = settings) -> AsyncEngine:
+    """
+    Async engine of the configured database, through aiosqlite for SQLite and
+    asyncpg for PostgreSQL. It shares the pool settings and SQLite pragmas of the
+    sync engine.
+    """
+    url = make_url(settings.async_url)
+    engine = create_async_engine(
+        url, echo=settings.database_echo, **_engine_options(url, settings)
+    )
+    _set_sqlite_pragmas(engine.sync_engine, url, settings)
+    return engine
+
+
+engine = create_db_engine()
+# Engine of the read-only handlers
+replica_engine = (
+    create_db_engine(url=settings.database_replica_url)
+    if settings.database_replica_url
+    else engine
+)
+
+
+def create_write_queue(
+    engine: Engine, settings: Settings = settings, info: dict | None = None
+) -> WriteQueue | None:
+    """Write queue of `engine`, or None when the write queue is disabled."""
+    if not settings.write_queue:
+        return None
+    return WriteQueue(
+        engine,
+        max_batch=settings.write_batch_size,
+        max_delay=settings.write_batch_delay_ms / 1000,
+        info=info,
+    )
+
+
+def open_tenant(tenant: str, settings: Settings = settings) -> TenantDatabase:
+    """
+    Open the database of a tenant, creating it with the latest schema and the FX
+    rates on first use. Its sessions carry the tenant's own result and rate caches
+    and write queue in their info, so nothing cached leaks between tenants.
+    """
+    url = make_url(settings.tenant_url(tenant))
+    if url.get_backend_name() == "sqlite" and url.database not in (
+        None,
+        "",
+        ":memory:",
+    ):
+        os.makedirs(os.path.dirname(url.database) or ".", exist_ok=True)
+    tenant_engine = create_db_engine(settings, url=url)
+    fx_rate_cache = FxRateCache()
+    info = {
+        "tenant": tenant,
+        "fx_rate_cache": fx_rate_cache,
+        "result_cache": ResultCache(maxsize=256, on_invalidate=fx_rate_cache.clear),
+    }
+    upgrade_db(tenant_engine, info)
+    write_queue = info["write_queue"] = create_write_queue(
+        tenant_engine, settings, info
+    )
+    return TenantDatabase(
+        tenant_engine, info, close=write_queue.stop if write_queue else None
+    )
+
+
+# Engines of the tenants in tenant mode, None otherwise
+tenant_engines = (
+    TenantEngines(
+        open_tenant,
+        maxsize=settings.tenant_cache_size,
+        idle_timeout=settings.tenant_idle_timeout,
+    )
+    if settings.database_tenant_url
+    else None
+)
+
+
+@cache
+def get_async_engine() -> AsyncEngine:
+    # Created on first use, so the async driver is only needed by the async endpoints
+    return create_async_db_engine()
+
+
+def _open_session(request: Request, default_engine: Engine) -> Session:
+    if tenant_engines is None:
+        return Session(default_engine)
+    database = tenant_engines.get(getattr(request.state, "tenant", None))
+    return Session(database.engine, info=database.info)
+
+
+def get_session(request: Request):
+    """Session of the request: on the database of its tenant in tenant mode."""
+    with _open_session(request, engine) as session:
+        yield session
+
+
+def get_read_session(request: Request):
+    """
+    Session of the read-only handlers, on the replica when one is configured. It
+    can lag behind the primary, so the handlers that write never use it. Tenants
+    have no replica: in tenant mode it is on the database of the tenant.
+    """
+    with _open_session(request, replica_engine) as session:
         yield session
 
 
+async def get_async_session():
+    async with AsyncSession(get_async_engine()) as session:
+        yield session
+
+
+def upgrade_db(db_engine: Engine = engine, info: dict | None = None) -> list[int]:
+    """
+    Apply the pending schema migrations and load the bundled FX rates when the
+    database has none, which is what startup does in `migrate` mode.
+
+    Returns:
+        The versions applied
+    """
+    applied = migrate(db_engine)
+    with Session(db_engine, info=info) as session:
+        if ensure_fx_rates(session):
+            session.commit()
+    return applied
+
+
 def create_db_and_tables():
     drop_db_and_tables()
-    SQLModel.metadata.create_all(engine)
+    migrate(engine)
+
+
+def reset_db():
+    create_db_and_tables()
+    populate_db()
 
 
 def populate_db():
@@ -27,6 +215,10 @@ def populate_db():
     create_categories()
     create_subcategories()
     create_transactions()
+    reset_sequences()
+    create_fingerprints()
+    create_balance_snapshots()
+    create_fx_rates()
 
 
 def drop_db_and_tables():
@@ -141,3 +333,46 @@ def create_transactions():
         session.add(transaction_3)
         session.add(transaction_4)
         session.commit()
+
+
+def reset_sequences():
+    """
+    Move the id sequences of PostgreSQL past the rows seeded with explicit ids,
+    so the next inserts do not reuse them. SQLite needs nothing.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    quote = engine.dialect.identifier_preparer.quote
+    with Session(engine) as session:
+        for table in SQLModel.metadata.sorted_tables:
+            if "id" not in table.c:
+                continue
+            next_id = func.coalesce(select(func.max(table.c.id)).scalar_subquery(), 0)
+            session.exec(
+                select(
+                    func.setval(
+                        func.pg_get_serial_sequence(quote(table.name), "id"),
+                        next_id + 1,
+                        False,
+                    )
+                )
+            )
+        session.commit()
+
+
+def create_fingerprints():
+    with Session(engine) as session:
+        refresh_fingerprints(session)
+        session.commit()
+
+
+def create_balance_snapshots():
+    with Session(engine) as session:
+        rebuild_snapshots(session)
+        session.commit()
+
+
+def create_fx_rates():
+    with Session(engine) as session:
+        load_fx_rates(session)
+        session.commit()
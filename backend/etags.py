@@ -0,0 +1,73 @@
+import hashlib
+
+from fastapi import Depends, Request, Response
+from sqlmodel import Session, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .database import get_async_session, get_read_session
+
+
+class NotModified(Exception):
+    def __init__(self, etag: str):
+        self.etag = etag
+
+
+def table_version(session: Session, models: tuple) -> tuple:
+    """
+    Cheap version of the tables behind a response: row count and latest
+    `updated_at` of each one, read with a single query.
+    """
+    columns = []
+    for model in models:
+        columns.append(select(func.count()).select_from(model).scalar_subquery())
+        columns.append(select(func.max(model.updated_at)).scalar_subquery())
+    return tuple(session.exec(select(*columns)).one())
+
+
+def compute_etag(request: Request, version: tuple) -> str:
+    key = repr((request.url.path, sorted(request.query_params.multi_items()), version))
+    return f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def check_etag(request: Request, response: Response, version: tuple):
+    etag = compute_etag(request, version)
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        raise NotModified(etag)
+    response.headers["ETag"] = etag
+
+
+def conditional_get(*models):
+    """
+    Dependency that answers a GET with `304 Not Modified` when the client already
+    has the current version of the tables of `models`, before the rows are loaded.
+    Otherwise the response gets the strong ETag of that version.
+    """
+
+    def dependency(
+        request: Request,
+        response: Response,
+        session: Session = Depends(get_read_session),
+    ):
+        check_etag(request, response, table_version(session, models))
+
+    return dependency
+
+
+def async_conditional_get(*models):
+    """`conditional_get` for the async endpoints."""
+
+    async def dependency(
+        request: Request,
+        response: Response,
+        session: AsyncSession = Depends(get_async_session),
+    ):
+        check_etag(request, response, await session.run_sync(table_version, models))
+
+    return dependency
@@ -0,0 +1,229 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Iterator
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import BigInteger, cast, func
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from .models import Account, Category, Currency, SubCategory, Transaction
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_COLUMNS = (
+    Transaction.id,
+    Transaction.transaction_date,
+    Transaction.amount,
+    Transaction.description,
+    Transaction.is_planned,
+    Transaction.account_id,
+    Transaction.category_id,
+    Transaction.subcategory_id,
+    Transaction.created_at,
+    Transaction.updated_at,
+)
+
+
+class ExportFormatEnum(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormatEnum.ndjson: "application/x-ndjson",
+    ExportFormatEnum.csv: "text/csv",
+}
+
+
+class ColumnarFormatEnum(str, Enum):
+    arrow = "arrow"
+    parquet = "parquet"
+
+
+COLUMNAR_MEDIA_TYPES = {
+    ColumnarFormatEnum.arrow: "application/vnd.apache.arrow.stream",
+    ColumnarFormatEnum.parquet: "application/vnd.apache.parquet",
+}
+
+# Transactions joined with their category, subcategory, account and currency.
+# Amounts are integer hundredths, the precision of the amount columns.
+COLUMNAR_COLUMNS = (
+    (Transaction.id, pa.int64()),
+    (Transaction.transaction_date, pa.timestamp("us")),
+    (
+        cast(func.round(Transaction.amount * 100), BigInteger).label("amount_minor"),
+        pa.int64(),
+    ),
+    (Currency.name.label("currency"), pa.string()),
+    (Transaction.description, pa.string()),
+    (Transaction.is_planned, pa.bool_()),
+    (Transaction.account_id, pa.int64()),
+    (Account.name.label("account"), pa.string()),
+    (Transaction.category_id, pa.int64()),
+    (Category.name.label("category"), pa.string()),
+    (Category.type.label("category_type"), pa.string()),
+    (Transaction.subcategory_id, pa.int64()),
+    (SubCategory.name.label("subcategory"), pa.string()),
+)
+COLUMNAR_SCHEMA = pa.schema(
+    [(column.key, arrow_type) for column, arrow_type in COLUMNAR_COLUMNS]
+)
+
+
+def filter_transactions(
+    statement,
+    start_date: date | None = None,
+    end_date: datetime | None = None,
+    account_ids: list[int] | None = None,
+    category_ids: list[int] | None = None,
+):
+    if start_date:
+        statement = statement.where(Transaction.transaction_date >= start_date)
+    if end_date:
+        statement = statement.where(Transaction.transaction_date <= end_date)
+    if account_ids:
+        statement = statement.where(Transaction.account_id.in_(account_ids))
+    if category_ids:
+        statement = statement.where(Transaction.category_id.in_(category_ids))
+    return statement
+
+
+def _batches(engine: Engine, statement) -> Iterator[list]:
+    """
+    Rows of `statement` in batches of EXPORT_BATCH_SIZE, read from the database
+    cursor as they are consumed. The session is opened here because streaming
+    outlives the request's session dependency.
+    """
+    with Session(engine) as session:
+        result = session.exec(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        yield from result.partitions()
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def stream_ndjson(engine: Engine, statement) -> Iterator[str]:
+    keys = [column.key for column in EXPORT_COLUMNS]
+    for batch in _batches(engine, statement):
+        yield "".join(
+            json.dumps(dict(zip(keys, row)), default=_json_default) + "\n"
+            for row in batch
+        )
+
+
+def stream_csv(engine: Engine, statement) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.key for column in EXPORT_COLUMNS])
+    for batch in _batches(engine, statement):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_transactions(
+    engine: Engine,
+    export_format: ExportFormatEnum,
+    start_date: date | None = None,
+    end_date: datetime | None = None,
+    account_ids: list[int] | None = None,
+    category_ids: list[int] | None = None,
+) -> Iterator[str]:
+    """
+    Stream the transactions matching the filters, ordered by date, as NDJSON or
+    CSV. Only one batch of rows is held in memory at a time.
+    """
+    statement = filter_transactions(
+        select(*EXPORT_COLUMNS), start_date, end_date, account_ids, category_ids
+    ).order_by(Transaction.transaction_date, Transaction.id)
+    if export_format == ExportFormatEnum.csv:
+        return stream_csv(engine, statement)
+    return stream_ndjson(engine, statement)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands over what was written since the last `drain`."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _record_batches(engine: Engine, statement) -> Iterator[pa.RecordBatch]:
+    for batch in _batches(engine, statement):
+        columns = zip(*batch)
+        yield pa.RecordBatch.from_arrays(
+            [
+                pa.array(values, type=field.type)
+                for values, field in zip(columns, COLUMNAR_SCHEMA)
+            ],
+            schema=COLUMNAR_SCHEMA,
+        )
+
+
+def export_transactions_columnar(
+    engine: Engine,
+    export_format: ColumnarFormatEnum,
+    start_date: date | None = None,
+    end_date: datetime | None = None,
+    account_ids: list[int] | None = None,
+    category_ids: list[int] | None = None,
+) -> Iterator[bytes]:
+    """
+    Stream the transactions matching the filters, joined with their category,
+    subcategory, account and currency names, as an Arrow IPC stream or a Parquet
+    file. Each database batch becomes one record batch (one row group in Parquet)
+    and is sent as soon as it is written.
+    """
+    statement = (
+        filter_transactions(
+            select(*(column for column, _ in COLUMNAR_COLUMNS)),
+            start_date,
+            end_date,
+            account_ids,
+            category_ids,
+        )
+        .outerjoin(Category, Transaction.category_id == Category.id)
+        .outerjoin(SubCategory, Transaction.subcategory_id == SubCategory.id)
+        .outerjoin(Account, Transaction.account_id == Account.id)
+        .outerjoin(Currency, Account.currency_id == Currency.id)
+        .order_by(Transaction.transaction_date, Transaction.id)
+    )
+    sink = _ChunkSink()
+    if export_format == ColumnarFormatEnum.parquet:
+        writer = pq.ParquetWriter(sink, COLUMNAR_SCHEMA)
+    else:
+        writer = pa.ipc.new_stream(sink, COLUMNAR_SCHEMA)
+    for record_batch in _record_batches(engine, statement):
+        writer.write_batch(record_batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
@@ -0,0 +1,107 @@
+from functools import lru_cache
+
+from pydantic import TypeAdapter, create_model
+from sqlalchemy import select
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+class Fieldset:
+    """
+    Fields of a list endpoint that can be requested with `fields=`: the fields of
+    its public model plus `relation.field` for the models nested in the response.
+    Only the requested columns are selected and only the relations they use are
+    joined.
+
+    Args:
+        model (SQLModel): Table model listed by the endpoint
+        public_model (SQLModel): Response model of a single row
+        relations (dict): Nested name -> (table model, public model, foreign key)
+    """
+
+    def __init__(self, model, public_model, relations: dict[str, tuple]):
+        self.model = model
+        self.public_model = public_model
+        self.relations = relations
+
+    def parse(self, fields: str) -> tuple[str, ...]:
+        paths = tuple(dict.fromkeys(field.strip() for field in fields.split(",")))
+        for path in paths:
+            relation, _, field = path.rpartition(".")
+            if relation:
+                if relation not in self.relations or field not in (
+                    self.relations[relation][1].model_fields
+                ):
+                    raise InvalidFields(f"Unknown field: {path}")
+            elif field not in self.public_model.model_fields:
+                raise InvalidFields(f"Unknown field: {path}")
+        return paths
+
+    def select(self, paths: tuple[str, ...], sort_key: tuple = ()):
+        """
+        Statement selecting the requested fields, labeled with their path, plus
+        the columns of `sort_key` needed to order and paginate the rows.
+        """
+        columns = {}
+        joined = []
+        for path in paths:
+            relation, _, field = path.rpartition(".")
+            if relation:
+                related_model = self.relations[relation][0]
+                columns[path] = getattr(related_model, field).label(path)
+                if relation not in joined:
+                    joined.append(relation)
+            else:
+                columns[path] = getattr(self.model, field).label(path)
+        for column in sort_key:
+            columns.setdefault(column.key, column)
+        statement = select(*columns.values()).select_from(self.model)
+        for relation in joined:
+            related_model, _, foreign_key = self.relations[relation]
+            statement = statement.outerjoin(
+                related_model, foreign_key == related_model.id
+            )
+        return statement
+
+    def dump_json(self, paths: tuple[str, ...], rows) -> bytes:
+        """Serialize the rows like the full response model would."""
+        items = []
+        for row in rows:
+            mapping = row._mapping
+            item = {}
+            for path in paths:
+                relation, _, field = path.rpartition(".")
+                if relation:
+                    item.setdefault(relation, {})[field] = mapping[path]
+                else:
+                    item[field] = mapping[path]
+            items.append(item)
+        adapter = self._adapter(paths)
+        return adapter.dump_json(adapter.validate_python(items))
+
+    @lru_cache(maxsize=128)
+    def _adapter(self, paths: tuple[str, ...]) -> TypeAdapter:
+        nested = {}
+        fields = {}
+        for path in paths:
+            relation, _, field = path.rpartition(".")
+            if relation:
+                nested.setdefault(relation, []).append(field)
+            else:
+                annotation = self.public_model.model_fields[field].annotation
+                fields[field] = (annotation, None)
+        for relation, relation_fields in nested.items():
+            public_model = self.relations[relation][1]
+            nested_model = create_model(
+                f"{public_model.__name__}Fields",
+                **{
+                    field: (public_model.model_fields[field].annotation | None, None)
+                    for field in relation_fields
+                },
+            )
+            fields[relation] = (nested_model | None, None)
+        return TypeAdapter(
+            list[create_model(f"{self.public_model.__name__}Fields", **fields)]
+        )
@@ -0,0 +1,181 @@
+import argparse
+import hashlib
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import bindparam, update
+from sqlmodel import Session, func, select
+
+from .batch import chunked
+from .models import Transaction
+
+# Transaction fields that identify a bank movement
+FINGERPRINT_FIELDS = {"account_id", "transaction_date", "amount", "description"}
+CENT = Decimal("0.01")
+# Occurrences of a base checked per query when looking for a free fingerprint
+PROBED_OCCURRENCES = 16
+# PostgreSQL advisory lock held while fingerprints are assigned, so two writers
+# cannot both take the same free occurrence
+FINGERPRINT_LOCK_ID = 20240902
+
+
+def fingerprint_base(
+    account_id: int, transaction_date: date | datetime, amount, description: str
+) -> str:
+    """
+    Normalized identity of a movement: the account, the day, the amount in cents
+    and the description without case or repeated whitespace. Bank exports of the
+    same movement agree on these even when they differ in the time or formatting.
+    """
+    if isinstance(transaction_date, datetime):
+        transaction_date = transaction_date.date()
+    amount = Decimal(str(amount)).quantize(CENT)
+    description = " ".join((description or "").casefold().split())
+    return f"{account_id}|{transaction_date.isoformat()}|{amount}|{description}"
+
+
+def fingerprint(base: str, occurrence: int = 1) -> str:
+    """
+    Fingerprint of the `occurrence`-th movement with the same base, so identical
+    movements of the same day are kept apart instead of being deduplicated.
+    """
+    return hashlib.sha256(f"{base}|{occurrence}".encode()).hexdigest()[:32]
+
+
+def transaction_base(transaction) -> str:
+    return fingerprint_base(
+        transaction.account_id,
+        transaction.transaction_date,
+        transaction.amount,
+        transaction.description,
+    )
+
+
+def stored_fingerprints(session: Session, fingerprints: list[str]) -> set[str]:
+    """The ones of `fingerprints` that a stored transaction already has."""
+    taken = set()
+    for chunk in chunked(fingerprints):
+        taken.update(
+            session.exec(
+                select(Transaction.fingerprint).where(
+                    Transaction.fingerprint.in_(chunk)
+                )
+            ).all()
+        )
+    return taken
+
+
+def assign_fingerprints(session: Session, bases: dict[int, str]) -> dict[int, str]:
+    """
+    Free fingerprints for transactions, keyed by their id (or any unique key for
+    rows not inserted yet): each one takes the first occurrence of its base that is
+    neither stored nor assigned to another row of the batch. Occurrences are probed
+    `PROBED_OCCURRENCES` at a time, so a movement repeated many times does not cost
+    a query per repetition. Run it inside the write transaction that inserts the
+    rows, so concurrent writers cannot pick the same free occurrence.
+
+    Args:
+        session (Session): Database session
+        bases (dict[int, str]): Fingerprint base of every row
+
+    Returns:
+        The fingerprint of every row
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        session.exec(select(func.pg_advisory_xact_lock(FINGERPRINT_LOCK_ID)))
+    occurrences = {key: 1 for key in bases}
+    assigned = {}
+    used = set()
+    while occurrences:
+        candidates = {
+            key: [
+                fingerprint(bases[key], occurrence + offset)
+                for offset in range(PROBED_OCCURRENCES)
+            ]
+            for key, occurrence in occurrences.items()
+        }
+        taken = stored_fingerprints(
+            session, [value for values in candidates.values() for value in values]
+        )
+        for key, values in candidates.items():
+            free = next(
+                (value for value in values if value not in taken and value not in used),
+                None,
+            )
+            if free is None:
+                occurrences[key] += PROBED_OCCURRENCES
+            else:
+                assigned[key] = free
+                used.add(free)
+                del occurrences[key]
+    return assigned
+
+
+def next_fingerprint(session: Session, transaction: Transaction) -> str:
+    """Fingerprint of a new transaction, after those of its identical movements."""
+    return assign_fingerprints(session, {0: transaction_base(transaction)})[0]
+
+
+def refresh_fingerprints(
+    session: Session, transaction_ids: list[int] | None = None
+) -> int:
+    """
+    Recompute the fingerprints of updated transactions, or of the ones without a
+    fingerprint when `transaction_ids` is None. The old fingerprints are cleared
+    first, so rows of the batch can take each other's. `updated_at` is left as is.
+    """
+    if transaction_ids is None:
+        transaction_ids = list(
+            session.exec(
+                select(Transaction.id).where(Transaction.fingerprint.is_(None))
+            ).all()
+        )
+    bases = {}
+    for chunk in chunked(transaction_ids):
+        session.exec(
+            update(Transaction)
+            .where(Transaction.id.in_(chunk))
+            .values(fingerprint=None, updated_at=Transaction.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        rows = session.exec(
+            select(
+                Transaction.id,
+                Transaction.account_id,
+                Transaction.transaction_date,
+                Transaction.amount,
+                Transaction.description,
+            ).where(Transaction.id.in_(chunk))
+        ).all()
+        for row in rows:
+            bases[row.id] = transaction_base(row)
+    if not bases:
+        return 0
+    session.connection().execute(
+        update(Transaction.__table__)
+        .where(Transaction.__table__.c.id == bindparam("transaction_id"))
+        .values(
+            fingerprint=bindparam("new_fingerprint"),
+            updated_at=Transaction.__table__.c.updated_at,
+        ),
+        [
+            {"transaction_id": transaction_id, "new_fingerprint": value}
+            for transaction_id, value in sorted(
+                assign_fingerprints(session, bases).items()
+            )
+        ],
+    )
+    return len(bases)
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    parser = argparse.ArgumentParser(
+        description="Fill in the fingerprints of the transactions that have none"
+    )
+    parser.parse_args()
+    with Session(engine) as session:
+        count = refresh_fingerprints(session)
+        session.commit()
+    print(f"{count} fingerprints filled in")
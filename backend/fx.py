@@ -0,0 +1,187 @@
+import argparse
+import csv
+import threading
+from bisect import bisect_right
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+from sqlmodel import Session, func, select
+
+from .cache import bump_generation
+from .crud import begin_write
+from .models import FxRate
+
+FX_RATES_CSV = Path(__file__).parent / "data" / "fx_rates.csv"
+# PostgreSQL advisory lock held while the bundled rates are loaded
+FX_RATES_LOCK_ID = 20240904
+
+
+class FxRateNotFound(Exception):
+    def __init__(self, currency: str | None, day: date):
+        super().__init__(f"No FX rate for {currency} on or before {day}")
+
+
+class FxRateCache:
+    """
+    In-process cache of rate lookups keyed by (currency, date). The first lookup
+    of a currency loads its whole rate series once, so every later date is a
+    binary search instead of a query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: dict[str, tuple[list[date], list[Decimal]]] = {}
+        self._rates: dict[tuple[str, date], Decimal] = {}
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+            self._rates.clear()
+
+    def get_rate(self, session: Session, currency: str | None, day: date) -> Decimal:
+        """
+        Latest rate of `currency` on or before `day`.
+
+        Args:
+            session (Session): Database session
+            currency (str | None): Currency name, e.g. COP
+            day (date): Date of the conversion
+        """
+        rate = self._rates.get((currency, day))
+        if rate is not None:
+            return rate
+        dates, rates = self._get_series(session, currency)
+        index = bisect_right(dates, day)
+        if index == 0:
+            raise FxRateNotFound(currency, day)
+        rate = self._rates[(currency, day)] = rates[index - 1]
+        return rate
+
+    def get_factors(
+        self, session: Session, currencies, target_currency: str, day: date
+    ) -> dict[str | None, Decimal]:
+        """Multiplier converting each of `currencies` into `target_currency`."""
+        target_rate = self.get_rate(session, target_currency, day)
+        return {
+            currency: self.get_rate(session, currency, day) / target_rate
+            for currency in currencies
+        }
+
+    def _get_series(self, session: Session, currency: str | None):
+        series = self._series.get(currency)
+        if series is None:
+            rows = session.exec(
+                select(FxRate.rate_date, FxRate.rate)
+                .where(FxRate.currency == currency)
+                .order_by(FxRate.rate_date)
+            ).all()
+            series = ([row[0] for row in rows], [row[1] for row in rows])
+            with self._lock:
+                self._series[currency] = series
+        return series
+
+
+fx_rate_cache = FxRateCache()
+
+
+def get_fx_rate_cache(session: Session) -> FxRateCache:
+    """Rate cache of the database of `session`: its tenant's one in tenant mode."""
+    return session.info.get("fx_rate_cache", fx_rate_cache)
+
+
+def convert_by_currency(
+    session: Session,
+    amounts: dict[str | None, Decimal],
+    target_currency: str,
+    day: date,
+) -> Decimal:
+    """
+    Convert amounts already summed per currency into `target_currency` with one
+    rate lookup per currency.
+
+    Args:
+        session (Session): Database session
+        amounts (dict[str | None, Decimal]): Amount per currency name
+        target_currency (str): Currency name of the result
+        day (date): Date of the rates
+    """
+    amounts = {currency: amount for currency, amount in amounts.items() if amount}
+    factors = get_fx_rate_cache(session).get_factors(
+        session, amounts, target_currency, day
+    )
+    total = sum(
+        (amount * factors[currency] for currency, amount in amounts.items()),
+        Decimal(0),
+    )
+    return round(total, 2)
+
+
+def convert_accounts(
+    session: Session, accounts: list[dict], target_currency: str, day: date
+) -> list[dict]:
+    """
+    Add `converted_balance` and `target_currency` to per-account balances, looking
+    up one rate per distinct account currency.
+    """
+    currencies = {
+        account["currency"] for account in accounts if account["total_balance"]
+    }
+    factors = get_fx_rate_cache(session).get_factors(
+        session, currencies, target_currency, day
+    )
+    for account in accounts:
+        factor = factors.get(account["currency"], 0)
+        account["converted_balance"] = round(account["total_balance"] * factor, 2)
+        account["target_currency"] = target_currency
+    return accounts
+
+
+def load_fx_rates(session: Session, path: Path = FX_RATES_CSV) -> int:
+    """
+    Insert or replace the rates of a CSV file with `date,currency,rate` columns and
+    reset the rate cache. The caller commits.
+    """
+    count = 0
+    with open(path, newline="") as file:
+        for row in csv.DictReader(file):
+            session.merge(
+                FxRate(
+                    currency=row["currency"],
+                    rate_date=date.fromisoformat(row["date"]),
+                    rate=Decimal(row["rate"]),
+                )
+            )
+            count += 1
+    get_fx_rate_cache(session).clear()
+    bump_generation(session)
+    return count
+
+
+def ensure_fx_rates(session: Session) -> int:
+    """
+    Load the bundled rates when the database has none, so conversions work on a
+    database that was never seeded. Concurrent callers load them once: the check
+    runs under the write lock. The caller commits.
+
+    Returns:
+        The number of rates loaded, 0 when the database already has rates
+    """
+    begin_write(session)
+    if session.get_bind().dialect.name == "postgresql":
+        session.exec(select(func.pg_advisory_xact_lock(FX_RATES_LOCK_ID)))
+    if session.scalar(select(func.count()).select_from(FxRate)):
+        return 0
+    return load_fx_rates(session)
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Load FX rates from a CSV file")
+    parser.add_argument("path", nargs="?", type=Path, default=FX_RATES_CSV)
+    args = parser.parse_args()
+    with Session(engine) as session:
+        count = load_fx_rates(session, args.path)
+        session.commit()
+    print(f"{count} FX rates loaded")
@@ -0,0 +1,39 @@
+import json
+from datetime import datetime
+
+from sqlmodel import Session
+
+from .crud import insert_or_ignore
+from .models import IdempotencyKey
+
+
+class RequestInProgress(Exception):
+    def __init__(self, key: str):
+        super().__init__(f"A request with Idempotency-Key {key} is still running")
+
+
+def claim_key(session: Session, key: str) -> dict | None:
+    """
+    Claim an idempotency key for the current request. Returns None when the key is
+    new, so the request goes on, or the stored response of the request that already
+    used it. The claim is part of the transaction of the request.
+    """
+    table = IdempotencyKey.__table__
+    claimed = session.exec(
+        insert_or_ignore(session, IdempotencyKey)
+        .values(key=key, created_at=datetime.utcnow())
+        .returning(table.c.key)
+    ).first()
+    if claimed is not None:
+        return None
+    stored = session.get(IdempotencyKey, key)
+    if stored.response is None:
+        raise RequestInProgress(key)
+    return json.loads(stored.response)
+
+
+def store_response(session: Session, key: str, response: dict):
+    """Keep the response of a claimed key, to replay it on retries. The caller commits."""
+    stored = session.get(IdempotencyKey, key)
+    stored.response = json.dumps(response)
+    session.add(stored)
@@ -0,0 +1,294 @@
+import csv
+import io
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from enum import Enum
+from typing import BinaryIO, Iterator
+
+from sqlmodel import Session, select
+
+from .balances import apply_daily_deltas
+from .crud import begin_write, insert_or_ignore
+from .fingerprints import CENT, fingerprint, fingerprint_base, stored_fingerprints
+from .models import Account, Category, CategoryTypeEnum, SubCategory, Transaction
+
+IMPORT_CHUNK_SIZE = 5000
+MAX_IMPORT_CHUNK_SIZE = 50000
+MAX_REPORTED_ERRORS = 1000
+
+# Columns of the rows inserted through the DBAPI on SQLite, in the order of the
+# pre-serialized tuples
+SQLITE_COLUMNS = (
+    "fingerprint",
+    "amount",
+    "description",
+    "transaction_date",
+    "created_at",
+    "updated_at",
+    "is_planned",
+    "category_id",
+    "subcategory_id",
+    "account_id",
+)
+
+OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)")
+
+
+class ImportFormatEnum(str, Enum):
+    csv = "csv"
+    ofx = "ofx"
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def read_csv(file: BinaryIO) -> Iterator[tuple[int, dict]]:
+    """
+    Rows of a CSV statement with a header line, e.g.
+    `transaction_date,amount,description,account,category,subcategory`. Signed
+    amounts are balance changes as banks export them, unsigned ones take the sign
+    of their category.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    finally:
+        # Closing the wrapper would close `file`, which a retry reads again
+        text.detach()
+
+
+def read_ofx(file: BinaryIO) -> Iterator[tuple[int, dict]]:
+    """
+    Rows of the <STMTTRN> entries of an OFX statement, in either the SGML (1.x) or
+    the XML (2.x) flavour. Amounts keep their sign: debits are negative.
+    """
+    row = None
+    text = io.TextIOWrapper(file, encoding="utf-8", errors="replace")
+    try:
+        for line_number, line in enumerate(text, start=1):
+            for match in OFX_TAG.finditer(line):
+                closing, tag, value = match.groups()
+                tag = tag.upper()
+                if tag == "STMTTRN":
+                    if closing and row is not None:
+                        yield row.pop("line"), _ofx_row(row)
+                        row = None
+                    elif not closing:
+                        row = {"line": line_number}
+                elif row is not None and not closing and value.strip():
+                    row[tag] = value.strip()
+    finally:
+        text.detach()
+
+
+def _ofx_row(entry: dict) -> dict:
+    posted = entry.get("DTPOSTED", "")
+    amount = entry.get("TRNAMT", "")
+    return {
+        "transaction_date": (
+            f"{posted[:4]}-{posted[4:6]}-{posted[6:8]}"
+            f"T{posted[8:10] or '00'}:{posted[10:12] or '00'}:{posted[12:14] or '00'}"
+        ),
+        # OFX amounts are always signed: credits are positive, with or without "+"
+        "amount": amount if amount.startswith(("-", "+")) else f"+{amount}",
+        "description": entry.get("NAME") or entry.get("MEMO") or "",
+    }
+
+
+def import_transactions(
+    session: Session,
+    rows: Iterator[tuple[int, dict]],
+    defaults: dict | None = None,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+) -> dict:
+    """
+    Validate and insert parsed statement rows in chunks. Account, category and
+    subcategory names are resolved to ids with maps loaded once, invalid rows are
+    skipped and reported, and the balance snapshots are updated with one delta per
+    account and day. Rows whose fingerprint is already stored are skipped by the
+    unique index, so importing an overlapping statement again adds nothing twice.
+    The caller commits.
+
+    Args:
+        session (Session): Database session
+        rows (Iterator[tuple[int, dict]]): Line number and fields of each row
+        defaults (dict | None): Values of the fields missing from the rows
+        chunk_size (int): Rows inserted per executemany
+
+    Returns:
+        Number of imported and skipped rows and the errors of the rejected ones
+    """
+    defaults = {key: value for key, value in (defaults or {}).items() if value}
+    accounts = dict(session.exec(select(Account.name, Account.id)).all())
+    categories = {
+        name: (category_id, category_type)
+        for category_id, name, category_type in session.exec(
+            select(Category.id, Category.name, Category.type)
+        ).all()
+    }
+    subcategories = {
+        (category_id, name): subcategory_id
+        for subcategory_id, name, category_id in session.exec(
+            select(SubCategory.id, SubCategory.name, SubCategory.category_id)
+        ).all()
+    }
+
+    connection = session.connection()
+    raw = connection.dialect.name == "sqlite"
+    if raw:
+        # The stored fingerprints are looked up before each chunk is inserted:
+        # hold the write lock so no other writer adds one in between
+        begin_write(session)
+        table = connection.dialect.identifier_preparer.format_table(
+            Transaction.__table__
+        )
+        raw_insert = (
+            f"INSERT OR IGNORE INTO {table} ({', '.join(SQLITE_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(SQLITE_COLUMNS))})"
+        )
+
+        def insert_chunk(chunk: list) -> list[str]:
+            return _insert_sqlite(session, raw_insert, chunk)
+
+    else:
+        statement = insert_or_ignore(session, Transaction).returning(
+            Transaction.__table__.c.fingerprint
+        )
+
+        def insert_chunk(chunk: list) -> list[str]:
+            return connection.execute(statement, chunk).scalars().all()
+
+    now = datetime.utcnow()
+    raw_now = now.isoformat(" ", "microseconds")
+    occurrences = {}
+    movements = {}
+    deltas = {}
+    chunk = []
+    imported = 0
+    skipped = 0
+    errors = []
+    error_count = 0
+    for line, row in rows:
+        if defaults:
+            row = {**defaults, **{key: value for key, value in row.items() if value}}
+        try:
+            account_id = accounts.get(row.get("account"))
+            if account_id is None:
+                raise ImportRowError(f"Unknown account: {row.get('account')}")
+            category_id, category_type = categories.get(
+                row.get("category"), (None, None)
+            )
+            if category_id is None:
+                raise ImportRowError(f"Unknown category: {row.get('category')}")
+            subcategory_id = subcategories.get((category_id, row.get("subcategory")))
+            if subcategory_id is None:
+                raise ImportRowError(f"Unknown subcategory: {row.get('subcategory')}")
+            try:
+                text = (row.get("amount") or "").strip()
+                amount = Decimal(text).quantize(CENT)
+            except InvalidOperation:
+                amount = None
+            if amount is None or amount.is_nan():
+                raise ImportRowError(f"Invalid amount: {row.get('amount')}")
+            if text.startswith(("-", "+")) and category_type != CategoryTypeEnum.income:
+                # A signed amount is the change of the balance, which an expense
+                # subtracts: a -50 debit is a 50 expense, a +20 refund a -20 one
+                amount = -amount
+            try:
+                transaction_date = datetime.fromisoformat(row.get("transaction_date"))
+            except (TypeError, ValueError):
+                raise ImportRowError(
+                    f"Invalid transaction_date: {row.get('transaction_date')}"
+                )
+        except ImportRowError as exc:
+            error_count += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"row": line, "error": str(exc)})
+            continue
+
+        # Identical movements of a statement are told apart by their position
+        base = fingerprint_base(
+            account_id, transaction_date, amount, row.get("description", "")
+        )
+        occurrences[base] = occurrence = occurrences.get(base, 0) + 1
+        row_fingerprint = fingerprint(base, occurrence)
+        signed = amount if category_type == CategoryTypeEnum.income else -amount
+        movements[row_fingerprint] = ((account_id, transaction_date.date()), signed)
+        if raw:
+            # Serialized as SQLAlchemy binds them on SQLite, in SQLITE_COLUMNS order
+            chunk.append(
+                (
+                    row_fingerprint,
+                    float(amount),
+                    row.get("description", ""),
+                    transaction_date.isoformat(" ", "microseconds"),
+                    raw_now,
+                    raw_now,
+                    False,
+                    category_id,
+                    subcategory_id,
+                    account_id,
+                )
+            )
+        else:
+            chunk.append(
+                {
+                    "fingerprint": row_fingerprint,
+                    "amount": amount,
+                    "description": row.get("description", ""),
+                    "transaction_date": transaction_date,
+                    "created_at": now,
+                    "updated_at": now,
+                    "is_planned": False,
+                    "category_id": category_id,
+                    "subcategory_id": subcategory_id,
+                    "account_id": account_id,
+                }
+            )
+        if len(chunk) >= chunk_size:
+            inserted = _insert_chunk(insert_chunk, chunk, movements, deltas)
+            imported += inserted
+            skipped += len(chunk) - inserted
+            chunk = []
+    if chunk:
+        inserted = _insert_chunk(insert_chunk, chunk, movements, deltas)
+        imported += inserted
+        skipped += len(chunk) - inserted
+
+    apply_daily_deltas(session, deltas)
+    return {
+        "imported": imported,
+        "skipped": skipped,
+        "rejected": error_count,
+        "errors": errors,
+    }
+
+
+def _insert_sqlite(session: Session, statement: str, chunk: list[tuple]) -> list[str]:
+    """
+    Insert pre-serialized rows with the executemany of the DBAPI, without the
+    per-row bind processing of SQLAlchemy. sqlite3 returns no rows from an
+    executemany, so the rows whose fingerprint is stored are left out first.
+
+    Returns:
+        The fingerprints of the inserted rows
+    """
+    stored = stored_fingerprints(session, [row[0] for row in chunk])
+    rows = [row for row in chunk if row[0] not in stored]
+    if rows:
+        session.connection().exec_driver_sql(statement, rows)
+    return [row[0] for row in rows]
+
+
+def _insert_chunk(insert_chunk, chunk, movements, deltas) -> int:
+    """Insert a chunk and add the balance change of the rows that were not skipped."""
+    inserted = insert_chunk(chunk)
+    for row_fingerprint in inserted:
+        key, signed = movements[row_fingerprint]
+        deltas[key] = deltas.get(key, 0) + signed
+    movements.clear()
+    return len(inserted)
@@ -1,15 +1,85 @@
 import calendar
+import csv
 from contextlib import asynccontextmanager
 from datetime import date, datetime
 from typing import List, Optional
 
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import (
+    APIRouter,
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.orm import joinedload, selectinload
 from sqlmodel import Session, select
-
-from .database import create_db_and_tables, drop_db_and_tables, get_session, populate_db
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .balances import (
+    balance_history,
+    rebuild_snapshots,
+    record_transactions,
+    snapshot_balance,
+    snapshot_balance_by_currency,
+    snapshot_balance_per_account,
+)
+from .batch import (
+    EmptySelection,
+    batch_delete,
+    batch_update,
+    budget_conditions,
+    select_ids,
+    transaction_conditions,
+)
+from .cache import ResultCache, bump_generation, get_generation
+from .crud import create_row, delete_row, update_row, write_transaction
+from .database import (
+    create_write_queue,
+    drop_db_and_tables,
+    engine,
+    get_async_session,
+    get_read_session,
+    get_session,
+    replica_engine,
+    reset_db,
+    tenant_engines,
+    upgrade_db,
+)
+from .etags import NotModified, async_conditional_get, conditional_get
+from .exports import (
+    COLUMNAR_MEDIA_TYPES,
+    EXPORT_MEDIA_TYPES,
+    ColumnarFormatEnum,
+    ExportFormatEnum,
+    export_transactions,
+    export_transactions_columnar,
+)
+from .fieldsets import Fieldset, InvalidFields
+from .fingerprints import FINGERPRINT_FIELDS, next_fingerprint, refresh_fingerprints
+from .fx import (
+    FxRateNotFound,
+    convert_accounts,
+    convert_by_currency,
+    fx_rate_cache,
+)
+from .idempotency import RequestInProgress, claim_key, store_response
+from .importers import (
+    IMPORT_CHUNK_SIZE,
+    MAX_IMPORT_CHUNK_SIZE,
+    ImportFormatEnum,
+    import_transactions,
+    read_csv,
+    read_ofx,
+)
 from .models import (
     Account,
     AccountCreate,
+    AccountOrderEnum,
     AccountPublic,
     AccountPublicWithTypeAndCurrency,
     AccountType,
@@ -17,9 +87,12 @@ from .models import (
     AccountTypePublic,
     AccountTypeUpdate,
     AccountUpdate,
+    BalanceGranularityEnum,
     Budget,
+    BudgetBatchUpdate,
     BudgetCreate,
     BudgetPublic,
+    BudgetSelection,
     BudgetUpdate,
     Category,
     CategoryCreate,
@@ -31,20 +104,37 @@ from .models import (
     CurrencyPublic,
     CurrencyUpdate,
     PlannedTransaction,
+    PlannedTransactionBatchUpdate,
     PlannedTransactionCreate,
     PlannedTransactionPublic,
     PlannedTransactionUpdate,
+    SortDirectionEnum,
     SubCategory,
     SubCategoryCreate,
     SubCategoryPublic,
     SubCategoryPublicWithCategory,
     SubCategoryUpdate,
     Transaction,
+    TransactionBatchUpdate,
     TransactionCreate,
+    TransactionOrderEnum,
     TransactionPublic,
     TransactionPublicWithCategorySubcategoryAndAccount,
+    TransactionSelection,
     TransactionUpdate,
 )
+from .pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    InvalidCursor,
+    apply_order,
+    paginate,
+)
+from .pools import pool_stats
+from .settings import settings
+from .startup import WorkerPool
+from .tenants import InvalidTenant, TenantMiddleware
+from .writer import WriteQueueClosed
 
 
 @asynccontextmanager
@@ -56,13 +146,161 @@ async def lifespan(app: FastAPI):
     Args:
         app (FastAPI): FastAPI App
     """
-    create_db_and_tables()
-    populate_db()
+    # Every worker of a multi-process deployment runs the lifespan: the demo data
+    # is reset by the first one to start only, and dropped by the last to stop
+    pool = WorkerPool(settings.lock_path)
+    if settings.database_init == "reset":
+        pool.start(first=reset_db)
+    else:
+        pool.start(every=upgrade_db)
     yield
-    drop_db_and_tables()
+    if write_queue is not None:
+        write_queue.stop()
+    if tenant_engines is not None:
+        tenant_engines.dispose_all()
+    pool.stop(last=drop_db_and_tables if settings.database_init == "reset" else None)
 
 
 app = FastAPI(lifespan=lifespan)
+if tenant_engines is not None:
+    app.add_middleware(TenantMiddleware)
+
+result_cache = ResultCache(maxsize=256, on_invalidate=fx_rate_cache.clear)
+
+write_queue = create_write_queue(engine)
+
+
+def cached(session: Session, key: tuple, compute):
+    """
+    Serve an aggregate from the result cache of the current data generation, the
+    one of the session's tenant in tenant mode.
+    """
+    cache = session.info.get("result_cache", result_cache)
+    return cache.get_or_compute(key, get_generation(session), compute)
+
+
+def write(session: Session, operation):
+    """
+    Run the write of a request, a function of a session, and commit it: on the
+    request session, or on the writer thread when the write queue is enabled.
+    """
+    queue = session.info.get("write_queue", write_queue)
+    if queue is not None:
+        try:
+            return queue.submit(operation)
+        except WriteQueueClosed:
+            if "tenant" not in session.info:
+                raise
+            # The tenant was evicted from the cache after the request opened its
+            # session: write through the queue of its database opened again
+            tenant_database = tenant_engines.get(session.info["tenant"])
+            return tenant_database.info["write_queue"].submit(operation)
+    with write_transaction(session):
+        result = operation(session)
+        session.commit()
+    return result
+
+
+@app.exception_handler(InvalidCursor)
+def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(InvalidFields)
+def invalid_fields_handler(request: Request, exc: InvalidFields):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(NotModified)
+def not_modified_handler(request: Request, exc: NotModified):
+    return Response(status_code=304, headers={"ETag": exc.etag})
+
+
+@app.exception_handler(EmptySelection)
+def empty_selection_handler(request: Request, exc: EmptySelection):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(RequestInProgress)
+def request_in_progress_handler(request: Request, exc: RequestInProgress):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+
+@app.exception_handler(FxRateNotFound)
+def fx_rate_not_found_handler(request: Request, exc: FxRateNotFound):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(InvalidTenant)
+def invalid_tenant_handler(request: Request, exc: InvalidTenant):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+# Relationships serialized by the nested response models, loaded with the rows
+ACCOUNT_RELATIONSHIPS = (joinedload(Account.currency), joinedload(Account.account_type))
+CATEGORY_RELATIONSHIPS = (selectinload(Category.subcategories),)
+SUB_CATEGORY_RELATIONSHIPS = (joinedload(SubCategory.category),)
+TRANSACTION_RELATIONSHIPS = (
+    joinedload(Transaction.category),
+    joinedload(Transaction.subcategory),
+    joinedload(Transaction.account),
+)
+
+# Sort keys of the orderings accepted by the list endpoints. All of them are backed
+# by an index and end with the primary key, so they also work as keyset cursors.
+ACCOUNT_SORT_KEYS = {
+    AccountOrderEnum.created_at: (Account.created_at, Account.id),
+    AccountOrderEnum.id: (Account.id,),
+}
+TRANSACTION_SORT_KEYS = {
+    TransactionOrderEnum.transaction_date: (
+        Transaction.transaction_date,
+        Transaction.id,
+    ),
+    TransactionOrderEnum.account_id: (
+        Transaction.account_id,
+        Transaction.transaction_date,
+        Transaction.id,
+    ),
+    TransactionOrderEnum.id: (Transaction.id,),
+}
+PLANNED_TRANSACTION_SORT_KEYS = {
+    TransactionOrderEnum.transaction_date: (
+        PlannedTransaction.transaction_date,
+        PlannedTransaction.id,
+    ),
+    TransactionOrderEnum.account_id: (
+        PlannedTransaction.account_id,
+        PlannedTransaction.transaction_date,
+        PlannedTransaction.id,
+    ),
+    TransactionOrderEnum.id: (PlannedTransaction.id,),
+}
+
+# Fields that can be requested with `fields=` on the list endpoints
+ACCOUNT_FIELDSET = Fieldset(
+    Account,
+    AccountPublic,
+    {
+        "currency": (Currency, CurrencyPublic, Account.currency_id),
+        "account_type": (AccountType, AccountTypePublic, Account.account_type_id),
+    },
+)
+TRANSACTION_FIELDSET = Fieldset(
+    Transaction,
+    TransactionPublic,
+    {
+        "category": (Category, CategoryPublic, Transaction.category_id),
+        "subcategory": (SubCategory, SubCategoryPublic, Transaction.subcategory_id),
+        "account": (Account, AccountPublic, Transaction.account_id),
+    },
+)
+PLANNED_TRANSACTION_FIELDSET = Fieldset(
+    PlannedTransaction, PlannedTransactionPublic, {}
+)
+
+# Transaction fields that change the balance snapshots when updated
+BALANCE_FIELDS = {"amount", "transaction_date", "account_id", "category_id"}
 
 
 # Currencies endpoints
@@ -70,21 +308,26 @@ app = FastAPI(lifespan=lifespan)
 def create_currency(
     *, session: Session = Depends(get_session), currency: CurrencyCreate
 ):
-    db_currency = Currency.model_validate(currency)
-    session.add(db_currency)
-    session.commit()
-    session.refresh(db_currency)
-    return db_currency
+    def operation(session: Session):
+        db_currency = create_row(session, Currency, currency)
+        bump_generation(session)
+        return db_currency
+
+    return write(session, operation)
 
 
-@app.get("/currencies/", response_model=list[CurrencyPublic])
-def get_currencies(*, session: Session = Depends(get_session)):
+@app.get(
+    "/currencies/",
+    response_model=list[CurrencyPublic],
+    dependencies=[Depends(conditional_get(Currency))],
+)
+def get_currencies(*, session: Session = Depends(get_read_session)):
     currencies = session.exec(select(Currency)).all()
     return currencies
 
 
 @app.get("/currencies/{currency_id}", response_model=CurrencyPublic)
-def get_currency(*, session: Session = Depends(get_session), currency_id: int):
+def get_currency(*, session: Session = Depends(get_read_session), currency_id: int):
     currency = session.get(Currency, currency_id)
     if not currency:
         raise HTTPException(status_code=404, detail="Currency not found")
@@ -98,26 +341,25 @@ def update_currency(
     currency_id: int,
     currency: CurrencyUpdate,
 ):
-    db_currency = session.get(Currency, currency_id)
-    if not db_currency:
-        raise HTTPException(status_code=404, detail="Currency not found")
-    currency_data = currency.model_dump(exclude_unset=True)
-    for key, value in currency_data.items():
-        setattr(db_currency, key, value)
-    session.add(db_currency)
-    session.commit()
-    session.refresh(db_currency)
-    return db_currency
+    def operation(session: Session):
+        db_currency = update_row(session, Currency, currency_id, currency)
+        if not db_currency:
+            raise HTTPException(status_code=404, detail="Currency not found")
+        bump_generation(session)
+        return db_currency
+
+    return write(session, operation)
 
 
 @app.delete("/currencies/{currency_id}")
 def delete_currency(*, session: Session = Depends(get_session), currency_id: int):
-    currency = session.get(Currency, currency_id)
-    if not currency:
-        raise HTTPException(status_code=404, detail="Currency not found")
-    session.delete(currency)
-    session.commit()
-    return {"ok": True}
+    def operation(session: Session):
+        if not delete_row(session, Currency, currency_id):
+            raise HTTPException(status_code=404, detail="Currency not found")
+        bump_generation(session)
+        return {"ok": True}
+
+    return write(session, operation)
 
 
 # Account Types endpoints
@@ -125,21 +367,28 @@ def delete_currency(*, session: Session = Depends(get_session), currency_id: int
 def create_account_type(
     *, session: Session = Depends(get_session), account_type: AccountTypeCreate
 ):
-    db_account_type = AccountType.model_validate(account_type)
-    session.add(db_account_type)
-    session.commit()
-    session.refresh(db_account_type)
-    return db_account_type
+    def operation(session: Session):
+        db_account_type = create_row(session, AccountType, account_type)
+        bump_generation(session)
+        return db_account_type
+
+    return write(session, operation)
 
 
-@app.get("/account_types/", response_model=list[AccountTypePublic])
-def get_account_types(*, session: Session = Depends(get_session)):
+@app.get(
+    "/account_types/",
+    response_model=list[AccountTypePublic],
+    dependencies=[Depends(conditional_get(AccountType))],
+)
+def get_account_types(*, session: Session = Depends(get_read_session)):
     account_types = session.exec(select(AccountType)).all()
     return account_types
 
 
 @app.get("/account_types/{account_type_id}", response_model=AccountTypePublic)
-def get_account_type(*, session: Session = Depends(get_session), account_type_id: int):
+def get_account_type(
+    *, session: Session = Depends(get_read_session), account_type_id: int
+):
     account_type = session.get(AccountType, account_type_id)
     if not account_type:
         raise HTTPException(status_code=404, detail="Account Type not found")
@@ -153,50 +402,73 @@ def update_account_type(
     account_type_id: int,
     account_type: AccountTypeUpdate,
 ):
-    db_account_type = session.get(AccountType, account_type_id)
-    if not db_account_type:
-        raise HTTPException(status_code=404, detail="Account Type not found")
-    account_type_data = account_type.model_dump(exclude_unset=True)
-    for key, value in account_type_data.items():
-        setattr(db_account_type, key, value)
-    session.add(db_account_type)
-    session.commit()
-    session.refresh(db_account_type)
-    return db_account_type
+    def operation(session: Session):
+        db_account_type = update_row(
+            session, AccountType, account_type_id, account_type
+        )
+        if not db_account_type:
+            raise HTTPException(status_code=404, detail="Account Type not found")
+        bump_generation(session)
+        return db_account_type
+
+    return write(session, operation)
 
 
 @app.delete("/account_types/{account_type_id}")
 def delete_account_type(
     *, session: Session = Depends(get_session), account_type_id: int
 ):
-    account_type = session.get(AccountType, account_type_id)
-    if not account_type:
-        raise HTTPException(status_code=404, detail="Account Type not found")
-    session.delete(account_type)
-    session.commit()
-    return {"ok": True}
+    def operation(session: Session):
+        if not delete_row(session, AccountType, account_type_id):
+            raise HTTPException(status_code=404, detail="Account Type not found")
+        bump_generation(session)
+        return {"ok": True}
+
+    return write(session, operation)
 
 
 # Accounts endpoints
 @app.post("/accounts/", response_model=AccountPublic)
 def create_account(*, session: Session = Depends(get_session), account: AccountCreate):
-    db_account = Account.model_validate(account)
-    session.add(db_account)
-    session.commit()
-    session.refresh(db_account)
-    return db_account
+    def operation(session: Session):
+        db_account = create_row(session, Account, account)
+        bump_generation(session)
+        return db_account
+
+    return write(session, operation)
 
 
-@app.get("/accounts/", response_model=list[AccountPublicWithTypeAndCurrency])
-def get_accounts(*, session: Session = Depends(get_session)):
-    accounts: List[Account] = session.exec(select(Account)).all()
-    accounts: List[Account] = sorted(accounts, key=lambda x: (x.created_at))
+@app.get(
+    "/accounts/",
+    response_model=list[AccountPublicWithTypeAndCurrency],
+    dependencies=[Depends(conditional_get(Account, Currency, AccountType))],
+)
+def get_accounts(
+    *,
+    order_by: AccountOrderEnum = AccountOrderEnum.created_at,
+    direction: SortDirectionEnum = SortDirectionEnum.asc,
+    fields: Optional[str] = None,
+    response: Response,
+    session: Session = Depends(get_read_session),
+):
+    sort_key = ACCOUNT_SORT_KEYS[order_by]
+    if fields:
+        paths = ACCOUNT_FIELDSET.parse(fields)
+        statement = apply_order(ACCOUNT_FIELDSET.select(paths), sort_key, direction)
+        return Response(
+            ACCOUNT_FIELDSET.dump_json(paths, session.exec(statement).all()),
+            media_type="application/json",
+            headers=response.headers,
+        )
+    statement = select(Account).options(*ACCOUNT_RELATIONSHIPS)
+    statement = apply_order(statement, sort_key, direction)
+    accounts: List[Account] = session.exec(statement).all()
     return accounts
 
 
 @app.get("/accounts/{account_id}", response_model=AccountPublicWithTypeAndCurrency)
-def get_account(*, session: Session = Depends(get_session), account_id: int):
-    account = session.get(Account, account_id)
+def get_account(*, session: Session = Depends(get_read_session), account_id: int):
+    account = session.get(Account, account_id, options=ACCOUNT_RELATIONSHIPS)
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
     return account
@@ -206,26 +478,25 @@ def get_account(*, session: Session = Depends(get_session), account_id: int):
 def update_account(
     *, session: Session = Depends(get_session), account_id: int, account: AccountUpdate
 ):
-    db_account = session.get(Account, account_id)
-    if not db_account:
-        raise HTTPException(status_code=404, detail="Account not found")
-    account_data = account.model_dump(exclude_unset=True)
-    for key, value in account_data.items():
-        setattr(db_account, key, value)
-    session.add(db_account)
-    session.commit()
-    session.refresh(db_account)
-    return db_account
+    def operation(session: Session):
+        db_account = update_row(session, Account, account_id, account)
+        if not db_account:
+            raise HTTPException(status_code=404, detail="Account not found")
+        bump_generation(session)
+        return db_account
+
+    return write(session, operation)
 
 
 @app.delete("/accounts/{account_id}")
 def delete_account(*, session: Session = Depends(get_session), account_id: int):
-    account = session.get(Account, account_id)
-    if not account:
-        raise HTTPException(status_code=404, detail="Account not found")
-    session.delete(account)
-    session.commit()
-    return {"ok": True}
+    def operation(session: Session):
+        if not delete_row(session, Account, account_id):
+            raise HTTPException(status_code=404, detail="Account not found")
+        bump_generation(session)
+        return {"ok": True}
+
+    return write(session, operation)
 
 
 # Categories endpoints
@@ -233,22 +504,27 @@ def delete_account(*, session: Session = Depends(get_session), account_id: int):
 def create_category(
     *, session: Session = Depends(get_session), category: CategoryCreate
 ):
-    db_category = Category.model_validate(category)
-    session.add(db_category)
-    session.commit()
-    session.refresh(db_category)
-    return db_category
+    def operation(session: Session):
+        db_category = create_row(session, Category, category)
+        bump_generation(session)
+        return db_category
 
+    return write(session, operation)
 
-@app.get("/categories/", response_model=list[CategoryPublicWithSubcategories])
-def get_categories(*, session: Session = Depends(get_session)):
-    categories = session.exec(select(Category)).all()
+
+@app.get(
+    "/categories/",
+    response_model=list[CategoryPublicWithSubcategories],
+    dependencies=[Depends(conditional_get(Category, SubCategory))],
+)
+def get_categories(*, session: Session = Depends(get_read_session)):
+    categories = session.exec(select(Category).options(*CATEGORY_RELATIONSHIPS)).all()
     return categories
 
 
 @app.get("/categories/{category_id}", response_model=CategoryPublicWithSubcategories)
-def get_category(*, session: Session = Depends(get_session), category_id: int):
-    category = session.get(Category, category_id)
+def get_category(*, session: Session = Depends(get_read_session), category_id: int):
+    category = session.get(Category, category_id, options=CATEGORY_RELATIONSHIPS)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     return category
@@ -261,26 +537,29 @@ def update_category(
     category_id: int,
     category: CategoryUpdate,
 ):
-    db_category = session.get(Category, category_id)
-    if not db_category:
-        raise HTTPException(status_code=404, detail="Category not found")
-    category_data = category.model_dump(exclude_unset=True)
-    for key, value in category_data.items():
-        setattr(db_category, key, value)
-    session.add(db_category)
-    session.commit()
-    session.refresh(db_category)
-    return db_category
+    def operation(session: Session):
+        db_category = update_row(session, Category, category_id, category)
+        if not db_category:
+            raise HTTPException(status_code=404, detail="Category not found")
+        if "type" in category.model_fields_set:
+            # The category type decides the sign of every transaction that uses it
+            rebuild_snapshots(session)
+        bump_generation(session)
+        return db_category
+
+    return write(session, operation)
 
 
 @app.delete("/categories/{category_id}")
 def delete_category(*, session: Session = Depends(get_session), category_id: int):
-    category = session.get(Category, category_id)
-    if not category:
-        raise HTTPException(status_code=404, detail="Category not found")
-    session.delete(category)
-    session.commit()
-    return {"ok": True}
+    def operation(session: Session):
+        if not delete_row(session, Category, category_id):
+            raise HTTPException(status_code=404, detail="Category not found")
+        rebuild_snapshots(session)
+        bump_generation(session)
+        return {"ok": True}
+
+    return write(session, operation)
 
 
 # SubCategories endpoints
@@ -288,24 +567,35 @@ def delete_category(*, session: Session = Depends(get_session), category_id: int
 def create_sub_category(
     *, session: Session = Depends(get_session), sub_category: SubCategoryCreate
 ):
-    db_sub_category = SubCategory.model_validate(sub_category)
-    session.add(db_sub_category)
-    session.commit()
-    session.refresh(db_sub_category)
-    return db_sub_category
+    def operation(session: Session):
+        db_sub_category = create_row(session, SubCategory, sub_category)
+        bump_generation(session)
+        return db_sub_category
 
+    return write(session, operation)
 
-@app.get("/sub_categories/", response_model=list[SubCategoryPublicWithCategory])
-def get_sub_categories(*, session: Session = Depends(get_session)):
-    sub_categories = session.exec(select(SubCategory)).all()
+
+@app.get(
+    "/sub_categories/",
+    response_model=list[SubCategoryPublicWithCategory],
+    dependencies=[Depends(conditional_get(SubCategory, Category))],
+)
+def get_sub_categories(*, session: Session = Depends(get_read_session)):
+    sub_categories = session.exec(
+        select(SubCategory).options(*SUB_CATEGORY_RELATIONSHIPS)
+    ).all()
     return sub_categories
 
 
 @app.get(
     "/sub_categories/{sub_category_id}", response_model=SubCategoryPublicWithCategory
 )
-def get_sub_category(*, session: Session = Depends(get_session), sub_category_id: int):
-    sub_category = session.get(SubCategory, sub_category_id)
+def get_sub_category(
+    *, session: Session = Depends(get_read_session), sub_category_id: int
+):
+    sub_category = session.get(
+        SubCategory, sub_category_id, options=SUB_CATEGORY_RELATIONSHIPS
+    )
     if not sub_category:
         raise HTTPException(status_code=404, detail="SubCategory not found")
     return sub_category
@@ -318,28 +608,29 @@ def update_sub_category(
     sub_category_id: int,
     sub_category: SubCategoryUpdate,
 ):
-    db_sub_category = session.get(SubCategory, sub_category_id)
-    if not db_sub_category:
-        raise HTTPException(status_code=404, detail="SubCategory not found")
-    sub_category_data = sub_category.model_dump(exclude_unset=True)
-    for key, value in sub_category_data.items():
-        setattr(db_sub_category, key, value)
-    session.add(db_sub_category)
-    session.commit()
-    session.refresh(db_sub_category)
-    return db_sub_category
+    def operation(session: Session):
+        db_sub_category = update_row(
+            session, SubCategory, sub_category_id, sub_category
+        )
+        if not db_sub_category:
+            raise HTTPException(status_code=404, detail="SubCategory not found")
+        bump_generation(session)
+        return db_sub_category
+
+    return write(session, operation)
 
 
 @app.delete("/sub_categories/{sub_category_id}")
 def delete_sub_category(
     *, session: Session = Depends(get_session), sub_category_id: int
 ):
-    sub_category = session.get(SubCategory, sub_category_id)
-    if not sub_category:
-        raise HTTPException(status_code=404, detail="SubCategory not found")
-    session.delete(sub_category)
-    session.commit()
-    return {"ok": True}
+    def operation(session: Session):
+        if not delete_row(session, SubCategory, sub_category_id):
+            raise HTTPException(status_code=404, detail="SubCategory not found")
+        bump_generation(session)
+        return {"ok": True}
+
+    return write(session, operation)
 
 
 # Transactions endpoints
@@ -347,11 +638,58 @@ def delete_sub_category(
 def create_transaction(
     *, session: Session = Depends(get_session), transaction: TransactionCreate
 ):
-    db_transaction = Transaction.model_validate(transaction)
-    session.add(db_transaction)
-    session.commit()
-    session.refresh(db_transaction)
-    return db_transaction
+    def operation(session: Session):
+        new_transaction = Transaction.model_validate(transaction)
+        new_transaction.fingerprint = next_fingerprint(session, new_transaction)
+        db_transaction = create_row(session, Transaction, new_transaction)
+        record_transactions(session, [db_transaction["id"]])
+        bump_generation(session)
+        return db_transaction
+
+    return write(session, operation)
+
+
+@app.post("/transactions/import")
+def import_transactions_file(
+    *,
+    file: UploadFile,
+    format: Optional[ImportFormatEnum] = None,
+    account: Optional[str] = None,
+    category: Optional[str] = None,
+    subcategory: Optional[str] = None,
+    chunk_size: int = Query(default=IMPORT_CHUNK_SIZE, ge=1, le=MAX_IMPORT_CHUNK_SIZE),
+    idempotency_key: Optional[str] = Header(default=None),
+    session: Session = Depends(get_session),
+):
+    if format is None:
+        extension = (file.filename or "").rpartition(".")[2].lower()
+        if extension not in ImportFormatEnum.__members__:
+            raise HTTPException(status_code=400, detail="Unknown file format")
+        format = ImportFormatEnum(extension)
+    reader = read_csv if format == ImportFormatEnum.csv else read_ofx
+    defaults = {"account": account, "category": category, "subcategory": subcategory}
+
+    def operation(session: Session):
+        if idempotency_key:
+            stored_report = claim_key(session, idempotency_key)
+            if stored_report is not None:
+                return stored_report
+        # The write queue runs an operation again when its batch fails to commit:
+        # read the file from the start every time
+        file.file.seek(0)
+        try:
+            report = import_transactions(
+                session, reader(file.file), defaults, chunk_size
+            )
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise HTTPException(status_code=400, detail=f"Unreadable file: {exc}")
+        if idempotency_key:
+            store_response(session, idempotency_key, report)
+        if report["imported"]:
+            bump_generation(session)
+        return report
+
+    return write(session, operation)
 
 
 @app.get(
@@ -370,30 +708,159 @@ def get_transactions(
         59,
         999999,
     ),
-    session: Session = Depends(get_session),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    unpaginated: bool = False,
+    order_by: TransactionOrderEnum = TransactionOrderEnum.transaction_date,
+    direction: SortDirectionEnum = SortDirectionEnum.asc,
+    fields: Optional[str] = None,
+    response: Response,
+    session: Session = Depends(get_read_session),
 ):
+    sort_key = TRANSACTION_SORT_KEYS[order_by]
+    if fields:
+        paths = TRANSACTION_FIELDSET.parse(fields)
+        statement = TRANSACTION_FIELDSET.select(paths, sort_key)
+    else:
+        statement = select(Transaction).options(*TRANSACTION_RELATIONSHIPS)
+    statement = statement.where(Transaction.transaction_date <= end_date)
     if start_date:
-        transactions: List[Transaction] = session.exec(
-            select(Transaction)
-            .where(Transaction.transaction_date >= start_date)
-            .where(Transaction.transaction_date <= end_date)
-        ).all()
+        statement = statement.where(Transaction.transaction_date >= start_date)
+    if unpaginated:
+        transactions = session.exec(apply_order(statement, sort_key, direction)).all()
+        next_cursor = None
     else:
-        transactions: List[Transaction] = session.exec(
-            select(Transaction).where(Transaction.transaction_date <= end_date)
-        ).all()
-    transactions: List[Transaction] = sorted(
-        transactions, key=lambda x: x.transaction_date
+        transactions, next_cursor = paginate(
+            session, statement, sort_key, limit, cursor, direction
+        )
+    if fields:
+        response = Response(
+            TRANSACTION_FIELDSET.dump_json(paths, transactions),
+            media_type="application/json",
+            headers=response.headers,
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response if fields else transactions
+
+
+@app.get("/transactions/export")
+def export_transactions_file(
+    *,
+    export_format: ExportFormatEnum = Query(
+        default=ExportFormatEnum.ndjson, alias="format"
+    ),
+    start_date: Optional[date] = None,
+    end_date: Optional[datetime] = None,
+    account_ids: List[int] = Query(default=[]),
+    category_ids: List[int] = Query(default=[]),
+    session: Session = Depends(get_read_session),
+):
+    content = export_transactions(
+        session.get_bind(),
+        export_format,
+        start_date,
+        end_date,
+        account_ids,
+        category_ids,
+    )
+    return StreamingResponse(
+        content,
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": (
+                f"attachment; filename=transactions.{export_format.value}"
+            )
+        },
     )
-    return transactions
+
+
+@app.get("/transactions/export/columnar")
+def export_transactions_columnar_file(
+    *,
+    export_format: ColumnarFormatEnum = Query(
+        default=ColumnarFormatEnum.arrow, alias="format"
+    ),
+    start_date: Optional[date] = None,
+    end_date: Optional[datetime] = None,
+    account_ids: List[int] = Query(default=[]),
+    category_ids: List[int] = Query(default=[]),
+    session: Session = Depends(get_read_session),
+):
+    content = export_transactions_columnar(
+        session.get_bind(),
+        export_format,
+        start_date,
+        end_date,
+        account_ids,
+        category_ids,
+    )
+    return StreamingResponse(
+        content,
+        media_type=COLUMNAR_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": (
+                f"attachment; filename=transactions.{export_format.value}"
+            )
+        },
+    )
+
+
+@app.patch("/transactions/batch")
+def update_transactions_batch(
+    *, session: Session = Depends(get_session), batch: TransactionBatchUpdate
+):
+    def operation(session: Session):
+        ids = select_ids(
+            session,
+            Transaction,
+            batch.ids,
+            transaction_conditions(Transaction, batch.filter),
+        )
+        changes = batch.changes.model_dump(exclude_unset=True)
+        moves_balance = bool(changes.keys() & BALANCE_FIELDS)
+        if moves_balance:
+            record_transactions(session, ids, sign=-1)
+        updated = batch_update(session, Transaction, ids, changes)
+        if moves_balance:
+            record_transactions(session, ids)
+        if changes.keys() & FINGERPRINT_FIELDS:
+            refresh_fingerprints(session, ids)
+        bump_generation(session)
+        return {"updated": updated}
+
+    return write(session, operation)
+
+
+@app.delete("/transactions/batch")
+def delete_transactions_batch(
+    *, session: Session = Depends(get_session), batch: TransactionSelection
+):
+    def operation(session: Session):
+        ids = select_ids(
+            session,
+            Transaction,
+            batch.ids,
+            transaction_conditions(Transaction, batch.filter),
+        )
+        record_transactions(session, ids, sign=-1)
+        deleted = batch_delete(session, Transaction, ids)
+        bump_generation(session)
+        return {"deleted": deleted}
+
+    return write(session, operation)
 
 
 @app.get(
     "/transactions/{transaction_id}",
     response_model=TransactionPublicWithCategorySubcategoryAndAccount,
 )
-def get_transaction(*, session: Session = Depends(get_session), transaction_id: int):
-    transaction = session.get(Transaction, transaction_id)
+def get_transaction(
+    *, session: Session = Depends(get_read_session), transaction_id: int
+):
+    transaction = session.get(
+        Transaction, transaction_id, options=TRANSACTION_RELATIONSHIPS
+    )
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     return transaction
@@ -406,26 +873,33 @@ def update_transaction(
     transaction_id: int,
     transaction: TransactionUpdate,
 ):
-    db_transaction = session.get(Transaction, transaction_id)
-    if not db_transaction:
-        raise HTTPException(status_code=404, detail="Transaction not found")
-    transaction_data = transaction.model_dump(exclude_unset=True)
-    for key, value in transaction_data.items():
-        setattr(db_transaction, key, value)
-    session.add(db_transaction)
-    session.commit()
-    session.refresh(db_transaction)
-    return db_transaction
+    def operation(session: Session):
+        moves_balance = bool(transaction.model_fields_set & BALANCE_FIELDS)
+        if moves_balance:
+            record_transactions(session, [transaction_id], sign=-1)
+        db_transaction = update_row(session, Transaction, transaction_id, transaction)
+        if not db_transaction:
+            raise HTTPException(status_code=404, detail="Transaction not found")
+        if moves_balance:
+            record_transactions(session, [transaction_id])
+        if transaction.model_fields_set & FINGERPRINT_FIELDS:
+            refresh_fingerprints(session, [transaction_id])
+        bump_generation(session)
+        return db_transaction
+
+    return write(session, operation)
 
 
 @app.delete("/transactions/{transaction_id}")
 def delete_transaction(*, session: Session = Depends(get_session), transaction_id: int):
-    transaction = session.get(Transaction, transaction_id)
-    if not transaction:
-        raise HTTPException(status_code=404, detail="Transaction not found")
-    session.delete(transaction)
-    session.commit()
-    return {"ok": True}
+    def operation(session: Session):
+        record_transactions(session, [transaction_id], sign=-1)
+        if not delete_row(session, Transaction, transaction_id):
+            raise HTTPException(status_code=404, detail="Transaction not found")
+        bump_generation(session)
+        return {"ok": True}
+
+    return write(session, operation)
 
 
 # Planned Transactions endpoints
@@ -435,11 +909,14 @@ def create_planned_transaction(
     session: Session = Depends(get_session),
     planned_transaction: PlannedTransactionCreate,
 ):
-    db_planned_transaction = PlannedTransaction.model_validate(planned_transaction)
-    session.add(db_planned_transaction)
-    session.commit()
-    session.refresh(db_planned_transaction)
-    return db_planned_transaction
+    def operation(session: Session):
+        db_planned_transaction = create_row(
+            session, PlannedTransaction, planned_transaction
+        )
+        bump_generation(session)
+        return db_planned_transaction
+
+    return write(session, operation)
 
 
 @app.get("/planned_transactions/", response_model=list[PlannedTransactionPublic])
@@ -455,24 +932,79 @@ def get_planned_transactions(
         59,
         999999,
     ),
-    session: Session = Depends(get_session),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    unpaginated: bool = False,
+    order_by: TransactionOrderEnum = TransactionOrderEnum.transaction_date,
+    direction: SortDirectionEnum = SortDirectionEnum.asc,
+    fields: Optional[str] = None,
+    response: Response,
+    session: Session = Depends(get_read_session),
 ):
+    sort_key = PLANNED_TRANSACTION_SORT_KEYS[order_by]
+    if fields:
+        paths = PLANNED_TRANSACTION_FIELDSET.parse(fields)
+        statement = PLANNED_TRANSACTION_FIELDSET.select(paths, sort_key)
+    else:
+        statement = select(PlannedTransaction)
+    statement = statement.where(PlannedTransaction.transaction_date <= end_date)
     if start_date:
-        planned_transactions: List[PlannedTransaction] = session.exec(
-            select(PlannedTransaction)
-            .where(PlannedTransaction.transaction_date >= start_date)
-            .where(PlannedTransaction.transaction_date <= end_date)
+        statement = statement.where(PlannedTransaction.transaction_date >= start_date)
+    if unpaginated:
+        planned_transactions = session.exec(
+            apply_order(statement, sort_key, direction)
         ).all()
+        next_cursor = None
     else:
-        planned_transactions: List[PlannedTransaction] = session.exec(
-            select(PlannedTransaction).where(
-                PlannedTransaction.transaction_date <= end_date
-            )
-        ).all()
-    planned_transactions: List[PlannedTransaction] = sorted(
-        planned_transactions, key=lambda x: x.transaction_date
-    )
-    return planned_transactions
+        planned_transactions, next_cursor = paginate(
+            session, statement, sort_key, limit, cursor, direction
+        )
+    if fields:
+        response = Response(
+            PLANNED_TRANSACTION_FIELDSET.dump_json(paths, planned_transactions),
+            media_type="application/json",
+            headers=response.headers,
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response if fields else planned_transactions
+
+
+@app.patch("/planned_transactions/batch")
+def update_planned_transactions_batch(
+    *, session: Session = Depends(get_session), batch: PlannedTransactionBatchUpdate
+):
+    def operation(session: Session):
+        ids = select_ids(
+            session,
+            PlannedTransaction,
+            batch.ids,
+            transaction_conditions(PlannedTransaction, batch.filter),
+        )
+        changes = batch.changes.model_dump(exclude_unset=True)
+        updated = batch_update(session, PlannedTransaction, ids, changes)
+        bump_generation(session)
+        return {"updated": updated}
+
+    return write(session, operation)
+
+
+@app.delete("/planned_transactions/batch")
+def delete_planned_transactions_batch(
+    *, session: Session = Depends(get_session), batch: TransactionSelection
+):
+    def operation(session: Session):
+        ids = select_ids(
+            session,
+            PlannedTransaction,
+            batch.ids,
+            transaction_conditions(PlannedTransaction, batch.filter),
+        )
+        deleted = batch_delete(session, PlannedTransaction, ids)
+        bump_generation(session)
+        return {"deleted": deleted}
+
+    return write(session, operation)
 
 
 @app.get(
@@ -480,7 +1012,7 @@ def get_planned_transactions(
     response_model=PlannedTransactionPublic,
 )
 def get_planned_transaction(
-    *, session: Session = Depends(get_session), planned_transaction_id: int
+    *, session: Session = Depends(get_read_session), planned_transaction_id: int
 ):
     planned_transaction = session.get(PlannedTransaction, planned_transaction_id)
     if not planned_transaction:
@@ -498,48 +1030,94 @@ def update_planned_transaction(
     planned_transaction_id: int,
     planned_transaction: PlannedTransactionUpdate,
 ):
-    db_planned_transaction = session.get(PlannedTransaction, planned_transaction_id)
-    if not db_planned_transaction:
-        raise HTTPException(status_code=404, detail="Planned Transaction not found")
-    planned_transaction_data = planned_transaction.model_dump(exclude_unset=True)
-    for key, value in planned_transaction_data.items():
-        setattr(db_planned_transaction, key, value)
-    session.add(db_planned_transaction)
-    session.commit()
-    session.refresh(db_planned_transaction)
-    return db_planned_transaction
+    def operation(session: Session):
+        db_planned_transaction = update_row(
+            session, PlannedTransaction, planned_transaction_id, planned_transaction
+        )
+        if not db_planned_transaction:
+            raise HTTPException(status_code=404, detail="Planned Transaction not found")
+        bump_generation(session)
+        return db_planned_transaction
+
+    return write(session, operation)
 
 
 @app.delete("/planned_transactions/{planned_transaction_id}")
 def delete_planned_transaction(
     *, session: Session = Depends(get_session), planned_transaction_id: int
 ):
-    planned_transaction = session.get(PlannedTransaction, planned_transaction_id)
-    if not planned_transaction:
-        raise HTTPException(status_code=404, detail="Planned Transaction not found")
-    session.delete(planned_transaction)
-    session.commit()
-    return {"ok": True}
+    def operation(session: Session):
+        if not delete_row(session, PlannedTransaction, planned_transaction_id):
+            raise HTTPException(status_code=404, detail="Planned Transaction not found")
+        bump_generation(session)
+        return {"ok": True}
+
+    return write(session, operation)
 
 
 # Budgets endpoints
 @app.post("/budgets/", response_model=BudgetPublic)
 def create_budget(*, session: Session = Depends(get_session), budget: BudgetCreate):
-    db_budget = Budget.model_validate(budget)
-    session.add(db_budget)
-    session.commit()
-    session.refresh(db_budget)
-    return db_budget
+    def operation(session: Session):
+        db_budget = create_row(session, Budget, budget)
+        bump_generation(session)
+        return db_budget
+
+    return write(session, operation)
 
 
 @app.get("/budgets/", response_model=list[BudgetPublic])
-def get_budgets(*, session: Session = Depends(get_session)):
-    budgets = session.exec(select(Budget)).all()
+def get_budgets(
+    *,
+    subcategory_id: Optional[int] = None,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    session: Session = Depends(get_read_session),
+):
+    statement = select(Budget)
+    if subcategory_id is not None:
+        statement = statement.where(Budget.subcategory_id == subcategory_id)
+    if year is not None:
+        statement = statement.where(Budget.year == year)
+    if month is not None:
+        statement = statement.where(Budget.month == month)
+    budgets = session.exec(statement).all()
     return budgets
 
 
+@app.patch("/budgets/batch")
+def update_budgets_batch(
+    *, session: Session = Depends(get_session), batch: BudgetBatchUpdate
+):
+    def operation(session: Session):
+        ids = select_ids(
+            session, Budget, batch.ids, budget_conditions(Budget, batch.filter)
+        )
+        changes = batch.changes.model_dump(exclude_unset=True)
+        updated = batch_update(session, Budget, ids, changes)
+        bump_generation(session)
+        return {"updated": updated}
+
+    return write(session, operation)
+
+
+@app.delete("/budgets/batch")
+def delete_budgets_batch(
+    *, session: Session = Depends(get_session), batch: BudgetSelection
+):
+    def operation(session: Session):
+        ids = select_ids(
+            session, Budget, batch.ids, budget_conditions(Budget, batch.filter)
+        )
+        deleted = batch_delete(session, Budget, ids)
+        bump_generation(session)
+        return {"deleted": deleted}
+
+    return write(session, operation)
+
+
 @app.get("/budgets/{budget_id}", response_model=BudgetPublic)
-def get_budget(*, session: Session = Depends(get_session), budget_id: int):
+def get_budget(*, session: Session = Depends(get_read_session), budget_id: int):
     budget = session.get(Budget, budget_id)
     if not budget:
         raise HTTPException(status_code=404, detail="Budget not found")
@@ -553,26 +1131,25 @@ def update_budget(
     budget_id: int,
     budget: BudgetUpdate,
 ):
-    db_budget = session.get(Budget, budget_id)
-    if not db_budget:
-        raise HTTPException(status_code=404, detail="Budget not found")
-    budget_data = budget.model_dump(exclude_unset=True)
-    for key, value in budget_data.items():
-        setattr(db_budget, key, value)
-    session.add(db_budget)
-    session.commit()
-    session.refresh(db_budget)
-    return db_budget
+    def operation(session: Session):
+        db_budget = update_row(session, Budget, budget_id, budget)
+        if not db_budget:
+            raise HTTPException(status_code=404, detail="Budget not found")
+        bump_generation(session)
+        return db_budget
+
+    return write(session, operation)
 
 
 @app.delete("/budgets/{budget_id}")
 def delete_budget(*, session: Session = Depends(get_session), budget_id: int):
-    budget = session.get(Budget, budget_id)
-    if not budget:
-        raise HTTPException(status_code=404, detail="Budget not found")
-    session.delete(budget)
-    session.commit()
-    return {"ok": True}
+    def operation(session: Session):
+        if not delete_row(session, Budget, budget_id):
+            raise HTTPException(status_code=404, detail="Budget not found")
+        bump_generation(session)
+        return {"ok": True}
+
+    return write(session, operation)
 
 
 # Endpoints with precalculated data
@@ -588,21 +1165,20 @@ def get_total_balance(
         59,
         999999,
     ),
-    session: Session = Depends(get_session),
+    target_currency: Optional[str] = None,
+    session: Session = Depends(get_read_session),
 ):
-    transactions: List[Transaction] = session.exec(
-        select(Transaction).where(Transaction.transaction_date <= end_date)
-    ).all()
-    transactions: List[Transaction] = sorted(
-        transactions, key=lambda x: x.transaction_date
-    )
-    total_balance = 0
-    for transaction in transactions:
-        if transaction.category.type == "income":
-            total_balance += transaction.amount
+    def compute():
+        if target_currency:
+            balances = snapshot_balance_by_currency(session, end_date)
+            total_balance = convert_by_currency(
+                session, balances, target_currency, end_date.date()
+            )
         else:
-            total_balance -= transaction.amount
-    return {"total_balance": total_balance}
+            total_balance = snapshot_balance(session, end_date)
+        return {"total_balance": total_balance}
+
+    return cached(session, ("total_balance", end_date, target_currency), compute)
 
 
 @app.get("/total_balance/{account_id}")
@@ -618,23 +1194,23 @@ def get_total_account_balance(
         59,
         999999,
     ),
-    session: Session = Depends(get_session),
+    target_currency: Optional[str] = None,
+    session: Session = Depends(get_read_session),
 ):
-    transactions: List[Transaction] = session.exec(
-        select(Transaction)
-        .where(Transaction.account_id == account_id)
-        .where(Transaction.transaction_date <= end_date)
-    ).all()
-    transactions: List[Transaction] = sorted(
-        transactions, key=lambda x: x.transaction_date
-    )
-    total_balance = 0
-    for transaction in transactions:
-        if transaction.category.type == "income":
-            total_balance += transaction.amount
+    def compute():
+        if target_currency:
+            balances = snapshot_balance_by_currency(
+                session, end_date, account_id=account_id
+            )
+            total_balance = convert_by_currency(
+                session, balances, target_currency, end_date.date()
+            )
         else:
-            total_balance -= transaction.amount
-    return {"total_balance": total_balance}
+            total_balance = snapshot_balance(session, end_date, account_id=account_id)
+        return {"total_balance": total_balance}
+
+    key = ("total_account_balance", account_id, end_date, target_currency)
+    return cached(session, key, compute)
 
 
 # get total balance per account
@@ -650,31 +1226,360 @@ def get_total_balance_per_account(
         59,
         999999,
     ),
-    session: Session = Depends(get_session),
+    target_currency: Optional[str] = None,
+    session: Session = Depends(get_read_session),
 ):
-    accounts: List[Account] = session.exec(select(Account)).all()
-    accounts_total_balance = []
-    for account in accounts:
-        transactions: List[Transaction] = session.exec(
-            select(Transaction)
-            .where(Transaction.account_id == account.id)
-            .where(Transaction.transaction_date <= end_date)
-        ).all()
-        transactions: List[Transaction] = sorted(
-            transactions, key=lambda x: x.transaction_date
+    def compute():
+        accounts = snapshot_balance_per_account(session, end_date)
+        if target_currency:
+            convert_accounts(session, accounts, target_currency, end_date.date())
+        return accounts
+
+    key = ("total_balance_per_account", end_date, target_currency)
+    return cached(session, key, compute)
+
+
+@app.get("/balance_history/")
+def get_balance_history(
+    *,
+    start_date: date = date(datetime.now().year, datetime.now().month, 1),
+    end_date: date = date(
+        datetime.now().year,
+        datetime.now().month,
+        calendar.monthrange(datetime.now().year, datetime.now().month)[1],
+    ),
+    granularity: BalanceGranularityEnum = BalanceGranularityEnum.day,
+    account_ids: List[int] = Query(default=[]),
+    target_currency: Optional[str] = None,
+    session: Session = Depends(get_read_session),
+):
+    if start_date > end_date:
+        raise HTTPException(
+            status_code=400, detail="start_date must not be after end_date"
+        )
+
+    def compute():
+        return balance_history(
+            session, start_date, end_date, granularity, account_ids, target_currency
         )
-        total_balance = 0
-        for transaction in transactions:
-            if transaction.category.type == "income":
-                total_balance += transaction.amount
-            else:
-                total_balance -= transaction.amount
-        account_dict = {
-            "id": account.id,
-            "name": account.name,
-            "account_type": account.account_type.type,
-            "total_balance": total_balance,
-            "currency": account.currency.name,
-        }
-        accounts_total_balance.append(account_dict)
-    return accounts_total_balance
+
+    key = (
+        "balance_history",
+        start_date,
+        end_date,
+        granularity,
+        tuple(account_ids),
+        target_currency,
+    )
+    return cached(session, key, compute)
+
+
+@app.get("/stats/cache")
+def get_cache_stats():
+    if tenant_engines is None:
+        return result_cache.stats()
+    # Every tenant has a result cache of its own
+    return {
+        tenant: database.info["result_cache"].stats()
+        for tenant, database in tenant_engines.items()
+    }
+
+
+@app.get("/stats/pool")
+def get_pool_stats():
+    return {
+        "primary": pool_stats(engine),
+        "replica": pool_stats(replica_engine) if replica_engine is not engine else None,
+    }
+
+
+@app.get("/stats/write_queue")
+def get_write_queue_stats():
+    if write_queue is None:
+        return {"enabled": False}
+    return {"enabled": True, **write_queue.stats()}
+
+
+@app.get("/stats/tenants")
+def get_tenant_stats():
+    if tenant_engines is None:
+        return {"enabled": False}
+    return {"enabled": True, **tenant_engines.stats()}
+
+
+# Async variants of the read endpoints, under /async. They run the same handlers
+# on the connection of an AsyncSession, so a request waiting on the database
+# suspends on the event loop instead of holding one of the threadpool workers.
+async_router = APIRouter(prefix="/async", tags=["async"])
+
+
+async def run_handler(session: AsyncSession, handler, **params):
+    """
+    Call a sync endpoint with the sync view of an async session: its queries are
+    sent through the async driver and awaited on the event loop.
+
+    Args:
+        session (AsyncSession): Async database session
+        handler (Callable): Sync endpoint function
+        **params: Parameters of the endpoint, other than the session
+    """
+    return await session.run_sync(
+        lambda sync_session: handler(session=sync_session, **params)
+    )
+
+
+@async_router.get(
+    "/currencies/",
+    response_model=list[CurrencyPublic],
+    dependencies=[Depends(async_conditional_get(Currency))],
+)
+async def get_currencies_async(*, session: AsyncSession = Depends(get_async_session)):
+    return await run_handler(session, get_currencies)
+
+
+@async_router.get(
+    "/account_types/",
+    response_model=list[AccountTypePublic],
+    dependencies=[Depends(async_conditional_get(AccountType))],
+)
+async def get_account_types_async(
+    *, session: AsyncSession = Depends(get_async_session)
+):
+    return await run_handler(session, get_account_types)
+
+
+@async_router.get(
+    "/accounts/",
+    response_model=list[AccountPublicWithTypeAndCurrency],
+    dependencies=[Depends(async_conditional_get(Account, Currency, AccountType))],
+)
+async def get_accounts_async(
+    *,
+    order_by: AccountOrderEnum = AccountOrderEnum.created_at,
+    direction: SortDirectionEnum = SortDirectionEnum.asc,
+    fields: Optional[str] = None,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await run_handler(
+        session,
+        get_accounts,
+        order_by=order_by,
+        direction=direction,
+        fields=fields,
+        response=response,
+    )
+
+
+@async_router.get(
+    "/categories/",
+    response_model=list[CategoryPublicWithSubcategories],
+    dependencies=[Depends(async_conditional_get(Category, SubCategory))],
+)
+async def get_categories_async(*, session: AsyncSession = Depends(get_async_session)):
+    return await run_handler(session, get_categories)
+
+
+@async_router.get(
+    "/sub_categories/",
+    response_model=list[SubCategoryPublicWithCategory],
+    dependencies=[Depends(async_conditional_get(SubCategory, Category))],
+)
+async def get_sub_categories_async(
+    *, session: AsyncSession = Depends(get_async_session)
+):
+    return await run_handler(session, get_sub_categories)
+
+
+@async_router.get(
+    "/transactions/",
+    response_model=list[TransactionPublicWithCategorySubcategoryAndAccount],
+)
+async def get_transactions_async(
+    *,
+    start_date: Optional[date] = None,
+    end_date: Optional[datetime] = datetime(
+        datetime.now().year,
+        datetime.now().month,
+        calendar.monthrange(datetime.now().year, datetime.now().month)[1],
+        23,
+        59,
+        59,
+        999999,
+    ),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    unpaginated: bool = False,
+    order_by: TransactionOrderEnum = TransactionOrderEnum.transaction_date,
+    direction: SortDirectionEnum = SortDirectionEnum.asc,
+    fields: Optional[str] = None,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await run_handler(
+        session,
+        get_transactions,
+        start_date=start_date,
+        end_date=end_date,
+        limit=limit,
+        cursor=cursor,
+        unpaginated=unpaginated,
+        order_by=order_by,
+        direction=direction,
+        fields=fields,
+        response=response,
+    )
+
+
+@async_router.get(
+    "/planned_transactions/", response_model=list[PlannedTransactionPublic]
+)
+async def get_planned_transactions_async(
+    *,
+    start_date: Optional[date] = None,
+    end_date: Optional[datetime] = datetime(
+        datetime.now().year,
+        datetime.now().month,
+        calendar.monthrange(datetime.now().year, datetime.now().month)[1],
+        23,
+        59,
+        59,
+        999999,
+    ),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    unpaginated: bool = False,
+    order_by: TransactionOrderEnum = TransactionOrderEnum.transaction_date,
+    direction: SortDirectionEnum = SortDirectionEnum.asc,
+    fields: Optional[str] = None,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await run_handler(
+        session,
+        get_planned_transactions,
+        start_date=start_date,
+        end_date=end_date,
+        limit=limit,
+        cursor=cursor,
+        unpaginated=unpaginated,
+        order_by=order_by,
+        direction=direction,
+        fields=fields,
+        response=response,
+    )
+
+
+@async_router.get("/budgets/", response_model=list[BudgetPublic])
+async def get_budgets_async(
+    *,
+    subcategory_id: Optional[int] = None,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await run_handler(
+        session, get_budgets, subcategory_id=subcategory_id, year=year, month=month
+    )
+
+
+@async_router.get("/total_balance/")
+async def get_total_balance_async(
+    *,
+    end_date: Optional[datetime] = datetime(
+        datetime.now().year,
+        datetime.now().month,
+        calendar.monthrange(datetime.now().year, datetime.now().month)[1],
+        23,
+        59,
+        59,
+        999999,
+    ),
+    target_currency: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await run_handler(
+        session,
+        get_total_balance,
+        end_date=end_date,
+        target_currency=target_currency,
+    )
+
+
+@async_router.get("/total_balance/{account_id}")
+async def get_total_account_balance_async(
+    *,
+    account_id: int,
+    end_date: Optional[datetime] = datetime(
+        datetime.now().year,
+        datetime.now().month,
+        calendar.monthrange(datetime.now().year, datetime.now().month)[1],
+        23,
+        59,
+        59,
+        999999,
+    ),
+    target_currency: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await run_handler(
+        session,
+        get_total_account_balance,
+        account_id=account_id,
+        end_date=end_date,
+        target_currency=target_currency,
+    )
+
+
+@async_router.get("/total_balance_per_account/")
+async def get_total_balance_per_account_async(
+    *,
+    end_date: Optional[datetime] = datetime(
+        datetime.now().year,
+        datetime.now().month,
+        calendar.monthrange(datetime.now().year, datetime.now().month)[1],
+        23,
+        59,
+        59,
+        999999,
+    ),
+    target_currency: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await run_handler(
+        session,
+        get_total_balance_per_account,
+        end_date=end_date,
+        target_currency=target_currency,
+    )
+
+
+@async_router.get("/balance_history/")
+async def get_balance_history_async(
+    *,
+    start_date: date = date(datetime.now().year, datetime.now().month, 1),
+    end_date: date = date(
+        datetime.now().year,
+        datetime.now().month,
+        calendar.monthrange(datetime.now().year, datetime.now().month)[1],
+    ),
+    granularity: BalanceGranularityEnum = BalanceGranularityEnum.day,
+    account_ids: List[int] = Query(default=[]),
+    target_currency: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await run_handler(
+        session,
+        get_balance_history,
+        start_date=start_date,
+        end_date=end_date,
+        granularity=granularity,
+        account_ids=account_ids,
+        target_currency=target_currency,
+    )
+
+
+# The async engine is the one of the default database, so tenants have no async
+# variants
+if tenant_engines is None:
+    app.include_router(async_router)
@@ -0,0 +1,158 @@
+import argparse
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import Column, Connection, inspect
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, SQLModel, func, insert, select
+
+from .balances import rebuild_snapshots
+from .fingerprints import refresh_fingerprints
+from .fx import ensure_fx_rates
+from .models import SchemaVersion
+
+# PostgreSQL advisory lock held while migrating, so processes migrate one at a time
+MIGRATION_LOCK_ID = 20240901
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+def _add_column(connection: Connection, column: Column):
+    if not column.nullable and column.server_default is None:
+        raise RuntimeError(
+            f"Cannot add the required column {column.table.name}.{column.name} to "
+            "existing rows, migrate this database by hand"
+        )
+    preparer = connection.dialect.identifier_preparer
+    connection.exec_driver_sql(
+        f"ALTER TABLE {preparer.format_table(column.table)} "
+        f"ADD COLUMN {preparer.format_column(column)} "
+        f"{column.type.compile(dialect=connection.dialect)}"
+    )
+
+
+def baseline(connection: Connection):
+    # Databases created before versioning were made by create_all from older
+    # models: add the tables, nullable columns and indexes they are missing, then
+    # derive the data of the new ones (fingerprints, snapshots, FX rates)
+    SQLModel.metadata.create_all(connection)
+    inspector = inspect(connection)
+    for table in SQLModel.metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                _add_column(connection, column)
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    with Session(connection) as session:
+        refresh_fingerprints(session)
+        rebuild_snapshots(session)
+        ensure_fx_rates(session)
+        session.flush()
+
+
+def generation_bigint(connection: Connection):
+    # The generation is seeded from the clock in nanoseconds, beyond the int4 that
+    # databases created before it was a BigInteger have. SQLite integers are
+    # already 64-bit
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(
+            "ALTER TABLE datageneration ALTER COLUMN generation TYPE BIGINT"
+        )
+
+
+# Schema migrations, in version order. New ones are appended and never edited
+# once released: a database at version N runs the ones after N at startup.
+MIGRATIONS = [
+    Migration(1, "baseline", baseline),
+    Migration(2, "generation_bigint", generation_bigint),
+]
+
+
+def current_version(connection: Connection) -> int | None:
+    """Latest applied version, or None when the database is not versioned."""
+    if not inspect(connection).has_table(SchemaVersion.__tablename__):
+        return None
+    return connection.execute(select(func.max(SchemaVersion.version))).scalar()
+
+
+def _stamp(connection: Connection, migration: Migration):
+    connection.execute(
+        insert(SchemaVersion).values(version=migration.version, name=migration.name)
+    )
+
+
+def migrate(engine: Engine, migrations: list[Migration] = MIGRATIONS) -> list[int]:
+    """
+    Bring the schema to the latest version in a single transaction. An empty
+    database gets the tables of the models and is stamped with every version;
+    otherwise the migrations after its current version run in order. When one
+    fails nothing is applied.
+
+    Args:
+        engine (Engine): Engine of the database
+        migrations (list[Migration]): Migrations in version order
+
+    Returns:
+        The versions applied, empty when the schema was up to date
+    """
+    with engine.begin() as connection:
+        if connection.dialect.name == "sqlite":
+            # pysqlite only opens a transaction before DML: begin it here so the
+            # DDL rolls back too, taking the write lock before reading the version
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        elif connection.dialect.name == "postgresql":
+            connection.execute(select(func.pg_advisory_xact_lock(MIGRATION_LOCK_ID)))
+        version = current_version(connection)
+        if version is None and not inspect(connection).get_table_names():
+            SQLModel.metadata.create_all(connection)
+            for migration in migrations:
+                _stamp(connection, migration)
+            return [migration.version for migration in migrations]
+        applied = []
+        for migration in migrations:
+            if version is not None and migration.version <= version:
+                continue
+            migration.upgrade(connection)
+            _stamp(connection, migration)
+            applied.append(migration.version)
+        return applied
+
+
+if __name__ == "__main__":
+    from .database import drop_db_and_tables, engine, populate_db, upgrade_db
+    from .models import Currency
+
+    parser = argparse.ArgumentParser(description="Manage the database schema")
+    parser.add_argument(
+        "command",
+        choices=["upgrade", "current", "seed", "reset"],
+        help=(
+            "upgrade: apply the pending migrations, current: print the schema "
+            "version, seed: load the demo data into an empty database, reset: "
+            "drop everything, recreate the schema and seed it"
+        ),
+    )
+    args = parser.parse_args()
+    if args.command == "current":
+        with engine.connect() as connection:
+            print(current_version(connection))
+    elif args.command == "upgrade":
+        print(f"applied versions: {upgrade_db()}")
+    elif args.command == "seed":
+        migrate(engine)
+        with engine.connect() as connection:
+            if connection.execute(select(func.count()).select_from(Currency)).scalar():
+                parser.exit(1, "the database already has data\n")
+        populate_db()
+        print("demo data loaded")
+    else:
+        drop_db_and_tables()
+        migrate(engine)
+        populate_db()
+        print("database reset with the demo data")
@@ -1,8 +1,9 @@
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 from enum import Enum
 from typing import List
 
+from sqlalchemy import BigInteger, Index
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -76,6 +77,8 @@ class AccountBase(SQLModel):
 
 
 class Account(AccountBase, table=True):
+    __table_args__ = (Index("ix_account_created_at", "created_at"),)
+
     id: int | None = Field(default=None, primary_key=True)
 
     currency: Currency | None = Relationship(back_populates="accounts")
@@ -190,7 +193,7 @@ class TransactionBase(SQLModel):
     amount: Decimal = Field(default=0, max_digits=50, decimal_places=2, nullable=False)
     description: str = Field(default="", nullable=False)
     transaction_date: datetime | None = Field(
-        default_factory=datetime.utcnow, nullable=False
+        default_factory=datetime.utcnow, nullable=False, index=True
     )
     created_at: datetime | None = Field(default_factory=datetime.utcnow)
     updated_at: datetime | None = Field(
@@ -199,13 +202,23 @@ class TransactionBase(SQLModel):
     )
     is_planned: bool = Field(default=False, nullable=False)
 
-    category_id: int = Field(default=None, foreign_key="category.id")
-    subcategory_id: int = Field(default=None, foreign_key="subcategory.id")
+    category_id: int = Field(default=None, foreign_key="category.id", index=True)
+    subcategory_id: int = Field(default=None, foreign_key="subcategory.id", index=True)
     account_id: int = Field(default=None, foreign_key="account.id")
 
 
 class Transaction(TransactionBase, table=True):
+    __table_args__ = (
+        Index(
+            "ix_transaction_account_id_transaction_date",
+            "account_id",
+            "transaction_date",
+        ),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
+    # Hash of account, day, amount and description, see backend/fingerprints.py
+    fingerprint: str | None = Field(default=None, unique=True, index=True)
 
     category: Category | None = Relationship(back_populates="transactions")
     subcategory: SubCategory | None = Relationship(back_populates="transactions")
@@ -235,7 +248,7 @@ class PlannedTransactionBase(SQLModel):
     amount: Decimal = Field(default=0, max_digits=50, decimal_places=2, nullable=False)
     description: str = Field(default="", nullable=False)
     transaction_date: datetime | None = Field(
-        default_factory=datetime.utcnow, nullable=False
+        default_factory=datetime.utcnow, nullable=False, index=True
     )
     created_at: datetime | None = Field(default_factory=datetime.utcnow)
     updated_at: datetime | None = Field(
@@ -247,12 +260,20 @@ class PlannedTransactionBase(SQLModel):
         default=""
     )  # once, daily, weekly, biweekly, monthly, quaterly, semestral, yearly
 
-    category_id: int = Field(default=None, foreign_key="category.id")
-    subcategory_id: int = Field(default=None, foreign_key="subcategory.id")
+    category_id: int = Field(default=None, foreign_key="category.id", index=True)
+    subcategory_id: int = Field(default=None, foreign_key="subcategory.id", index=True)
     account_id: int = Field(default=None, foreign_key="account.id")
 
 
 class PlannedTransaction(PlannedTransactionBase, table=True):
+    __table_args__ = (
+        Index(
+            "ix_plannedtransaction_account_id_transaction_date",
+            "account_id",
+            "transaction_date",
+        ),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
 
     category: Category | None = Relationship(back_populates="planned_transactions")
@@ -296,6 +317,10 @@ class BudgetBase(SQLModel):
 
 
 class Budget(BudgetBase, table=True):
+    __table_args__ = (
+        Index("ix_budget_subcategory_id_year_month", "subcategory_id", "year", "month"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
 
     subcategory: SubCategory | None = Relationship(back_populates="budgets")
@@ -316,6 +341,74 @@ class BudgetUpdate(SQLModel):
     subcategory_id: int | None = None
 
 
+# AccountDailyBalance Model
+class AccountDailyBalance(SQLModel, table=True):
+    """Closing balance of an account at the end of every day it had transactions."""
+
+    account_id: int = Field(primary_key=True)
+    balance_date: date = Field(primary_key=True, index=True)
+    balance: Decimal = Field(default=0, max_digits=50, decimal_places=2, nullable=False)
+
+
+# FxRate Model
+class FxRate(SQLModel, table=True):
+    """Value of one unit of `currency` in the reference currency from `rate_date`."""
+
+    currency: str = Field(primary_key=True)  # COP, USD
+    rate_date: date = Field(primary_key=True)
+    rate: Decimal = Field(max_digits=50, decimal_places=12, nullable=False)
+
+
+# DataGeneration Model
+class DataGeneration(SQLModel, table=True):
+    """Single row counter bumped by every write, shared by all the API processes."""
+
+    id: int | None = Field(default=None, primary_key=True)
+    # Seeded from the clock in nanoseconds, beyond a 32-bit integer
+    generation: int = Field(default=0, nullable=False, sa_type=BigInteger)
+
+
+# IdempotencyKey Model
+class IdempotencyKey(SQLModel, table=True):
+    """Response of a request sent with an Idempotency-Key header, replayed on retries."""
+
+    key: str = Field(primary_key=True)
+    response: str | None = None
+    created_at: datetime | None = Field(default_factory=datetime.utcnow)
+
+
+# SchemaVersion Model
+class SchemaVersion(SQLModel, table=True):
+    """Schema migration applied to the database, one row per version."""
+
+    version: int = Field(primary_key=True)
+    name: str
+    applied_at: datetime | None = Field(default_factory=datetime.utcnow)
+
+
+class SortDirectionEnum(str, Enum):
+    asc = "asc"
+    desc = "desc"
+
+
+# Orderings backed by an index, for the transactions and planned transactions lists
+class TransactionOrderEnum(str, Enum):
+    transaction_date = "transaction_date"
+    account_id = "account_id"
+    id = "id"
+
+
+class AccountOrderEnum(str, Enum):
+    created_at = "created_at"
+    id = "id"
+
+
+class BalanceGranularityEnum(str, Enum):
+    day = "day"
+    week = "week"
+    month = "month"
+
+
 # Models joined with other models
 class CategoryPublicWithSubcategories(CategoryPublic):
     subcategories: List[SubCategoryPublic] = []
@@ -334,3 +427,40 @@ class TransactionPublicWithCategorySubcategoryAndAccount(TransactionPublic):
     category: CategoryPublic | None = None
     subcategory: SubCategoryPublic | None = None
     account: AccountPublic | None = None
+
+
+# Batch operations: the rows are selected by ids or by a filter
+class TransactionFilter(SQLModel):
+    start_date: datetime | None = None
+    end_date: datetime | None = None
+    account_ids: List[int] | None = None
+    category_ids: List[int] | None = None
+    subcategory_ids: List[int] | None = None
+
+
+class TransactionSelection(SQLModel):
+    ids: List[int] | None = None
+    filter: TransactionFilter | None = None
+
+
+class TransactionBatchUpdate(TransactionSelection):
+    changes: TransactionUpdate
+
+
+class PlannedTransactionBatchUpdate(TransactionSelection):
+    changes: PlannedTransactionUpdate
+
+
+class BudgetFilter(SQLModel):
+    year: int | None = None
+    month: int | None = None
+    subcategory_ids: List[int] | None = None
+
+
+class BudgetSelection(SQLModel):
+    ids: List[int] | None = None
+    filter: BudgetFilter | None = None
+
+
+class BudgetBatchUpdate(BudgetSelection):
+    changes: BudgetUpdate
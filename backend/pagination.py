@@ -0,0 +1,91 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from sqlalchemy import tuple_
+from sqlmodel import Session
+
+from .models import SortDirectionEnum
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values: tuple) -> str:
+    """Opaque cursor holding the sort key of the last row of a page."""
+    payload = json.dumps(
+        [
+            value.isoformat() if isinstance(value, date) else str(value)
+            for value in values
+        ]
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str, columns: tuple) -> tuple:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(columns):
+            raise InvalidCursor("Invalid cursor")
+        return tuple(_parse(column, value) for column, value in zip(columns, values))
+    except (binascii.Error, TypeError, ValueError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+
+
+def _parse(column, value: str):
+    python_type = column.type.python_type
+    if python_type in (date, datetime):
+        return python_type.fromisoformat(value)
+    return python_type(value)
+
+
+def apply_order(statement, columns: tuple, direction: SortDirectionEnum):
+    if direction == SortDirectionEnum.desc:
+        return statement.order_by(*(column.desc() for column in columns))
+    return statement.order_by(*columns)
+
+
+def paginate(
+    session: Session,
+    statement,
+    columns: tuple,
+    limit: int,
+    cursor: str | None = None,
+    direction: SortDirectionEnum = SortDirectionEnum.asc,
+):
+    """
+    Fetch one page of `statement` ordered by `columns` (the last one must be
+    unique) with keyset pagination: the cursor filters on the sort key instead
+    of using an OFFSET, so every page costs the same however deep it is.
+
+    Args:
+        session (Session): Database session
+        statement (Select): Query to paginate, without ORDER BY or LIMIT
+        columns (tuple): Columns of the sort key, e.g. (date, id)
+        limit (int): Maximum number of rows in the page
+        cursor (str | None): Cursor returned with the previous page
+        direction (SortDirectionEnum): Sort direction of every key column
+
+    Returns:
+        The rows of the page and the cursor of the next page, or None on the last one
+    """
+    if cursor:
+        key, last_key = tuple_(*columns), tuple_(*decode_cursor(cursor, columns))
+        if direction == SortDirectionEnum.desc:
+            statement = statement.where(key < last_key)
+        else:
+            statement = statement.where(key > last_key)
+    statement = apply_order(statement, columns, direction)
+    rows = session.exec(statement.limit(limit + 1)).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last_row = rows[-1]
+    return rows, encode_cursor(
+        tuple(getattr(last_row, column.key) for column in columns)
+    )
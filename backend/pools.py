@@ -0,0 +1,57 @@
+import threading
+import time
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that measures how long checkouts wait for a connection, the first
+    sign that the pool is too small for the load.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except TimeoutError:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        wait = time.perf_counter() - start
+        with self._metrics_lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+        return connection
+
+    def stats(self) -> dict:
+        with self._metrics_lock:
+            return {
+                "size": self.size(),
+                "checked_out": self.checkedout(),
+                "overflow": self.overflow(),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_average_ms": (
+                    self.wait_total / self.checkouts * 1000 if self.checkouts else 0
+                ),
+                "wait_max_ms": self.wait_max * 1000,
+            }
+
+
+def pool_stats(engine: Engine) -> dict | None:
+    """Metrics of the pool of `engine`, or None for pools that are not timed."""
+    if isinstance(engine.pool, TimedQueuePool):
+        return engine.pool.stats()
+    return None
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import Mapping
+
+from sqlalchemy.engine import make_url
+
+# Connect-time pragmas of the "tuned" SQLite profile. WAL lets readers run while a
+# writer commits, and NORMAL synchronous only syncs the WAL at checkpoints.
+SQLITE_TUNED_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": "-64000",  # KiB when negative, 64 MB
+    "mmap_size": "268435456",  # 256 MB
+    "temp_store": "MEMORY",
+    "busy_timeout": "5000",  # ms
+}
+
+# Drivers of the async engine, by database backend
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def _flag(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Database settings, read from environment variables:
+
+    - DATABASE_URL: SQLAlchemy URL, `sqlite:///database.db` by default
+    - DATABASE_ASYNC_URL: URL of the async engine, by default DATABASE_URL with
+      the aiosqlite or asyncpg driver
+    - DATABASE_ECHO: log every SQL statement, off by default
+    - DATABASE_INIT: what the API does with the database at startup. `migrate`
+      (default) applies the pending schema migrations and keeps the data, `reset`
+      drops it and seeds the demo data when the first process starts, and drops
+      it again when the last one stops
+    - DATABASE_LOCK_PATH: base path of the lock files that coordinate the API
+      processes, by default the SQLite file or a file in the temp directory
+    - DATABASE_REPLICA_URL: SQLAlchemy URL of a read replica for the read-only
+      endpoints, none by default
+    - DATABASE_TENANT_URL: URL template with a `{tenant}` placeholder, e.g.
+      `sqlite:///tenants/{tenant}.db`. When set, every request selects a tenant
+      and uses its own database; off by default
+    - DATABASE_TENANT_CACHE_SIZE / DATABASE_TENANT_IDLE_TIMEOUT: most tenant
+      engines kept open and seconds after which an unused one is disposed, 32
+      and 300
+    - DATABASE_POOL_SIZE / DATABASE_MAX_OVERFLOW: connection pool size
+    - DATABASE_POOL_TIMEOUT: seconds to wait for a pooled connection, 30
+    - DATABASE_POOL_PRE_PING / DATABASE_POOL_RECYCLE: test server connections on
+      checkout (on by default) and replace them after some seconds (1800)
+    - DATABASE_WRITE_QUEUE: send the writes of the process to a single writer
+      thread that commits them in batches, off by default
+    - DATABASE_WRITE_BATCH_SIZE / DATABASE_WRITE_BATCH_DELAY_MS: most writes
+      committed together and how long the writer waits for more, 64 and 0
+    - SQLITE_PROFILE: `tuned` (default) applies the pragmas below, `default`
+      keeps the SQLite defaults
+    - SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_CACHE_SIZE, SQLITE_MMAP_SIZE,
+      SQLITE_TEMP_STORE, SQLITE_BUSY_TIMEOUT: override a single pragma
+    """
+
+    database_url: str = "sqlite:///database.db"
+    database_async_url: str | None = None
+    database_echo: bool = False
+    database_init: str = "migrate"
+    database_lock_path: str | None = None
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    pool_pre_ping: bool = True
+    pool_recycle: int = 1800
+    database_replica_url: str | None = None
+    database_tenant_url: str | None = None
+    tenant_cache_size: int = 32
+    tenant_idle_timeout: float = 300
+    write_queue: bool = False
+    write_batch_size: int = 64
+    write_batch_delay_ms: float = 0
+    sqlite_pragmas: dict[str, str] = field(
+        default_factory=lambda: dict(SQLITE_TUNED_PRAGMAS)
+    )
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] = os.environ) -> "Settings":
+        profile = environ.get("SQLITE_PROFILE", "tuned").lower()
+        if profile not in ("tuned", "default"):
+            raise ValueError(f"Unknown SQLITE_PROFILE: {profile}")
+        database_init = environ.get("DATABASE_INIT", cls.database_init).lower()
+        if database_init not in ("migrate", "reset"):
+            raise ValueError(f"Unknown DATABASE_INIT: {database_init}")
+        tenant_url = environ.get("DATABASE_TENANT_URL")
+        if tenant_url and "{tenant}" not in tenant_url:
+            raise ValueError("DATABASE_TENANT_URL needs a {tenant} placeholder")
+        pragmas = dict(SQLITE_TUNED_PRAGMAS) if profile == "tuned" else {}
+        for name in SQLITE_TUNED_PRAGMAS:
+            value = environ.get(f"SQLITE_{name.upper()}")
+            if value:
+                pragmas[name] = value
+        return cls(
+            database_url=environ.get("DATABASE_URL", cls.database_url),
+            database_async_url=environ.get("DATABASE_ASYNC_URL"),
+            database_echo=_flag(environ.get("DATABASE_ECHO", "false")),
+            database_init=database_init,
+            database_lock_path=environ.get("DATABASE_LOCK_PATH"),
+            pool_size=int(environ.get("DATABASE_POOL_SIZE", cls.pool_size)),
+            max_overflow=int(environ.get("DATABASE_MAX_OVERFLOW", cls.max_overflow)),
+            pool_timeout=float(environ.get("DATABASE_POOL_TIMEOUT", cls.pool_timeout)),
+            pool_pre_ping=_flag(environ.get("DATABASE_POOL_PRE_PING", "true")),
+            pool_recycle=int(environ.get("DATABASE_POOL_RECYCLE", cls.pool_recycle)),
+            database_replica_url=environ.get("DATABASE_REPLICA_URL"),
+            database_tenant_url=tenant_url,
+            tenant_cache_size=int(
+                environ.get("DATABASE_TENANT_CACHE_SIZE", cls.tenant_cache_size)
+            ),
+            tenant_idle_timeout=float(
+                environ.get("DATABASE_TENANT_IDLE_TIMEOUT", cls.tenant_idle_timeout)
+            ),
+            write_queue=_flag(environ.get("DATABASE_WRITE_QUEUE", "false")),
+            write_batch_size=int(
+                environ.get("DATABASE_WRITE_BATCH_SIZE", cls.write_batch_size)
+            ),
+            write_batch_delay_ms=float(
+                environ.get("DATABASE_WRITE_BATCH_DELAY_MS", cls.write_batch_delay_ms)
+            ),
+            sqlite_pragmas=pragmas,
+        )
+
+    @property
+    def async_url(self) -> str:
+        if self.database_async_url:
+            return self.database_async_url
+        url = make_url(self.database_url)
+        backend = url.get_backend_name()
+        if backend not in ASYNC_DRIVERS:
+            raise ValueError(f"No async driver for {backend} databases")
+        return url.set(
+            drivername=f"{backend}+{ASYNC_DRIVERS[backend]}"
+        ).render_as_string(hide_password=False)
+
+    def tenant_url(self, tenant: str) -> str:
+        return self.database_tenant_url.format(tenant=tenant)
+
+    @property
+    def lock_path(self) -> str:
+        if self.database_lock_path:
+            return self.database_lock_path
+        url = make_url(self.database_url)
+        if url.get_backend_name() == "sqlite" and url.database not in (
+            None,
+            "",
+            ":memory:",
+        ):
+            return url.database
+        digest = hashlib.sha256(self.database_url.encode()).hexdigest()[:16]
+        return os.path.join(tempfile.gettempdir(), f"wealth-tracker-{digest}")
+
+
+settings = Settings.from_env()
@@ -0,0 +1,94 @@
+from contextlib import contextmanager
+from typing import Callable
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process, nothing to coordinate
+    fcntl = None
+
+
+class WorkerPool:
+    """
+    Coordinates the startup and shutdown of the API processes sharing a database,
+    e.g. the workers of `fastapi run --workers 8`, with file locks:
+
+    - `<path>.init.lock` is held exclusively while a process initializes or stops,
+      so only one of them touches the schema at a time.
+    - `<path>.workers.lock` is held shared by every running process. A process that
+      can lock it exclusively is the only one alive: the first of a new pool on
+      startup, the last one on shutdown.
+
+    The kernel releases the locks of a process that dies, so a crashed worker never
+    leaves the database marked as in use.
+    """
+
+    def __init__(self, path: str):
+        self.init_path = f"{path}.init.lock"
+        self.workers_path = f"{path}.workers.lock"
+        self._workers = None
+
+    @contextmanager
+    def _initializing(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.init_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _alone(self) -> bool:
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(self._workers, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    def start(
+        self, first: Callable | None = None, every: Callable | None = None
+    ) -> bool:
+        """
+        Register the process in the pool, running `first` when no other process
+        is running and then `every`, one process at a time.
+
+        Returns:
+            Whether this process started the pool
+        """
+        with self._initializing():
+            self._workers = open(self.workers_path, "a")
+            try:
+                is_first = self._alone()
+                if is_first and first:
+                    first()
+                if every:
+                    every()
+            except BaseException:
+                self._workers.close()
+                self._workers = None
+                raise
+            if fcntl is not None:
+                fcntl.flock(self._workers, fcntl.LOCK_SH)
+        return is_first
+
+    def stop(self, last: Callable | None = None) -> bool:
+        """
+        Leave the pool, running `last` when no other process is still running.
+
+        Returns:
+            Whether this process was the last one
+        """
+        if self._workers is None:
+            return False
+        with self._initializing():
+            try:
+                is_last = self._alone()
+                if is_last and last:
+                    last()
+            finally:
+                self._workers.close()
+                self._workers = None
+        return is_last
@@ -0,0 +1,173 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable
+
+from sqlalchemy.engine import Engine
+
+TENANT_HEADER = "x-tenant"
+TENANT_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+TENANT_PREFIX = re.compile(r"^/t/([^/]+)(/.*)?$")
+
+
+class InvalidTenant(ValueError):
+    pass
+
+
+def check_tenant(tenant: str | None) -> str:
+    if not tenant:
+        raise InvalidTenant(
+            "Select a tenant with the X-Tenant header or a /t/{tenant}/ path prefix"
+        )
+    if not TENANT_ID.match(tenant):
+        raise InvalidTenant(f"Invalid tenant: {tenant}")
+    return tenant
+
+
+class TenantMiddleware:
+    """
+    Reads the tenant of a request from a `/t/{tenant}` path prefix, which is
+    removed before routing, or from the X-Tenant header, into `request.state`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            tenant = None
+            match = TENANT_PREFIX.match(scope["path"])
+            if match:
+                tenant, path = match.group(1), match.group(2) or "/"
+                scope = dict(scope, path=path, raw_path=path.encode())
+            else:
+                for name, value in scope["headers"]:
+                    if name == TENANT_HEADER.encode():
+                        tenant = value.decode()
+            scope["state"] = {**scope.get("state", {}), "tenant": tenant}
+        await self.app(scope, receive, send)
+
+
+@dataclass
+class TenantDatabase:
+    """Engine of a tenant, with the session info its sessions are opened with."""
+
+    engine: Engine
+    info: dict = field(default_factory=dict)
+    close: Callable | None = None
+    last_used: float = 0
+
+    def dispose(self):
+        if self.close:
+            self.close()
+        self.engine.dispose()
+
+
+class TenantEngines:
+    """
+    Bounded LRU cache of the databases of the tenants. A tenant's database is
+    opened on its first request; the least recently used one is disposed when
+    the cache is full, and the ones idle for `idle_timeout` seconds are disposed
+    on later lookups, so their pooled connections do not stay open.
+    """
+
+    def __init__(
+        self,
+        open_tenant: Callable[[str], TenantDatabase],
+        maxsize: int = 32,
+        idle_timeout: float = 300,
+    ):
+        """
+        Args:
+            open_tenant (Callable): Opens the database of a tenant, creating it
+                when needed
+            maxsize (int): Maximum number of tenant databases kept open
+            idle_timeout (float): Seconds after which an unused database is disposed
+        """
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._open_tenant = open_tenant
+        self._lock = threading.Lock()
+        self._tenants: OrderedDict[str, TenantDatabase] = OrderedDict()
+        self._opening: dict[str, threading.Lock] = {}
+
+    def get(self, tenant: str | None) -> TenantDatabase:
+        tenant = check_tenant(tenant)
+        now = time.monotonic()
+        with self._lock:
+            expired = self._pop_expired(now)
+            database = self._tenants.get(tenant)
+            if database is not None:
+                self.hits += 1
+                database.last_used = now
+                self._tenants.move_to_end(tenant)
+            else:
+                self.misses += 1
+        self._dispose(expired)
+        if database is not None:
+            return database
+
+        # Opened outside of the lock, so a new tenant does not hold up the others,
+        # but once: the first requests of a tenant wait for each other
+        with self._lock:
+            opening = self._opening.setdefault(tenant, threading.Lock())
+        try:
+            with opening:
+                with self._lock:
+                    database = self._tenants.get(tenant)
+                if database is None:
+                    database = self._open_tenant(tenant)
+                    database.last_used = now
+                    with self._lock:
+                        self._tenants[tenant] = database
+                        expired = []
+                        while len(self._tenants) > self.maxsize:
+                            expired.append(self._tenants.popitem(last=False)[1])
+                    self._dispose(expired)
+        finally:
+            with self._lock:
+                self._opening.pop(tenant, None)
+        return database
+
+    def _pop_expired(self, now: float) -> list[TenantDatabase]:
+        expired = []
+        while self._tenants:
+            tenant, database = next(iter(self._tenants.items()))
+            if now - database.last_used < self.idle_timeout:
+                break
+            expired.append(self._tenants.pop(tenant))
+        return expired
+
+    def _dispose(self, databases: list[TenantDatabase]):
+        for database in databases:
+            with self._lock:
+                self.evictions += 1
+            database.dispose()
+
+    def dispose_all(self):
+        with self._lock:
+            databases = list(self._tenants.values())
+            self._tenants.clear()
+        for database in databases:
+            database.dispose()
+
+    def items(self) -> list[tuple[str, TenantDatabase]]:
+        """Open tenants and their databases, least recently used first."""
+        with self._lock:
+            return list(self._tenants.items())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._tenants),
+                "maxsize": self.maxsize,
+                "tenants": list(self._tenants),
+            }
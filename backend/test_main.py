@@ -1,13 +1,61 @@
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
 from fastapi.testclient import TestClient
-
-from .database import create_db_and_tables, drop_db_and_tables
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+from sqlmodel import Session, select
+
+from . import database, main
+from .balances import check_snapshots, compute_balance, rebuild_snapshots
+from .database import (
+    create_db_and_tables,
+    create_db_engine,
+    drop_db_and_tables,
+    engine,
+)
+from .exports import COLUMNAR_COLUMNS
+from .fx import load_fx_rates
 from .main import app
+from .migrations import migrate
+from .models import Currency, Transaction
+from .writer import WriteQueue
 
 client = TestClient(app)
 drop_db_and_tables()
 create_db_and_tables()
 
 
+@contextmanager
+def count_queries():
+    """Collect every SQL statement sent to the database inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def assert_query_count(url: str, expected: int):
+    """Fail when serving `url` takes a different number of SQL statements."""
+    with count_queries() as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    assert len(statements) == expected, statements
+
+
 # Currencies endpoints
 def test_create_currency():
     response = client.post("/currencies/", json={"name": "EUR"})
@@ -396,6 +444,14 @@ def test_get_total_balance():
     drop_db_and_tables()
 
 
+def test_get_total_balance_with_end_date():
+    populate_db()
+    response = client.get("/total_balance/?end_date=2024-10-20T00:00:00")
+    assert response.status_code == 200
+    assert response.json() == {"total_balance": -300.55}
+    drop_db_and_tables()
+
+
 def test_get_total_account_balance():
     populate_db()
     response = client.get("/total_balance/1/")
@@ -425,3 +481,772 @@ def test_get_total_balance_per_account():
         },
     ]
     drop_db_and_tables()
+
+
+def test_get_total_balance_per_account_query_count():
+    populate_db()
+    with count_queries() as statements:
+        client.get("/total_balance_per_account/")
+    queries_with_two_accounts = len(statements)
+    # Data generation lookup and the balances query
+    assert queries_with_two_accounts == 2
+
+    for i in range(5):
+        client.post(
+            "/accounts/",
+            json={"name": f"account {i}", "account_type_id": 1, "currency_id": 1},
+        )
+        client.post(
+            "/transactions/",
+            json={
+                "amount": 10,
+                "transaction_date": "2024-10-02 12:30:00",
+                "account_id": i + 3,
+                "category_id": 1,
+                "subcategory_id": 1,
+            },
+        )
+    with count_queries() as statements:
+        response = client.get("/total_balance_per_account/")
+    assert len(response.json()) == 7
+    assert response.json()[-1]["total_balance"] == -10
+    assert len(statements) == queries_with_two_accounts
+    drop_db_and_tables()
+
+
+def test_balance_snapshots_follow_transaction_writes():
+    populate_db()
+    client.post(
+        "/transactions/",
+        json={
+            "amount": 50,
+            "transaction_date": "2024-10-25 08:00:00",
+            "description": "lunch",
+            "account_id": 1,
+            "category_id": 1,
+            "subcategory_id": 1,
+        },
+    )
+    # Move the wage to another account and to an earlier date
+    client.patch(
+        "/transactions/3",
+        json={"account_id": 2, "transaction_date": "2024-10-01 09:00:00"},
+    )
+    client.patch("/transactions/1", json={"amount": 80})
+    client.delete("/transactions/2")
+
+    response = client.get("/total_balance_per_account/")
+    assert [account["total_balance"] for account in response.json()] == [-130, 700]
+    response = client.get("/total_balance/?end_date=2024-10-25T07:00:00")
+    assert response.json() == {"total_balance": 620}
+    response = client.get("/total_balance/2?end_date=2024-10-01T08:00:00")
+    assert response.json() == {"total_balance": 0}
+
+    # Turning the expense category into an income one flips its transactions
+    client.patch("/categories/1", json={"type": "income"})
+    assert client.get("/total_balance/").json() == {"total_balance": 830}
+
+    with Session(engine) as session:
+        assert check_snapshots(session) == []
+        rebuild_snapshots(session)
+        session.commit()
+        assert check_snapshots(session) == []
+        assert compute_balance(session, datetime(2024, 12, 31)) == 830
+    drop_db_and_tables()
+
+
+def test_get_balance_history():
+    populate_db()
+    response = client.get(
+        "/balance_history/?start_date=2024-10-01&end_date=2024-10-31&granularity=week"
+    )
+    assert response.status_code == 200
+    assert response.json() == [
+        {"date": "2024-10-06", "total_balance": -100.55},
+        {"date": "2024-10-13", "total_balance": -100.55},
+        {"date": "2024-10-20", "total_balance": -300.55},
+        {"date": "2024-10-27", "total_balance": 399.45},
+        {"date": "2024-10-31", "total_balance": 399.45},
+    ]
+
+    response = client.get(
+        "/balance_history/?start_date=2024-09-01&end_date=2024-10-31&granularity=month"
+    )
+    assert [point["total_balance"] for point in response.json()] == [0, 399.45]
+
+    response = client.get(
+        "/balance_history/?start_date=2024-10-14&end_date=2024-10-16&account_ids=2"
+    )
+    assert [point["total_balance"] for point in response.json()] == [0, -200, -200]
+
+    response = client.get("/balance_history/?start_date=2024-10-16&end_date=2024-10-14")
+    assert response.status_code == 400
+    drop_db_and_tables()
+
+
+def test_get_total_balance_with_target_currency():
+    populate_db()
+    client.post("/currencies/", json={"name": "USD"})
+    client.post(
+        "/accounts/",
+        json={"name": "usd cash", "account_type_id": 1, "currency_id": 2},
+    )
+    client.post(
+        "/transactions/",
+        json={
+            "amount": 100,
+            "transaction_date": "2024-10-03 12:30:00",
+            "account_id": 3,
+            "category_id": 2,
+            "subcategory_id": 3,
+        },
+    )
+    with Session(engine) as session:
+        load_fx_rates(session)
+        session.commit()
+
+    end_date = "end_date=2024-10-31T23:59:59"
+    response = client.get(f"/total_balance/?{end_date}&target_currency=COP")
+    assert response.json() == {"total_balance": 422399.45}
+    response = client.get(f"/total_balance/3?{end_date}&target_currency=COP")
+    assert response.json() == {"total_balance": 422000}
+
+    response = client.get(f"/total_balance_per_account/?{end_date}&target_currency=USD")
+    assert [
+        (account["total_balance"], account["converted_balance"])
+        for account in response.json()
+    ] == [(599.45, 0.14), (-200, -0.05), (100, 100)]
+
+    response = client.get(
+        "/balance_history/?start_date=2024-09-01&end_date=2024-10-31"
+        "&granularity=month&target_currency=USD"
+    )
+    assert [point["total_balance"] for point in response.json()] == [0, 100.09]
+
+    response = client.get(f"/total_balance/?{end_date}&target_currency=GBP")
+    assert response.status_code == 400
+    drop_db_and_tables()
+
+
+def test_result_cache_is_invalidated_by_writes():
+    populate_db()
+    client.get("/total_balance/")
+    stats = client.get("/stats/cache").json()
+    assert client.get("/total_balance/").json() == {"total_balance": 399.45}
+    assert client.get("/stats/cache").json()["hits"] == stats["hits"] + 1
+
+    client.patch("/transactions/1", json={"amount": 0.55})
+    assert client.get("/total_balance/").json() == {"total_balance": 499.45}
+    assert client.get("/stats/cache").json()["misses"] == stats["misses"] + 1
+    drop_db_and_tables()
+
+
+def test_get_transactions_with_cursor():
+    populate_db()
+    response = client.get("/transactions/?limit=2")
+    assert [transaction["id"] for transaction in response.json()] == [1, 2]
+    next_cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get(f"/transactions/?limit=2&cursor={next_cursor}")
+    assert [transaction["id"] for transaction in response.json()] == [3]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = client.get("/transactions/?limit=2&unpaginated=true")
+    assert len(response.json()) == 3
+
+    response = client.get("/transactions/?cursor=not-a-cursor")
+    assert response.status_code == 400
+    drop_db_and_tables()
+
+
+def test_nested_models_are_loaded_with_a_fixed_number_of_queries():
+    populate_db()
+    # The reference-data lists also read the version of their tables for the ETag
+    assert_query_count("/accounts/", 2)
+    assert_query_count("/accounts/1", 1)
+    assert_query_count("/categories/", 3)
+    assert_query_count("/categories/1", 2)
+    assert_query_count("/sub_categories/", 2)
+    assert_query_count("/sub_categories/1", 1)
+    assert_query_count("/transactions/", 1)
+    assert_query_count("/transactions/1", 1)
+    drop_db_and_tables()
+
+
+def test_get_transactions_ordering():
+    populate_db()
+    response = client.get("/transactions/?direction=desc&limit=2")
+    assert [transaction["id"] for transaction in response.json()] == [3, 2]
+    next_cursor = response.headers["X-Next-Cursor"]
+    response = client.get(f"/transactions/?direction=desc&limit=2&cursor={next_cursor}")
+    assert [transaction["id"] for transaction in response.json()] == [1]
+
+    response = client.get("/transactions/?order_by=account_id")
+    assert [transaction["id"] for transaction in response.json()] == [1, 3, 2]
+
+    response = client.get("/accounts/?order_by=id&direction=desc")
+    assert [account["id"] for account in response.json()] == [2, 1]
+
+    response = client.get("/transactions/?order_by=description")
+    assert response.status_code == 422
+    drop_db_and_tables()
+
+
+def test_export_transactions():
+    populate_db()
+    response = client.get("/transactions/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == [1, 2, 3]
+    assert rows[0]["amount"] == "100.55"
+    assert rows[0]["transaction_date"] == "2024-10-02T12:30:00"
+
+    response = client.get("/transactions/export?format=csv&account_ids=1")
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0].startswith("id,transaction_date,amount")
+    assert [line.split(",")[0] for line in lines[1:]] == ["1", "3"]
+
+    response = client.get("/transactions/export?start_date=2024-10-10&category_ids=2")
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [3]
+    drop_db_and_tables()
+
+
+def test_export_transactions_columnar():
+    populate_db()
+    response = client.get("/transactions/export/columnar?format=arrow")
+    assert response.status_code == 200
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column("amount_minor").to_pylist() == [10055, 20000, 70000]
+    assert table.column("currency").to_pylist() == ["COP", "COP", "COP"]
+    assert table.column("category").to_pylist() == ["food", "food", "income"]
+    assert table.schema.field("transaction_date").type == pa.timestamp("us")
+
+    response = client.get("/transactions/export/columnar?format=parquet&account_ids=2")
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.column("id").to_pylist() == [2]
+    assert table.column("account").to_pylist() == ["bancolombia mastercard black"]
+    drop_db_and_tables()
+
+    # int4 on PostgreSQL would overflow from 21,474,836.48
+    amount_minor = COLUMNAR_COLUMNS[2][0].compile(dialect=postgresql.dialect())
+    assert "AS BIGINT" in str(amount_minor)
+
+
+def test_list_endpoints_with_sparse_fieldsets():
+    populate_db()
+    with count_queries() as statements:
+        response = client.get("/transactions/?fields=id,amount,category.name&limit=2")
+    assert response.json() == [
+        {"id": 1, "amount": "100.55", "category": {"name": "food"}},
+        {"id": 2, "amount": "200.00", "category": {"name": "food"}},
+    ]
+    assert len(statements) == 1
+    assert "subcategory" not in statements[0]
+    assert "description" not in statements[0]
+    next_cursor = response.headers["X-Next-Cursor"]
+    response = client.get(f"/transactions/?fields=id&limit=2&cursor={next_cursor}")
+    assert response.json() == [{"id": 3}]
+    response = client.get("/transactions/?fields=id&order_by=id")
+    assert response.json() == [{"id": 1}, {"id": 2}, {"id": 3}]
+
+    full = client.get("/transactions/?unpaginated=true").json()
+    response = client.get(
+        "/transactions/?unpaginated=true&fields=transaction_date,account.name"
+    )
+    assert response.json() == [
+        {
+            "transaction_date": transaction["transaction_date"],
+            "account": {"name": transaction["account"]["name"]},
+        }
+        for transaction in full
+    ]
+
+    response = client.get("/accounts/?fields=name,currency.name&order_by=id")
+    assert [account["currency"] for account in response.json()] == [
+        {"name": "COP"},
+        {"name": "COP"},
+    ]
+    assert client.get("/planned_transactions/?fields=id").status_code == 200
+
+    response = client.get("/transactions/?fields=id,category.budget")
+    assert response.status_code == 400
+    response = client.get("/planned_transactions/?fields=category.name")
+    assert response.status_code == 400
+    drop_db_and_tables()
+
+
+def test_reference_data_etags():
+    populate_db()
+    response = client.get("/currencies/")
+    etag = response.headers["ETag"]
+    with count_queries() as statements:
+        response = client.get("/currencies/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    assert len(statements) == 1
+
+    client.patch("/currencies/1", json={"name": "EUR"})
+    response = client.get("/currencies/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    for url in ["/account_types/", "/accounts/", "/categories/", "/sub_categories/"]:
+        etag = client.get(url).headers["ETag"]
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    etag = client.get("/accounts/").headers["ETag"]
+    response = client.get("/accounts/?fields=id", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    etag = client.get("/sub_categories/").headers["ETag"]
+    client.patch("/categories/1", json={"name": "groceries"})
+    response = client.get("/sub_categories/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    drop_db_and_tables()
+
+
+def test_import_transactions():
+    populate_db()
+    statement = (
+        "transaction_date,amount,description,account,category,subcategory\n"
+        "2024-10-05T08:00:00,50.25,market,bancolombia savings account,food,groceries\n"
+        "2024-10-06,1000,salary,bancolombia savings account,income,wage\n"
+        "2024-10-07,12,lunch,unknown,food,restaurant\n"
+        "2024-10-08,abc,lunch,bancolombia savings account,food,restaurant\n"
+    )
+    balance = client.get("/total_balance/1").json()["total_balance"]
+    response = client.post(
+        "/transactions/import?chunk_size=1",
+        files={"file": ("statement.csv", statement.encode())},
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "imported": 2,
+        "skipped": 0,
+        "rejected": 2,
+        "errors": [
+            {"row": 4, "error": "Unknown account: unknown"},
+            {"row": 5, "error": "Invalid amount: abc"},
+        ],
+    }
+    assert client.get("/total_balance/1").json()["total_balance"] == round(
+        balance + 1000 - 50.25, 2
+    )
+
+    ofx = (
+        "OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n"
+        "<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20241009120000\n<TRNAMT>-20.50\n"
+        "<NAME>Pizza\n</STMTTRN>\n"
+        "<STMTTRN><TRNTYPE>DEBIT</TRNTYPE><DTPOSTED>20241010</DTPOSTED>"
+        "<TRNAMT>-9.50</TRNAMT><MEMO>Coffee</MEMO></STMTTRN>\n"
+        "</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n"
+    )
+    response = client.post(
+        "/transactions/import?account=bancolombia savings account"
+        "&category=food&subcategory=restaurant",
+        files={"file": ("statement.ofx", ofx.encode())},
+    )
+    assert response.json() == {
+        "imported": 2,
+        "skipped": 0,
+        "rejected": 0,
+        "errors": [],
+    }
+    transactions = client.get(
+        "/transactions/?fields=description,amount,transaction_date&order_by=id"
+        "&direction=desc&limit=2"
+    ).json()
+    assert transactions == [
+        {
+            "description": "Coffee",
+            "amount": "9.50",
+            "transaction_date": "2024-10-10T00:00:00",
+        },
+        {
+            "description": "Pizza",
+            "amount": "20.50",
+            "transaction_date": "2024-10-09T12:00:00",
+        },
+    ]
+    with Session(engine) as session:
+        assert check_snapshots(session) == []
+
+    response = client.post(
+        "/transactions/import", files={"file": ("statement.xls", b"")}
+    )
+    assert response.status_code == 400
+    drop_db_and_tables()
+
+
+def test_batch_update_and_delete():
+    populate_db()
+    response = client.patch(
+        "/transactions/batch",
+        json={"ids": [1, 2, 99], "changes": {"category_id": 1, "subcategory_id": 1}},
+    )
+    assert response.json() == {"updated": 2}
+    transactions = client.get("/transactions/?fields=id,category_id&order_by=id")
+    assert transactions.json()[:2] == [
+        {"id": 1, "category_id": 1},
+        {"id": 2, "category_id": 1},
+    ]
+    with Session(engine) as session:
+        assert check_snapshots(session) == []
+
+    response = client.patch(
+        "/transactions/batch",
+        json={"filter": {"account_ids": [1]}, "changes": {"account_id": 2}},
+    )
+    assert response.json() == {"updated": 2}
+    response = client.request(
+        "DELETE", "/transactions/batch", json={"filter": {"account_ids": [2]}}
+    )
+    assert response.json() == {"deleted": 3}
+    with Session(engine) as session:
+        assert check_snapshots(session) == []
+
+    for month in (1, 2):
+        client.post(
+            "/budgets/",
+            json={"year": 2024, "month": month, "budget": 100, "subcategory_id": 3},
+        )
+    client.post(
+        "/planned_transactions/",
+        json={
+            "amount": 1,
+            "transaction_date": "2024-10-02T12:30:00",
+            "category_id": 3,
+            "subcategory_id": 3,
+            "account_id": 1,
+        },
+    )
+    response = client.patch(
+        "/planned_transactions/batch",
+        json={"filter": {"start_date": "2024-01-01"}, "changes": {"amount": 10}},
+    )
+    assert response.json() == {"updated": 1}
+    response = client.patch(
+        "/budgets/batch", json={"filter": {"year": 2024}, "changes": {"budget": 5}}
+    )
+    assert response.json() == {"updated": 2}
+    budgets = client.get("/budgets/?year=2024").json()
+    assert [budget["budget"] for budget in budgets] == ["5.00", "5.00"]
+    response = client.request("DELETE", "/budgets/batch", json={"ids": [1]})
+    assert response.json() == {"deleted": 1}
+
+    response = client.request("DELETE", "/transactions/batch", json={"filter": {}})
+    assert response.status_code == 400
+    drop_db_and_tables()
+
+
+def test_writes_return_the_row_without_reading_it_again():
+    populate_db()
+    with count_queries() as statements:
+        response = client.post("/currencies/", json={"name": "EUR"})
+    currency_id = response.json()["id"]
+    assert response.json()["created_at"] is not None
+    assert not any(statement.startswith("SELECT") for statement in statements)
+
+    with count_queries() as statements:
+        response = client.patch(f"/currencies/{currency_id}", json={"name": "GBP"})
+    assert response.json()["name"] == "GBP"
+    assert not any(statement.startswith("SELECT") for statement in statements)
+
+    assert client.patch("/currencies/99", json={"name": "GBP"}).status_code == 404
+    assert client.delete(f"/currencies/{currency_id}").json() == {"ok": True}
+    assert client.delete(f"/currencies/{currency_id}").status_code == 404
+    drop_db_and_tables()
+
+
+def test_import_applies_the_sign_of_statement_amounts():
+    populate_db()
+    account = "bancolombia mastercard black"
+    statement = (
+        "transaction_date,amount,description,account,category,subcategory\n"
+        f"2024-10-05,-50,market,{account},food,groceries\n"
+        f"2024-10-06,+20,refund,{account},food,groceries\n"
+        f"2024-10-07,30,lunch,{account},food,restaurant\n"
+        f"2024-10-08,+100,salary,{account},income,wage\n"
+    )
+    balance = client.get("/total_balance/2").json()["total_balance"]
+    response = client.post(
+        "/transactions/import", files={"file": ("statement.csv", statement.encode())}
+    )
+    assert response.json()["imported"] == 4
+    # -50 + 20 - 30 + 100: unsigned amounts take the sign of their category
+    assert client.get("/total_balance/2").json()["total_balance"] == balance + 40
+
+    ofx = (
+        "<OFX><STMTTRN><DTPOSTED>20241009</DTPOSTED><TRNAMT>-12.50</TRNAMT>"
+        "<NAME>Pizza</NAME></STMTTRN>"
+        "<STMTTRN><DTPOSTED>20241010</DTPOSTED><TRNAMT>7.50</TRNAMT>"
+        "<NAME>Pizza refund</NAME></STMTTRN></OFX>\n"
+    )
+    response = client.post(
+        f"/transactions/import?account={account}&category=food&subcategory=restaurant",
+        files={"file": ("statement.ofx", ofx.encode())},
+    )
+    assert response.json()["imported"] == 2
+    assert client.get("/total_balance/2").json()["total_balance"] == balance + 35
+    drop_db_and_tables()
+
+
+def test_import_skips_known_transactions():
+    populate_db()
+    statement = (
+        "transaction_date,amount,description,account,category,subcategory\n"
+        "2024-10-05,50.25,Market,bancolombia savings account,food,groceries\n"
+        "2024-10-05,50.25,Market,bancolombia savings account,food,groceries\n"
+    )
+    response = client.post(
+        "/transactions/import", files={"file": ("statement.csv", statement.encode())}
+    )
+    assert response.json()["imported"] == 2
+
+    # The same movements with another time and formatting, plus a new one
+    overlapping = statement.replace("2024-10-05,", "2024-10-05T10:00:00,").replace(
+        "Market", " market "
+    ) + ("2024-10-06,10,Bakery,bancolombia savings account,food,groceries\n")
+    response = client.post(
+        "/transactions/import",
+        files={"file": ("statement.csv", overlapping.encode())},
+    )
+    assert response.json()["imported"] == 1
+    assert response.json()["skipped"] == 2
+    with Session(engine) as session:
+        assert check_snapshots(session) == []
+
+    # A manual entry takes the next free fingerprint, so it is not lost either
+    response = client.post(
+        "/transactions/",
+        json={
+            "amount": 10,
+            "description": "bakery",
+            "transaction_date": "2024-10-06T08:00:00",
+            "category_id": 3,
+            "subcategory_id": 3,
+            "account_id": 1,
+        },
+    )
+    assert response.status_code == 200
+    client.patch(
+        f"/transactions/{response.json()['id']}", json={"description": "Bakery 2"}
+    )
+
+    headers = {"Idempotency-Key": "statement-2024-10"}
+    new_statement = (
+        "transaction_date,amount,description,account,category,subcategory\n"
+        "2024-10-07,20,Pharmacy,bancolombia savings account,food,groceries\n"
+    )
+    first = client.post(
+        "/transactions/import",
+        files={"file": ("statement.csv", new_statement.encode())},
+        headers=headers,
+    )
+    retry = client.post(
+        "/transactions/import",
+        files={"file": ("statement.csv", new_statement.encode())},
+        headers=headers,
+    )
+    assert first.json()["imported"] == 1
+    assert retry.json() == first.json()
+    drop_db_and_tables()
+
+
+def test_async_endpoints_match_sync_ones():
+    populate_db()
+    urls = [
+        "/currencies/",
+        "/accounts/?order_by=id&fields=id,name,currency.name",
+        "/categories/",
+        "/sub_categories/",
+        "/transactions/?start_date=2024-09-01&end_date=2024-10-31&limit=2",
+        "/planned_transactions/",
+        "/budgets/",
+        "/total_balance/?end_date=2024-10-31T23:59:59",
+        "/total_balance/2?end_date=2024-10-31T23:59:59",
+        "/total_balance_per_account/?end_date=2024-10-31T23:59:59",
+        "/balance_history/?start_date=2024-09-01&end_date=2024-10-31&granularity=month",
+    ]
+    for url in urls:
+        response = client.get(url)
+        async_response = client.get(f"/async{url}")
+        assert async_response.status_code == 200, url
+        assert async_response.json() == response.json(), url
+        assert async_response.headers.get("X-Next-Cursor") == response.headers.get(
+            "X-Next-Cursor"
+        )
+
+    etag = client.get("/async/currencies/").headers["ETag"]
+    response = client.get("/async/currencies/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert (
+        client.get(
+            "/async/balance_history/?start_date=2024-10-16&end_date=2024-10-14"
+        ).status_code
+        == 400
+    )
+    drop_db_and_tables()
+
+
+def test_startup_keeps_the_data():
+    populate_db()
+    currency_id = client.post("/currencies/", json={"name": "EUR"}).json()["id"]
+    # Startup migrates the schema instead of recreating it, and shutdown drops nothing
+    params = {"target_currency": "USD"}
+    assert client.get("/total_balance/", params=params).status_code == 400
+    with TestClient(app) as restarted:
+        assert restarted.get(f"/currencies/{currency_id}").json()["name"] == "EUR"
+        # The database had no FX rates: the bundled ones were loaded
+        assert restarted.get("/total_balance/", params=params).status_code == 200
+    assert client.get(f"/currencies/{currency_id}").status_code == 200
+    drop_db_and_tables()
+
+
+def test_writes_through_the_write_queue(monkeypatch):
+    populate_db()
+    assert client.get("/stats/write_queue").json() == {"enabled": False}
+    write_queue = WriteQueue(engine)
+    monkeypatch.setattr(main, "write_queue", write_queue)
+
+    def create_transaction(day: int):
+        return client.post(
+            "/transactions/",
+            json={
+                "amount": 100,
+                "transaction_date": f"2024-10-{day:02d}T12:00:00",
+                "category_id": 3,
+                "subcategory_id": 3,
+                "account_id": 1,
+            },
+        )
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(executor.map(create_transaction, range(1, 29)))
+    assert all(response.status_code == 200 for response in responses)
+    assert client.patch("/transactions/999", json={"amount": 1}).status_code == 404
+    response = client.delete(f"/transactions/{responses[0].json()['id']}")
+    assert response.json() == {"ok": True}
+
+    stats = client.get("/stats/write_queue").json()
+    assert stats["enabled"] is True
+    assert stats["operations"] == 30
+    assert stats["queue_depth"] == 0
+    write_queue.stop()
+    with Session(engine) as session:
+        assert check_snapshots(session) == []
+    drop_db_and_tables()
+
+
+def test_import_is_replayed_when_its_batch_fails(monkeypatch):
+    populate_db()
+    write_queue = WriteQueue(engine)
+    monkeypatch.setattr(main, "write_queue", write_queue)
+    commit = write_queue._commit
+    started, release = threading.Event(), threading.Event()
+
+    def failing_commit(batch):
+        if len(batch) > 1 and not write_queue.fallbacks:
+            # The writes of the batch run, then its commit fails
+            with Session(engine) as session:
+                for operation, _ in batch:
+                    operation(session)
+            return False
+        return commit(batch)
+
+    def blocking(session: Session):
+        started.set()
+        release.wait()
+
+    monkeypatch.setattr(write_queue, "_commit", failing_commit)
+    statement = (
+        "transaction_date,amount,description,account,category,subcategory\n"
+        "2024-10-05,50,market,bancolombia savings account,food,groceries\n"
+    )
+
+    def import_statement():
+        return client.post(
+            "/transactions/import",
+            files={"file": ("statement.csv", statement.encode())},
+            headers={"Idempotency-Key": "replayed-import"},
+        )
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        executor.submit(write_queue.submit, blocking)
+        started.wait()
+        imported = executor.submit(import_statement)
+        created = executor.submit(client.post, "/currencies/", json={"name": "EUR"})
+        while write_queue.stats()["queue_depth"] < 2:
+            time.sleep(0.001)
+        release.set()
+        assert imported.result().json()["imported"] == 1
+        assert created.result().status_code == 200
+    assert write_queue.stats()["fallbacks"] == 1
+    assert import_statement().json()["imported"] == 1
+    write_queue.stop()
+    drop_db_and_tables()
+
+
+def test_reads_go_to_the_replica(monkeypatch, tmp_path):
+    populate_db()
+    replica = create_db_engine(url=f"sqlite:///{tmp_path / 'replica.db'}")
+    migrate(replica)
+    with Session(replica) as session:
+        session.add(Currency(name="replica"))
+        session.commit()
+    monkeypatch.setattr(database, "replica_engine", replica)
+
+    assert [row["name"] for row in client.get("/currencies/").json()] == ["replica"]
+    assert client.get("/currencies/1").json()["name"] == "replica"
+    # Writes stay on the primary
+    response = client.patch("/currencies/1", json={"name": "EUR"})
+    assert response.json()["name"] == "EUR"
+    assert client.get("/currencies/1").json()["name"] == "replica"
+    assert client.get("/stats/pool").json()["primary"]["checkouts"] > 0
+    replica.dispose()
+    drop_db_and_tables()
+
+
+def test_concurrent_transaction_updates_keep_the_snapshots():
+    populate_db()
+
+    def update_transaction(amount: int):
+        return client.patch("/transactions/1", json={"amount": amount})
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        responses = list(executor.map(update_transaction, range(1000, 1200)))
+    assert all(response.status_code == 200 for response in responses)
+    with Session(engine) as session:
+        assert check_snapshots(session) == []
+    drop_db_and_tables()
+
+
+def test_concurrent_identical_transactions_get_their_own_fingerprint():
+    populate_db()
+    transaction = {
+        "amount": 100,
+        "transaction_date": "2024-10-01T12:00:00",
+        "description": "double submit",
+        "category_id": 3,
+        "subcategory_id": 3,
+        "account_id": 1,
+    }
+
+    def create_transaction(_):
+        return client.post("/transactions/", json=transaction)
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        responses = list(executor.map(create_transaction, range(300)))
+    assert all(response.status_code == 200 for response in responses)
+    with Session(engine) as session:
+        fingerprints = session.exec(
+            select(Transaction.fingerprint).where(
+                Transaction.description == "double submit"
+            )
+        ).all()
+    assert len(set(fingerprints)) == 300
+    drop_db_and_tables()
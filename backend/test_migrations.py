@@ -0,0 +1,163 @@
+from datetime import datetime
+from decimal import Decimal
+from functools import partial
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect, text
+from sqlmodel import Session, create_engine, func, select
+
+from . import database, main
+from .balances import check_snapshots
+from .database import open_tenant
+from .main import app
+from .migrations import MIGRATIONS, Migration, current_version, migrate
+from .models import (
+    Account,
+    AccountType,
+    Category,
+    CategoryTypeEnum,
+    Currency,
+    FxRate,
+    SubCategory,
+    Transaction,
+)
+from .settings import Settings
+from .tenants import TenantEngines, TenantMiddleware
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    engine.dispose()
+
+
+def add_note_column(connection):
+    connection.execute(text("ALTER TABLE account ADD COLUMN note VARCHAR"))
+
+
+def test_empty_database_is_created_at_the_latest_version(engine):
+    assert migrate(engine) == [migration.version for migration in MIGRATIONS]
+    with engine.connect() as connection:
+        assert current_version(connection) == MIGRATIONS[-1].version
+        assert "transaction" in inspect(connection).get_table_names()
+    assert migrate(engine) == []
+
+
+def test_pending_migrations_are_applied_once(engine):
+    migrate(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            text("INSERT INTO currency (name) VALUES ('COP')"),
+        )
+    version = MIGRATIONS[-1].version + 1
+    migrations = MIGRATIONS + [Migration(version, "account note", add_note_column)]
+    assert migrate(engine, migrations) == [version]
+    assert migrate(engine, migrations) == []
+    with engine.connect() as connection:
+        assert current_version(connection) == version
+        columns = [
+            column["name"] for column in inspect(connection).get_columns("account")
+        ]
+        assert "note" in columns
+        # The data is kept
+        assert connection.execute(text("SELECT name FROM currency")).scalar() == "COP"
+
+
+def test_failed_migration_is_rolled_back(engine):
+    migrate(engine)
+
+    def fail(connection):
+        add_note_column(connection)
+        raise RuntimeError("broken migration")
+
+    with pytest.raises(RuntimeError):
+        migrate(
+            engine, MIGRATIONS + [Migration(MIGRATIONS[-1].version + 1, "broken", fail)]
+        )
+    with engine.connect() as connection:
+        assert current_version(connection) == MIGRATIONS[-1].version
+        columns = [
+            column["name"] for column in inspect(connection).get_columns("account")
+        ]
+        assert "note" not in columns
+
+
+def test_unversioned_database_is_stamped(engine):
+    migrate(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE schemaversion"))
+        connection.execute(text("DROP TABLE idempotencykey"))
+    assert migrate(engine) == [migration.version for migration in MIGRATIONS]
+    with engine.connect() as connection:
+        assert "idempotencykey" in inspect(connection).get_table_names()
+
+
+def test_unversioned_database_with_an_old_schema_is_upgraded(monkeypatch, tmp_path):
+    settings = Settings.from_env(
+        {"DATABASE_TENANT_URL": f"sqlite:///{tmp_path / '{tenant}.db'}"}
+    )
+    engine = create_engine(settings.tenant_url("acme"))
+    migrate(engine)
+    with Session(engine) as session:
+        session.add(Currency(id=1, name="COP"))
+        session.add(AccountType(id=1, type="cash"))
+        session.add(Account(id=1, name="wallet", currency_id=1, account_type_id=1))
+        session.add(Category(id=1, name="food", type=CategoryTypeEnum.expense))
+        session.add(SubCategory(id=1, name="lunch", category_id=1))
+        for day in (1, 1, 2):
+            session.add(
+                Transaction(
+                    amount=Decimal(10),
+                    transaction_date=datetime(2024, 1, day),
+                    category_id=1,
+                    subcategory_id=1,
+                    account_id=1,
+                )
+            )
+        session.commit()
+    # The schema of a database created before versioning: no fingerprints,
+    # snapshots or FX rates
+    with engine.begin() as connection:
+        for table in ("schemaversion", "accountdailybalance", "fxrate"):
+            connection.execute(text(f"DROP TABLE {table}"))
+        connection.execute(text("DROP INDEX ix_transaction_fingerprint"))
+        connection.execute(
+            text("DROP INDEX ix_transaction_account_id_transaction_date")
+        )
+        connection.execute(text('ALTER TABLE "transaction" DROP COLUMN fingerprint'))
+    engine.dispose()
+
+    tenant_engines = TenantEngines(partial(open_tenant, settings=settings))
+    monkeypatch.setattr(database, "tenant_engines", tenant_engines)
+    monkeypatch.setattr(main, "tenant_engines", tenant_engines)
+    client = TestClient(TenantMiddleware(app))
+    try:
+        response = client.get("/t/acme/transactions/")
+        assert response.status_code == 200
+        assert len(response.json()) == 3
+
+        with Session(tenant_engines.get("acme").engine) as session:
+            assert current_version(session.connection()) == MIGRATIONS[-1].version
+            fingerprints = session.exec(select(Transaction.fingerprint)).all()
+            assert None not in fingerprints and len(set(fingerprints)) == 3
+            assert check_snapshots(session) == []
+            assert session.scalar(select(func.count()).select_from(FxRate))
+            indexes = {
+                index["name"]
+                for index in inspect(session.connection()).get_indexes("transaction")
+            }
+            assert "ix_transaction_account_id_transaction_date" in indexes
+    finally:
+        tenant_engines.dispose_all()
+
+
+def test_generation_migration_keeps_sqlite_schema(engine):
+    migrate(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM schemaversion WHERE version > 1"))
+    assert migrate(engine) == [2]
+    with engine.connect() as connection:
+        columns = inspect(connection).get_columns("datageneration")
+        assert [column["name"] for column in columns] == ["id", "generation"]
@@ -0,0 +1,192 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError
+from sqlmodel import Session, SQLModel, select
+
+from .balances import check_snapshots, record_transactions
+from .cache import bump_generation, get_generation
+from .crud import create_row, insert_or_ignore, update_row
+from .database import create_db_engine
+from .migrations import MIGRATIONS, current_version, migrate
+from .models import (
+    Account,
+    AccountType,
+    Category,
+    Currency,
+    SubCategory,
+    Transaction,
+    TransactionCreate,
+    TransactionUpdate,
+)
+from .pools import TimedQueuePool, pool_stats
+from .settings import Settings
+
+
+def test_pool_wait_metrics(tmp_path):
+    engine = create_db_engine(
+        Settings.from_env(
+            {
+                "DATABASE_URL": f"sqlite:///{tmp_path / 'pool.db'}",
+                "DATABASE_POOL_SIZE": "1",
+                "DATABASE_MAX_OVERFLOW": "0",
+                "DATABASE_POOL_TIMEOUT": "0.1",
+            }
+        )
+    )
+    assert isinstance(engine.pool, TimedQueuePool)
+    held = engine.connect()
+
+    def release():
+        time.sleep(0.05)
+        held.close()
+
+    threading.Thread(target=release).start()
+    with engine.connect():
+        stats = pool_stats(engine)
+        assert stats["checkouts"] == 2
+        assert stats["checked_out"] == 1
+        assert stats["wait_max_ms"] >= 40
+
+        # Nothing is released this time
+        with pytest.raises(TimeoutError):
+            engine.connect()
+    assert pool_stats(engine)["timeouts"] == 1
+    engine.dispose()
+
+
+def test_postgres_pool_settings():
+    pytest.importorskip("psycopg2")
+    engine = create_db_engine(
+        Settings.from_env(
+            {
+                "DATABASE_URL": "postgresql+psycopg2://wealth@db/wealth",
+                "DATABASE_POOL_SIZE": "20",
+                "DATABASE_POOL_RECYCLE": "600",
+            }
+        )
+    )
+    assert isinstance(engine.pool, TimedQueuePool)
+    assert engine.pool.size() == 20
+    assert engine.pool._pre_ping is True
+    assert engine.pool._recycle == 600
+
+
+def test_postgres_schema_and_writes(postgres_url):
+    engine = create_db_engine(Settings.from_env({"DATABASE_URL": postgres_url}))
+    SQLModel.metadata.drop_all(engine)
+    try:
+        assert migrate(engine)
+        assert migrate(engine) == []
+        with engine.connect() as connection:
+            assert current_version(connection) == MIGRATIONS[-1].version
+        with Session(engine) as session:
+            bump_generation(session)
+            session.commit()
+            # The first generation comes from the clock in nanoseconds
+            assert get_generation(session) > 2**31
+            session.exec(insert_or_ignore(session, Currency).values(id=1, name="COP"))
+            session.exec(insert_or_ignore(session, Currency).values(id=1, name="USD"))
+            session.commit()
+            assert session.exec(select(Currency.name)).all() == ["COP"]
+            assert session.exec(text("SELECT 1")).scalar() == 1
+        assert pool_stats(engine)["checkouts"] > 0
+    finally:
+        SQLModel.metadata.drop_all(engine)
+        engine.dispose()
+
+
+def test_postgres_generation_is_widened(postgres_url):
+    engine = create_db_engine(Settings.from_env({"DATABASE_URL": postgres_url}))
+    SQLModel.metadata.drop_all(engine)
+    try:
+        migrate(engine)
+        # A database created while the generation was an int4, at version 1
+        with engine.begin() as connection:
+            connection.execute(
+                text("ALTER TABLE datageneration ALTER COLUMN generation TYPE INTEGER")
+            )
+            connection.execute(text("DELETE FROM schemaversion WHERE version > 1"))
+        assert migrate(engine) == [2]
+        with engine.connect() as connection:
+            data_type = connection.execute(
+                text(
+                    "SELECT data_type FROM information_schema.columns "
+                    "WHERE table_name = 'datageneration' AND column_name = 'generation'"
+                )
+            ).scalar()
+            assert data_type == "bigint"
+    finally:
+        SQLModel.metadata.drop_all(engine)
+        engine.dispose()
+
+
+def test_postgres_concurrent_snapshot_writes(postgres_url):
+    engine = create_db_engine(
+        Settings.from_env({"DATABASE_URL": postgres_url, "DATABASE_POOL_SIZE": "16"})
+    )
+    SQLModel.metadata.drop_all(engine)
+    try:
+        migrate(engine)
+        with Session(engine) as session:
+            session.add(Currency(id=1, name="COP"))
+            session.add(AccountType(id=1, type="cash"))
+            session.add(Category(id=1, name="food", type="expense"))
+            session.add(SubCategory(id=1, name="groceries", category_id=1))
+            session.add(Account(id=1, name="cash", currency_id=1, account_type_id=1))
+            session.commit()
+            transaction_id = create_row(
+                session,
+                Transaction,
+                TransactionCreate(
+                    amount=Decimal(1),
+                    transaction_date=datetime(2024, 10, 1),
+                    category_id=1,
+                    subcategory_id=1,
+                    account_id=1,
+                ),
+            )["id"]
+            record_transactions(session, [transaction_id])
+            session.commit()
+
+        def create(day: int):
+            with Session(engine) as session:
+                row = create_row(
+                    session,
+                    Transaction,
+                    TransactionCreate(
+                        amount=Decimal(10),
+                        transaction_date=datetime(2024, 10, day % 28 + 1),
+                        category_id=1,
+                        subcategory_id=1,
+                        account_id=1,
+                    ),
+                )
+                record_transactions(session, [row["id"]])
+                session.commit()
+
+        def update(amount: int):
+            with Session(engine) as session:
+                record_transactions(session, [transaction_id], sign=-1)
+                update_row(
+                    session,
+                    Transaction,
+                    transaction_id,
+                    TransactionUpdate(amount=amount),
+                )
+                record_transactions(session, [transaction_id])
+                session.commit()
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(create, range(200)))
+            list(executor.map(update, range(2, 202)))
+        with Session(engine) as session:
+            assert check_snapshots(session) == []
+    finally:
+        SQLModel.metadata.drop_all(engine)
+        engine.dispose()
@@ -0,0 +1,100 @@
+import re
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from .database import create_db_and_tables, drop_db_and_tables, engine
+from .main import app
+from .test_main import populate_db
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.skipif(
+    engine.dialect.name != "sqlite", reason="EXPLAIN QUERY PLAN is SQLite syntax"
+)
+
+# Tables that grow with the ledger and must always be read through an index
+LEDGER_TABLES = {"transaction", "plannedtransaction", "budget", "accountdailybalance"}
+TABLE_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+@contextmanager
+def capture_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def table_scans(statement: str, parameters) -> list[str]:
+    connection = engine.raw_connection()
+    try:
+        plan = connection.cursor().execute(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        )
+        details = [row[3] for row in plan.fetchall()]
+    finally:
+        connection.close()
+    return [
+        detail
+        for detail in details
+        if (match := TABLE_SCAN.match(detail)) and match.group(1) in LEDGER_TABLES
+    ]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def database():
+    populate_db()
+    client.post(
+        "/planned_transactions/",
+        json={
+            "amount": 100,
+            "transaction_date": "2024-10-02 12:30:00",
+            "account_id": 1,
+            "category_id": 1,
+            "subcategory_id": 1,
+        },
+    )
+    client.post(
+        "/budgets/",
+        json={"year": 2024, "month": 10, "budget": 1000, "subcategory_id": 1},
+    )
+    yield
+    drop_db_and_tables()
+    create_db_and_tables()
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/transactions/",
+        "/transactions/?start_date=2024-10-01&end_date=2024-10-31T23:59:59",
+        "/transactions/?limit=1",
+        "/transactions/?order_by=account_id&direction=desc",
+        "/transactions/?fields=id,amount,category.name&limit=1",
+        "/transactions/1",
+        "/planned_transactions/?start_date=2024-10-01&end_date=2024-10-31T23:59:59",
+        "/budgets/?subcategory_id=1&year=2024&month=10",
+        "/total_balance/",
+        "/total_balance/1",
+        "/total_balance_per_account/",
+        "/balance_history/?start_date=2024-10-01&end_date=2024-10-31",
+        "/balance_history/?start_date=2024-10-01&end_date=2024-10-31&account_ids=1",
+    ],
+)
+def test_ledger_queries_use_indexes(url):
+    with capture_statements() as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    assert statements
+    for statement, parameters in statements:
+        assert table_scans(statement, parameters) == [], statement
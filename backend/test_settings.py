@@ -0,0 +1,65 @@
+import pytest
+
+from .database import create_db_engine
+from .settings import SQLITE_TUNED_PRAGMAS, Settings
+
+
+def test_settings_from_env():
+    settings = Settings.from_env({})
+    assert settings.database_url == "sqlite:///database.db"
+    assert settings.database_echo is False
+    assert settings.sqlite_pragmas == SQLITE_TUNED_PRAGMAS
+
+    settings = Settings.from_env(
+        {
+            "DATABASE_URL": "sqlite:///other.db",
+            "DATABASE_ECHO": "true",
+            "DATABASE_POOL_SIZE": "20",
+            "SQLITE_PROFILE": "default",
+            "SQLITE_BUSY_TIMEOUT": "1000",
+        }
+    )
+    assert settings.database_url == "sqlite:///other.db"
+    assert settings.database_echo is True
+    assert settings.pool_size == 20
+    assert settings.sqlite_pragmas == {"busy_timeout": "1000"}
+
+    with pytest.raises(ValueError):
+        Settings.from_env({"SQLITE_PROFILE": "fast"})
+
+
+def test_sqlite_pragmas_are_applied_on_connect(tmp_path):
+    url = f"sqlite:///{tmp_path / 'tuned.db'}"
+    engine = create_db_engine(Settings.from_env({"DATABASE_URL": url}))
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+        assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+    engine.dispose()
+
+    url = f"sqlite:///{tmp_path / 'default.db'}"
+    engine = create_db_engine(
+        Settings.from_env({"DATABASE_URL": url, "SQLITE_PROFILE": "default"})
+    )
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
+    engine.dispose()
+
+
+def test_async_url():
+    settings = Settings.from_env({"DATABASE_URL": "sqlite:///other.db"})
+    assert settings.async_url == "sqlite+aiosqlite:///other.db"
+    settings = Settings.from_env(
+        {"DATABASE_URL": "postgresql+psycopg2://user:secret@db:5432/wealth"}
+    )
+    assert settings.async_url == "postgresql+asyncpg://user:secret@db:5432/wealth"
+    settings = Settings.from_env(
+        {
+            "DATABASE_URL": "sqlite:///other.db",
+            "DATABASE_ASYNC_URL": "sqlite+aiosqlite://",
+        }
+    )
+    assert settings.async_url == "sqlite+aiosqlite://"
+
+    with pytest.raises(ValueError):
+        Settings.from_env({"DATABASE_URL": "mysql://db/wealth"}).async_url
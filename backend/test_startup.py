@@ -0,0 +1,125 @@
+import multiprocessing
+import os
+
+from sqlalchemy import func
+from sqlmodel import Session, create_engine, select
+
+from .balances import check_snapshots
+from .migrations import MIGRATIONS
+from .models import SchemaVersion, Transaction
+from .startup import WorkerPool
+
+WORKERS = 4
+WRITES = 20
+
+
+def test_worker_pool_first_and_last(tmp_path):
+    path = str(tmp_path / "database.db")
+    calls = []
+    first, second = WorkerPool(path), WorkerPool(path)
+    assert first.start(first=lambda: calls.append("reset"))
+    assert not second.start(first=lambda: calls.append("reset"))
+    assert calls == ["reset"]
+
+    assert not first.stop(last=lambda: calls.append("drop"))
+    assert second.stop(last=lambda: calls.append("drop"))
+    assert calls == ["reset", "drop"]
+
+    # A new pool starts once every process has stopped
+    assert WorkerPool(path).start()
+
+
+def run_worker(database_url: str, database_init: str, barrier, results):
+    """Start the API in a fresh process, write through it and wait for the others."""
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["DATABASE_INIT"] = database_init
+    from fastapi.testclient import TestClient
+
+    from .main import app
+
+    with TestClient(app) as client:
+        currencies = len(client.get("/currencies/").json())
+        barrier.wait()
+        name = f"worker {os.getpid()}"
+        currency = client.post("/currencies/", json={"name": name}).json()
+        account_type = client.post("/account_types/", json={"type": name}).json()
+        category = client.post(
+            "/categories/", json={"name": name, "type": "income"}
+        ).json()
+        subcategory = client.post(
+            "/sub_categories/", json={"name": name, "category_id": category["id"]}
+        ).json()
+        account = client.post(
+            "/accounts/",
+            json={
+                "name": name,
+                "currency_id": currency["id"],
+                "account_type_id": account_type["id"],
+            },
+        ).json()
+        for day in range(1, WRITES + 1):
+            response = client.post(
+                "/transactions/",
+                json={
+                    "amount": 1,
+                    "transaction_date": f"2024-10-{day:02d}T12:00:00",
+                    "category_id": category["id"],
+                    "subcategory_id": subcategory["id"],
+                    "account_id": account["id"],
+                },
+            )
+            response.raise_for_status()
+        balance = client.get(f"/total_balance/{account['id']}").json()
+        results.put((currencies, balance["total_balance"]))
+        # Keep every worker alive until all of them have written
+        barrier.wait()
+
+
+def start_workers(database_url: str, database_init: str) -> list:
+    """Run `WORKERS` API processes against one database at the same time."""
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(WORKERS)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=run_worker, args=(database_url, database_init, barrier, results)
+        )
+        for _ in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get(timeout=120) for _ in processes]
+    for process in processes:
+        process.join(timeout=120)
+        assert process.exitcode == 0
+    return outcomes
+
+
+def test_workers_reset_the_demo_data_once(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'database.db'}"
+    outcomes = start_workers(database_url, "reset")
+
+    # The demo data was seeded once, and not dropped under the running workers
+    assert outcomes == [(2, WRITES)] * WORKERS
+
+    # The last worker to stop dropped the tables
+    engine = create_engine(database_url)
+    with engine.connect() as connection:
+        assert not connection.dialect.get_table_names(connection)
+    engine.dispose()
+
+
+def test_workers_migrate_an_empty_database_concurrently(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'database.db'}"
+    outcomes = start_workers(database_url, "migrate")
+    assert outcomes == [(0, WRITES)] * WORKERS
+
+    # The data is kept, the schema was created once and every write is there
+    engine = create_engine(database_url)
+    with Session(engine) as session:
+        versions = session.exec(select(SchemaVersion.version)).all()
+        assert versions == [migration.version for migration in MIGRATIONS]
+        count = session.exec(select(func.count()).select_from(Transaction)).one()
+        assert count == WORKERS * WRITES
+        assert check_snapshots(session) == []
+    engine.dispose()
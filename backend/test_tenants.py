@@ -0,0 +1,160 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, create_engine, func, select
+
+from . import database, main
+from .crud import create_row
+from .database import open_tenant
+from .fx import FX_RATES_CSV
+from .main import app
+from .models import Currency, CurrencyCreate, FxRate
+from .settings import Settings
+from .tenants import InvalidTenant, TenantDatabase, TenantEngines, TenantMiddleware
+from .writer import WriteQueueClosed
+
+
+@pytest.fixture
+def tenant_settings(tmp_path):
+    return Settings.from_env(
+        {"DATABASE_TENANT_URL": f"sqlite:///{tmp_path / 'tenants' / '{tenant}.db'}"}
+    )
+
+
+def memory_tenant(opened: list, tenant: str) -> TenantDatabase:
+    opened.append(tenant)
+    return TenantDatabase(create_engine("sqlite://"))
+
+
+def test_tenant_url():
+    settings = Settings.from_env({"DATABASE_TENANT_URL": "sqlite:///t/{tenant}.db"})
+    assert settings.tenant_url("acme") == "sqlite:///t/acme.db"
+
+    with pytest.raises(ValueError):
+        Settings.from_env({"DATABASE_TENANT_URL": "sqlite:///tenants.db"})
+
+
+def test_least_recently_used_tenant_is_disposed():
+    opened = []
+    tenant_engines = TenantEngines(partial(memory_tenant, opened), maxsize=2)
+    first = tenant_engines.get("a")
+    tenant_engines.get("b")
+    assert tenant_engines.get("a") is first
+    tenant_engines.get("c")
+    assert opened == ["a", "b", "c"]
+    stats = tenant_engines.stats()
+    assert stats["tenants"] == ["a", "c"]
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 3, 1)
+
+    tenant_engines.get("b")
+    assert opened == ["a", "b", "c", "b"]
+
+
+def test_new_tenant_is_opened_once():
+    opened = []
+
+    def slow_tenant(tenant: str) -> TenantDatabase:
+        time.sleep(0.05)
+        return memory_tenant(opened, tenant)
+
+    tenant_engines = TenantEngines(slow_tenant)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        databases = list(executor.map(tenant_engines.get, ["a"] * 8))
+    assert opened == ["a"]
+    assert all(database is databases[0] for database in databases)
+
+
+def test_idle_tenants_are_disposed():
+    opened = []
+    tenant_engines = TenantEngines(partial(memory_tenant, opened), idle_timeout=0)
+    tenant_engines.get("a")
+    tenant_engines.get("a")
+    assert opened == ["a", "a"]
+    assert tenant_engines.stats()["tenants"] == ["a"]
+
+
+def test_invalid_tenants_are_rejected():
+    tenant_engines = TenantEngines(partial(memory_tenant, []))
+    for tenant in (None, "", "../other", "a" * 65):
+        with pytest.raises(InvalidTenant):
+            tenant_engines.get(tenant)
+
+
+def test_concurrent_opens_load_the_rates_once(tenant_settings):
+    # Processes do not share the cache: each opens the tenant on its own
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        databases = list(
+            executor.map(partial(open_tenant, settings=tenant_settings), ["acme"] * 4)
+        )
+    with Session(databases[0].engine) as session:
+        count = session.scalar(select(func.count()).select_from(FxRate))
+        assert count == len(FX_RATES_CSV.read_text().splitlines()) - 1
+    for tenant_database in databases:
+        tenant_database.dispose()
+
+
+def test_writes_of_an_evicted_tenant_reopen_it(monkeypatch, tmp_path):
+    settings = Settings.from_env(
+        {
+            "DATABASE_TENANT_URL": f"sqlite:///{tmp_path / '{tenant}.db'}",
+            "DATABASE_WRITE_QUEUE": "true",
+        }
+    )
+    tenant_engines = TenantEngines(partial(open_tenant, settings=settings), maxsize=1)
+    monkeypatch.setattr(main, "tenant_engines", tenant_engines)
+    try:
+        acme = tenant_engines.get("acme")
+        with Session(acme.engine, info=acme.info) as session:
+            # Evicted while the request holds its session
+            tenant_engines.get("globex")
+            with pytest.raises(WriteQueueClosed):
+                acme.info["write_queue"].submit(lambda session: None)
+            main.write(
+                session,
+                lambda session: create_row(
+                    session, Currency, CurrencyCreate(name="EUR")
+                ),
+            )
+        with Session(tenant_engines.get("acme").engine) as session:
+            assert session.exec(select(Currency.name)).all() == ["EUR"]
+    finally:
+        tenant_engines.dispose_all()
+
+
+def test_tenants_have_their_own_database(monkeypatch, tenant_settings):
+    tenant_engines = TenantEngines(partial(open_tenant, settings=tenant_settings))
+    monkeypatch.setattr(database, "tenant_engines", tenant_engines)
+    monkeypatch.setattr(main, "tenant_engines", tenant_engines)
+    client = TestClient(TenantMiddleware(app))
+    try:
+        response = client.post(
+            "/currencies/", json={"name": "EUR"}, headers={"X-Tenant": "acme"}
+        )
+        assert response.status_code == 200
+        response = client.get("/t/acme/currencies/")
+        assert [currency["name"] for currency in response.json()] == ["EUR"]
+        assert client.get("/t/globex/currencies/").json() == []
+
+        # New tenants get the FX rates, and cache their results apart
+        response = client.get(
+            "/total_balance/",
+            params={"target_currency": "USD"},
+            headers={"X-Tenant": "acme"},
+        )
+        assert response.status_code == 200
+        acme = tenant_engines.get("acme").info["result_cache"]
+        globex = tenant_engines.get("globex").info["result_cache"]
+        assert acme.stats()["size"] == 1
+        assert globex.stats()["size"] == 0
+
+        assert client.get("/currencies/").status_code == 400
+        assert client.get("/t/bad.tenant/currencies/").status_code == 400
+        stats = client.get("/stats/tenants").json()
+        assert stats["enabled"] and stats["tenants"] == ["acme", "globex"]
+        stats = client.get("/stats/cache").json()
+        assert stats["acme"]["size"] == 1 and stats["globex"]["size"] == 0
+    finally:
+        tenant_engines.dispose_all()
@@ -0,0 +1,108 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session, create_engine, func, select
+
+from .crud import create_row
+from .migrations import migrate
+from .models import Currency, CurrencyCreate
+from .writer import WriteQueue, WriteQueueClosed
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'writer.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    migrate(engine)
+    yield engine
+    engine.dispose()
+
+
+def create_currency(name: str):
+    def operation(session: Session):
+        return create_row(session, Currency, CurrencyCreate(name=name))
+
+    return operation
+
+
+def currency_names(engine) -> list[str]:
+    with Session(engine) as session:
+        return sorted(session.exec(select(Currency.name)).all())
+
+
+def test_queued_writes_are_committed_together(engine):
+    write_queue = WriteQueue(engine)
+    started, release = threading.Event(), threading.Event()
+
+    def blocking(session: Session):
+        started.set()
+        release.wait()
+        return create_currency("first")(session)
+
+    with ThreadPoolExecutor(max_workers=11) as executor:
+        first = executor.submit(write_queue.submit, blocking)
+        started.wait()
+        rest = [
+            executor.submit(write_queue.submit, create_currency(f"currency {number}"))
+            for number in range(10)
+        ]
+        while write_queue.stats()["queue_depth"] < 10:
+            time.sleep(0.001)
+        release.set()
+        ids = [first.result()["id"]] + [future.result()["id"] for future in rest]
+    write_queue.stop()
+
+    assert len(set(ids)) == 11
+    assert len(currency_names(engine)) == 11
+    stats = write_queue.stats()
+    assert stats["batches"] == 2
+    assert stats["operations"] == 11
+    assert stats["max_batch_size"] == 10
+    assert stats["queue_depth"] == 0
+
+
+def test_failed_write_does_not_affect_its_batch(engine):
+    write_queue = WriteQueue(engine)
+    started, release = threading.Event(), threading.Event()
+
+    def blocking(session: Session):
+        started.set()
+        release.wait()
+
+    def failing(session: Session):
+        create_currency("failed")(session)
+        raise HTTPException(status_code=404, detail="Currency not found")
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        executor.submit(write_queue.submit, blocking)
+        started.wait()
+        before = executor.submit(write_queue.submit, create_currency("before"))
+        failed = executor.submit(write_queue.submit, failing)
+        after = executor.submit(write_queue.submit, create_currency("after"))
+        while write_queue.stats()["queue_depth"] < 3:
+            time.sleep(0.001)
+        release.set()
+        before.result(), after.result()
+        with pytest.raises(HTTPException):
+            failed.result()
+    write_queue.stop()
+
+    assert currency_names(engine) == ["after", "before"]
+    assert write_queue.stats()["max_batch_size"] == 3
+
+
+def test_stop_commits_the_queued_writes(engine):
+    write_queue = WriteQueue(engine, max_delay=0.05)
+    write_queue.submit(create_currency("first"))
+    write_queue.stop()
+    # Its engine may be disposed: the thread is not started again
+    with pytest.raises(WriteQueueClosed):
+        write_queue.submit(create_currency("second"))
+    write_queue.stop()
+    with Session(engine) as session:
+        assert session.exec(select(func.count()).select_from(Currency)).one() == 1
@@ -0,0 +1,172 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+# Marks the end of the queue on shutdown
+_STOP = object()
+
+
+class WriteQueueClosed(RuntimeError):
+    pass
+
+
+class WriteQueue:
+    """
+    Single writer thread for the writes of the process. Requests hand their write
+    over as a function of a session and wait for its result; the thread runs the
+    writes waiting in the queue one after the other in a single transaction, each
+    in its own savepoint, and commits them together. SQLite then sees one writer
+    instead of every threadpool worker competing for its write lock, and a burst
+    of small writes costs one commit. Reads do not go through the queue.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        max_batch: int = 64,
+        max_delay: float = 0,
+        info: dict | None = None,
+    ):
+        """
+        Args:
+            engine (Engine): Engine of the database
+            max_batch (int): Maximum number of writes committed together
+            max_delay (float): Seconds to wait for more writes before committing
+                a batch, 0 to commit whatever is already queued
+            info (dict | None): Info of the sessions of the writer thread
+        """
+        self.engine = engine
+        self.info = info
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.operations = 0
+        self.fallbacks = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+
+    def start(self):
+        with self._lock:
+            self._start()
+
+    def _start(self):
+        if self._closed:
+            raise WriteQueueClosed("The write queue is stopped")
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="write-queue", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """
+        Commit the queued writes, stop the thread and close the queue: the engine
+        is usually disposed next, so later writes raise WriteQueueClosed instead
+        of starting the thread again.
+        """
+        with self._lock:
+            self._closed = True
+            thread, self._thread = self._thread, None
+            if thread is not None and thread.is_alive():
+                # Under the lock, so no write is queued after the stop marker
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join()
+
+    def submit(self, operation: Callable[[Session], Any]):
+        """
+        Run `operation` on the writer thread and return its result once it is
+        committed, or raise its exception, in which case none of its changes are.
+        Raises WriteQueueClosed once the queue is stopped.
+        """
+        future: Future = Future()
+        with self._lock:
+            self._start()
+            self._queue.put((operation, future))
+        return future.result()
+
+    def _next_batch(self) -> tuple[list, bool]:
+        batch = []
+        item = self._queue.get()
+        deadline = time.monotonic() + self.max_delay
+        while item is not _STOP:
+            batch.append(item)
+            if len(batch) >= self.max_batch:
+                return batch, False
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                return batch, False
+        return batch, True
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if not batch:
+                continue
+            if not self._commit(batch) and len(batch) > 1:
+                # The batch could not be committed as a whole: commit the writes
+                # one by one, so only the ones that cannot be committed fail
+                self.fallbacks += 1
+                for item in batch:
+                    self._commit([item])
+
+    def _commit(self, batch: list) -> bool:
+        outcomes = []
+        try:
+            with Session(self.engine, info=self.info) as session:
+                connection = session.connection()
+                if connection.dialect.name == "sqlite":
+                    # pysqlite only opens a transaction before DML: open it here so
+                    # the savepoints nest in it, with the write lock taken up front
+                    connection.exec_driver_sql("BEGIN IMMEDIATE")
+                for operation, future in batch:
+                    savepoint = session.begin_nested()
+                    try:
+                        result = operation(session)
+                        savepoint.commit()
+                        outcomes.append((future, result, None))
+                    except Exception as exc:
+                        savepoint.rollback()
+                        outcomes.append((future, None, exc))
+                session.commit()
+        except Exception as exc:
+            if len(batch) > 1:
+                return False
+            outcomes = [(batch[0][1], None, exc)]
+        else:
+            with self._lock:
+                self.batches += 1
+                self.operations += len(batch)
+                self.last_batch_size = len(batch)
+                self.max_batch_size = max(self.max_batch_size, len(batch))
+        for future, result, exc in outcomes:
+            if exc is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exc)
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self.batches,
+                "operations": self.operations,
+                "average_batch_size": (
+                    self.operations / self.batches if self.batches else 0
+                ),
+                "last_batch_size": self.last_batch_size,
+                "max_batch_size": self.max_batch_size,
+                "fallbacks": self.fallbacks,
+            }
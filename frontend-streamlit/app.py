@@ -67,21 +67,46 @@ def get_date_range(date_range_filter: List[date]) -> Tuple[str, str]:
     return start_date, end_date
 
 
+def fetch_all_pages(url: str, params: Dict) -> List[Dict]:
+    rows: List[Dict] = []
+    params = {**params, "limit": 1000}
+    while True:
+        response = requests.get(url=url, params=params)
+        rows.extend(response.json())
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            return rows
+        params["cursor"] = next_cursor
+
+
+def fetch_reference_data(url: str) -> List[Dict]:
+    cache: Dict = st.session_state.setdefault("reference_data", {})
+    headers = {"If-None-Match": cache[url][0]} if url in cache else {}
+    response = requests.get(url=url, headers=headers)
+    if response.status_code == 304:
+        return cache[url][1]
+    data = response.json()
+    if "ETag" in response.headers:
+        cache[url] = (response.headers["ETag"], data)
+    return data
+
+
 def fetch_data(start_date: str, end_date: str) -> Dict:
-    currencies: List[Dict] = requests.get(url=f"{API_URL}/currencies/").json()
-    account_types: List[Dict] = requests.get(url=f"{API_URL}/account_types/").json()
-    accounts: List[Dict] = requests.get(url=f"{API_URL}/accounts/").json()
-    categories: List[Dict] = requests.get(url=f"{API_URL}/categories/").json()
-    subcategories: List[Dict] = requests.get(url=f"{API_URL}/sub_categories/").json()
+    currencies: List[Dict] = fetch_reference_data(url=f"{API_URL}/currencies/")
+    account_types: List[Dict] = fetch_reference_data(url=f"{API_URL}/account_types/")
+    accounts: List[Dict] = fetch_reference_data(url=f"{API_URL}/accounts/")
+    categories: List[Dict] = fetch_reference_data(url=f"{API_URL}/categories/")
+    subcategories: List[Dict] = fetch_reference_data(url=f"{API_URL}/sub_categories/")
     accounts_balance: Dict = requests.get(
         url=f"{API_URL}/total_balance_per_account/?&end_date={end_date}"
     ).json()
     total_balance: Dict = requests.get(
         url=f"{API_URL}/total_balance/?&end_date={end_date}"
     ).json()
-    transactions_between_dates: List[Dict] = requests.get(
-        url=f"{API_URL}/transactions/?start_date={start_date}&end_date={end_date}"
-    ).json()
+    transactions_between_dates: List[Dict] = fetch_all_pages(
+        url=f"{API_URL}/transactions/",
+        params={"start_date": start_date, "end_date": end_date},
+    )
     return {
         "currencies": currencies,
         "account_types": account_types,